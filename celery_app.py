@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Celery 任务队列：在独立 worker 节点上执行 web_api 提交的流水线任务
+
+安装依赖:
+    pip install -e ".[celery]"
+
+启动 worker:
+    celery -A celery_app worker --loglevel=info
+
+环境变量:
+    PIPELINE_BROKER_URL      broker 地址（默认 redis://localhost:6379/0）
+    PIPELINE_RESULT_BACKEND  结果存储地址（默认与 broker 相同）
+"""
+
+import os
+
+from celery import Celery
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BROKER_URL = os.getenv("PIPELINE_BROKER_URL", "redis://localhost:6379/0")
+RESULT_BACKEND = os.getenv("PIPELINE_RESULT_BACKEND", BROKER_URL)
+
+celery_app = Celery("pipeline", broker=BROKER_URL, backend=RESULT_BACKEND)
+celery_app.conf.update(
+    task_serializer="json",
+    result_serializer="json",
+    accept_content=["json"],
+    # 标记 STARTED 状态，便于 /jobs 区分排队与执行中
+    task_track_started=True,
+    # 流水线耗时长：执行完再确认，worker 异常退出时任务会重新投递
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+)
+
+
+@celery_app.task(name="pipeline.run_pipeline")
+def run_pipeline_task(payload: dict, output_root: str) -> dict:
+    """执行流水线，返回 PipelineResult 字典"""
+    # 延迟导入，避免与 web_api 循环引用
+    from web_api import _run_pipeline_sync
+    return _run_pipeline_sync(payload, output_root)
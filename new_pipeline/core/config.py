@@ -4,7 +4,7 @@
 
 import os
 import yaml
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from .exceptions import ConfigError
 
 class PipelineConfig:
@@ -42,6 +42,18 @@ class PipelineConfig:
                 return None
         return value
     
+    def apply_overrides(self, root_dir: Optional[str] = None, output_dir: Optional[str] = None,
+                        bucket_name: Optional[str] = None) -> None:
+        """用运行时参数覆盖 yaml 配置（None 表示不覆盖）"""
+        if root_dir is not None or output_dir is not None:
+            project = self.config.setdefault('project', {})
+            if root_dir is not None:
+                project['root_dir'] = root_dir
+            if output_dir is not None:
+                project['output_dir'] = output_dir
+        if bucket_name:
+            self.config.setdefault('gcp', {})['bucket_name'] = bucket_name
+    
     @property
     def project_root(self) -> str:
         return self._get_nested('project.root_dir')
@@ -0,0 +1,130 @@
+"""
+步骤元数据
+各驱动脚本共用的步骤产物清单、结果判定与产物快速校验
+"""
+
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import orjson  # 可选依赖：存在时走字节级快速解析
+except ImportError:
+    orjson = None
+
+# 每个步骤的预期输出文件
+EXPECTED_FILES: Dict[str, Tuple[str, ...]] = {
+    "0.1": ("0_1_timed_dialogue.srt",),
+    "0.2": ("0_2_clues.json",),
+    "0.3": ("global_character_graph_llm.json",),
+    "0.4": ("0_4_calibrated_dialogue.txt",),
+    "0.5": ("0_5_dialogue_turns.json",),
+    "0.6": ("0_6_script_flow.json", "0_6_script_draft.md"),
+    "0.7": ("0_7_script.stmf", "0_7_script_analysis.json"),
+    # 0.8 为集合级别汇总产物（存放在集合根目录 output_root 下）
+    "0.8": ("0_8_complete_screenplay.fountain", "0_8_complete_screenplay.fdx"),
+}
+
+# 步骤编号 -> 执行顺序下标
+STEP_ORDER: Tuple[str, ...] = tuple(EXPECTED_FILES)
+STEP_INDEX: Dict[str, int] = {step: i for i, step in enumerate(STEP_ORDER)}
+
+# 产物在 global/ 下的步骤
+GLOBAL_STEPS = frozenset({"0.3"})
+# 产物在集合根目录下的步骤
+ROOT_STEPS = frozenset({"0.8"})
+
+
+def is_failed(step: str, result: Optional[Dict[str, Any]]) -> bool:
+    """根据步骤 run() 的返回判断是否失败"""
+    status = (result or {}).get("status")
+    if step == "0":
+        return status not in ("success", "completed", "already_exists")
+    if step in EXPECTED_FILES:
+        return status not in ("completed", "already_exists")
+    return status not in ("success", "already_exists")
+
+
+_JSON_CLOSERS = {ord('{'): b'}', ord('['): b']'}
+
+
+def quick_json_ok(path: str, allow_empty: bool = False) -> bool:
+    """不做完整解析的 JSON 快速校验：只读取首尾各 64 字节，确认以成对的 {}/[] 包裹；
+    allow_empty=False 时还要求括号内有内容。用于判断输出是否被截断/为空，不校验内部结构。"""
+    with open(path, 'rb') as f:
+        f.seek(0, 2)
+        size = f.tell()
+        if size < 2:
+            return False
+        f.seek(0)
+        if size <= 128:
+            head = tail = f.read()
+        else:
+            head = f.read(64)
+            f.seek(-64, 2)
+            tail = f.read()
+    head = head.lstrip()
+    tail = tail.rstrip()
+    if not head or _JSON_CLOSERS.get(head[0]) != tail[-1:]:
+        return False
+    if size <= 128:
+        # 小文件首尾为同一段内容
+        inner = head.rstrip()[1:-1]
+    else:
+        inner = head[1:] + tail[:-1]
+    return allow_empty or bool(inner.strip())
+
+
+def _load_json(file_path: str) -> Any:
+    """完整解析 JSON（仅在快速校验不足以判定时使用）"""
+    if orjson is not None:
+        with open(file_path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def json_output_valid(step_name: str, file_path: str, size: Optional[int] = None) -> bool:
+    """JSON 产物内容校验（check_invalid_files 的判定）；读取或解析失败视为无效。
+    传入 size 时先按大小判定，过小的文件不必打开：空文件不是合法 JSON；0.5 要求非空对象/数组，至少 3 字节（如 [0]）"""
+    if size is not None and size < (3 if step_name == "0.5" else 1):
+        return False
+    try:
+        # 针对不同步骤的结构校验：仅 0.5 需要检查内容字段，才做完整解析（截断的文件直接判无效）
+        if step_name == "0.5":
+            if not quick_json_ok(file_path, allow_empty=True):
+                return False
+            data = _load_json(file_path)
+            if isinstance(data, dict):
+                # 接受 dialogue_turns（主）、turns/dialogues（兼容）
+                return bool(data.get('dialogue_turns') or data.get('turns') or data.get('dialogues'))
+            if isinstance(data, list):
+                return len(data) > 0
+            return False
+        # 通用（宽松）校验：首尾完整且非空即可；快速校验不通过时再完整解析确认
+        if quick_json_ok(file_path):
+            return True
+        return bool(_load_json(file_path))
+    except (OSError, ValueError):  # 读取失败、编码错误或解析错误（JSONDecodeError 为 ValueError 子类）
+        return False
+
+
+def missing_output_files(episode_id: str, files: Iterable[Tuple[str, str, Optional[os.stat_result]]]) -> List[str]:
+    """检查单个剧集的步骤产物（check_file_integrity 的判定），files 为 (文件名, 路径, stat 或 None)；
+    返回缺失/损坏文件的描述列表"""
+    missing_files = []
+    for filename, file_path, st in files:
+        if st is None:
+            missing_files.append(f"{episode_id}/{filename}")
+            continue
+        # 检查文件是否为空或损坏
+        try:
+            if filename.endswith('.json'):
+                # 首尾完整即视为可用；否则完整解析，解析错误作为损坏原因
+                if not quick_json_ok(file_path, allow_empty=True):
+                    _load_json(file_path)
+            elif st.st_size == 0:
+                missing_files.append(f"{episode_id}/{filename} (空文件)")
+        except (OSError, ValueError) as e:
+            missing_files.append(f"{episode_id}/{filename} (损坏: {e})")
+    return missing_files
@@ -8,6 +8,11 @@ import glob
 from typing import List, Dict, Any
 from .exceptions import FileNotFoundError
 
+try:
+    import orjson  # 可选依赖：存在时走字节级快速序列化
+except ImportError:
+    orjson = None
+
 class PipelineUtils:
     """流水线通用工具"""
     
@@ -26,6 +31,29 @@ class PipelineUtils:
                     episodes.append(episode_id)
         return sorted(episodes)
     
+    @staticmethod
+    def is_collection_dir(path: str, name: str) -> bool:
+        """目录下是否有同名子目录、global/ 或 episode_* 之一；单次 scandir，命中即停止"""
+        try:
+            with os.scandir(path) as it:
+                return any(
+                    (e.name == name or e.name == "global" or e.name.startswith("episode_")) and e.is_dir()
+                    for e in it
+                )
+        except OSError:
+            return False
+    
+    @staticmethod
+    def list_collections(base_output_dir: str) -> List[str]:
+        """列出 base_output_dir 下的候选集合目录（支持双层同名或单层包含 episode_*/global 的目录）"""
+        # 本模块的 FileNotFoundError 为自定义异常，目录不存在时按 OSError 处理
+        try:
+            with os.scandir(base_output_dir) as it:
+                dirs = sorted((e.name, e.path) for e in it if e.is_dir())
+        except OSError:
+            return []
+        return [name for name, path in dirs if PipelineUtils.is_collection_dir(path, name)]
+    
     @staticmethod
     def get_video_uri(episode_id: str, project_root: str) -> str:
         """获取视频GCS URI"""
@@ -48,6 +76,11 @@ class PipelineUtils:
     def save_json_file(file_path: str, data: Dict, ensure_ascii: bool = False) -> None:
         """保存JSON文件"""
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # orjson 始终输出 UTF-8 原文，仅在不要求 ASCII 转义时使用
+        if orjson is not None and not ensure_ascii:
+            with open(file_path, 'wb') as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+            return
         with open(file_path, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=ensure_ascii, indent=2)
     
@@ -56,6 +89,9 @@ class PipelineUtils:
         """加载JSON文件"""
         if os.path.exists(file_path):
             try:
+                if orjson is not None:
+                    with open(file_path, 'rb') as f:
+                        return orjson.loads(f.read())
                 with open(file_path, 'r', encoding='utf-8') as f:
                     return json.load(f)
             except Exception as e:
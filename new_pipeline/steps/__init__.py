@@ -35,6 +35,10 @@ class PipelineStep(ABC):
         """运行步骤"""
         pass
     
+    def run_episode(self, episode_id: str) -> Dict[str, Any]:
+        """处理单个剧集（供按剧集串联多个步骤的驱动调用），默认委托给 _run_single_episode"""
+        return self._run_single_episode(episode_id)
+    
     def check_dependencies(self, episode_id: str = None) -> bool:
         """检查依赖"""
         return True
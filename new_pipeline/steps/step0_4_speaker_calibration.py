@@ -5,6 +5,7 @@ Step0.4: 说话人身份校准
 
 import sys
 import os
+import threading
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from . import PipelineStep
@@ -24,6 +25,7 @@ class Step0_4SpeakerCalibration(PipelineStep):
         self._step_name = "Step0.4"
         self._description = "说话人身份校准"
         self.global_graph = None
+        self._graph_lock = threading.Lock()
     
     @property
     def step_number(self) -> int:
@@ -37,6 +39,20 @@ class Step0_4SpeakerCalibration(PipelineStep):
     
     def run(self) -> Dict[str, Any]:
         """运行说话人身份校准"""
+        if not self._load_global_graph():
+            return {"status": "failed", "error": "全局图谱文件不存在"}
+        return self._run_all_episodes()
+    
+    def run_episode(self, episode_id: str) -> Dict[str, Any]:
+        """处理单个剧集；全局图谱在首次调用时加载一次（多线程共享）"""
+        if self.global_graph is None:
+            with self._graph_lock:
+                if self.global_graph is None and not self._load_global_graph():
+                    return {"status": "failed", "error": "全局图谱文件不存在"}
+        return self._run_single_episode(episode_id)
+    
+    def _load_global_graph(self) -> bool:
+        """加载全局图谱到 self.global_graph；找不到图谱文件时返回 False"""
         # 加载全局图谱（优先LLM版，其次启发式版）——兼容两种落盘位置（根目录 /global 子目录）
         candidates = [
             f"{self.config.project_root}/global/global_character_graph_llm.json",
@@ -51,15 +67,14 @@ class Step0_4SpeakerCalibration(PipelineStep):
                 break
         if not selected:
             log.info("❌ 全局图谱文件不存在，请先运行Step0.3/Step0.3-LLM")
-            return {"status": "failed", "error": "全局图谱文件不存在"}
+            return False
         with open(selected, 'r', encoding='utf-8') as f:
             self.global_graph = json.load(f)
         
         # 兼容不同结构：LLM版无 relationships 字段时安全打印
         rels = self.global_graph.get('relationships', [])
         log.info(f"✅ 加载全局图谱: {len(self.global_graph.get('characters', []))} 个角色, {len(rels)} 个关系 | 文件: {os.path.relpath(selected, self.config.project_root)}")
-        
-        return self._run_all_episodes()
+        return True
     
     def _run_all_episodes(self) -> Dict[str, Any]:
         """处理所有剧集"""
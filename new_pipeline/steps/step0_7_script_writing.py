@@ -3,20 +3,230 @@ Step0.7: 剧本撰写
 基于Step0.6的情节结构提取结果，撰写标准剧本格式
 """
 
+import io
 import os
+import functools
+import bisect
+import re
+import json
 import time
+import hashlib
+import threading
 from typing import Dict, Any, List, Optional
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from tqdm import tqdm
-from pydantic import BaseModel
+from dataclasses import dataclass, asdict, is_dataclass
+from types import MappingProxyType
 
 from core import PipelineConfig, GenAIClient, PipelineUtils
-from core.exceptions import StepDependencyError, ModelCallError
+from core.exceptions import StepDependencyError, ModelCallError, ConfigError
 from . import PipelineStep
 
 from new_pipeline.steps.commont_log import log
 
-class ScriptScene(BaseModel):
+try:
+    import orjson  # 可选依赖：存在时走字节级快速序列化
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec  # 可选依赖：存在时用于 LLM 结果到数据类的快速转换
+except ImportError:
+    msgspec = None
+
+
+# STMF 后处理使用的正则（模块级预编译，避免逐行/逐次编译与缓存查找）
+_DIGITS_RE = re.compile(r"\d+")
+_PLOT_PARA_RE = re.compile(r"^\[情节(\d+)\]")
+_PAREN_EXTRACT_RE = re.compile(r"\[PAREN\] \((.*?)\)")
+_ATTR_RE_CACHE: Dict[str, re.Pattern] = {}
+
+# narrative 段落的列表前缀标记（单字符，去掉后再去除随后的空白）
+_LIST_PREFIX_CHARS = frozenset('-•*')
+
+# 只读空序列哨兵，替代 `or []` 以免每次分配新列表
+_EMPTY: tuple = ()
+_EMPTY_MAPPING = MappingProxyType({})
+
+# 场景标题判定 INT. 的单字关键词（一次集合求交替代逐词 in 扫描）
+_INT_KEYS = frozenset('内中室厅')
+
+def _make_heading(idx: int, heading_hint: str, tod_hint: str) -> str:
+    """场景标题辅助：<idx>-1. INT./EXT. 地点 – 日/夜"""
+    loc = (heading_hint or '场景').upper()
+    tod = '日'
+    if '夜' in (tod_hint or ''):
+        tod = '夜'
+    stype = 'EXT.' if _INT_KEYS.isdisjoint(loc) else 'INT.'
+    return f"{idx}-1. {stype} {loc} – {tod}"
+
+
+# 情绪/意图关键词 -> PAREN 标签（按优先级排列，首个命中即返回）
+_EMOTION_TAGS = (
+    ('轻蔑', '轻蔑'), ('冷笑', '轻蔑'),
+    ('愤怒', '愤怒'), ('生气', '愤怒'),
+    ('担忧', '不安'), ('不安', '不安'), ('焦虑', '不安'),
+)
+_INTENT_TAGS = (
+    ('威胁', '施压'), ('施压', '施压'),
+    ('试探', '试探'),
+)
+
+
+def _match_tag(text: str, table) -> str:
+    """按关键词表返回首个命中的标签，未命中返回空串"""
+    for kw, tag in table:
+        if kw in text:
+            return tag
+    return ''
+
+# 场景标题前缀 / 时间标记（模块级元组，startswith 可一次在C层匹配多个前缀）
+_IE_PREFIXES = ('INT.', 'EXT.', 'INT/EXT')
+_TOD_TOKENS = (' DAY', ' NIGHT', ' DAWN', ' DUSK')
+_EXT_HINTS = ('外', '室外', 'ext.')
+
+
+@functools.lru_cache(maxsize=512)
+def _standardize_setting(s: Optional[str]) -> str:
+    """将场景 setting 标准化为 `INT./EXT. 地点 – DAY/NIGHT`，缺失时补全 INT./EXT. 与 TOD。
+    纯函数，按 setting 字符串缓存（多集常共用同一地点）。"""
+    txt = (s or 'SCENE').strip()
+    up = txt.upper()
+    if up.startswith(_IE_PREFIXES) and any(k in up for k in _TOD_TOKENS):
+        return txt
+    # 猜测INT/EXT
+    ie = 'INT.'
+    low = txt.lower()
+    if any(k in low for k in _EXT_HINTS):
+        ie = 'EXT.'
+    # 提取地点（去掉已有前缀）
+    loc = txt
+    loc = loc.replace('INT.', '').replace('EXT.', '').replace('INT/EXT.', '').strip(' -–—')
+    if not loc:
+        loc = 'LOCATION'
+    # 猜测TOD
+    tod = 'DAY'
+    if any(k in low for k in ['夜', 'night']):
+        tod = 'NIGHT'
+    elif any(k in low for k in ['黄昏', 'dusk']):
+        tod = 'DUSK'
+    elif any(k in low for k in ['黎明', '清晨', 'dawn']):
+        tod = 'DAWN'
+    return f"{ie} {loc} – {tod}"
+
+
+def _preupper_script_flow(script_flow: Dict) -> Dict:
+    """加载后一次性将 scenes[*].elements[*].element_type 规范为大写（原地修改），
+    下游直接与 'DIALOGUE'/'ACTION' 比较，无需在各循环中重复 upper()。"""
+    for sc in script_flow.get('scenes') or _EMPTY:
+        for el in sc.get('elements') or _EMPTY:
+            el['element_type'] = (el.get('element_type') or '').upper()
+    return script_flow
+
+# 缓存版本：调整提示词模板或后处理输入格式时递增，使旧缓存失效
+_LLM_CACHE_VERSION = "2"
+
+# 计入缓存键的步骤配置项：仅限影响 LLM 输出的项（模式、视频证据、场景合并）；
+# 并发度、render_only、enable_legacy_write 等开关不改变输出，不计入
+_CACHE_KEY_STEP_FIELDS = ("stmf_mode", "use_video", "scene_batch_max_chars")
+
+_HOLLYWOOD_SYSTEM_INSTRUCTION = (
+    "你是一位资深好莱坞编剧格式顾问。请将给定的简化剧本流(script_flow)重写为方括号STMF，"
+    "严格使用以下标签：[EPISODE]/[SCENE]/[ACTION]/[CHARACTER]/[PAREN]/[DIALOG]/[TRANS]。"
+    "**必须完整输出所有输入内容，不得截断或省略。**"
+    "请严格依据输入内容进行改写，禁止杜撰或强化结尾效果。"
+)
+
+
+# 旧版撰写路径的输出Schema（模块级常量，避免每集重复构建）
+_SCRIPT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "meta": {
+            "type": "OBJECT",
+            "properties": {
+                "episode_id": {"type": "STRING"},
+                "title": {"type": "STRING"},
+                "duration": {"type": "NUMBER"},
+                "total_scenes": {"type": "INTEGER"},
+                "main_characters": {
+                    "type": "ARRAY",
+                    "items": {"type": "STRING"}
+                }
+            },
+            "required": ["episode_id", "title", "duration", "total_scenes", "main_characters"]
+        },
+        "scenes": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "scene_id": {"type": "STRING"},
+                    "slug": {"type": "STRING"},
+                    "location": {"type": "STRING"},
+                    "time_of_day": {"type": "STRING"},
+                    "characters": {
+                        "type": "ARRAY",
+                        "items": {"type": "STRING"}
+                    },
+                    "action_lines": {
+                        "type": "ARRAY",
+                        "items": {"type": "STRING"}
+                    },
+                    "dialogues": {
+                        "type": "ARRAY",
+                        "items": {
+                            "type": "OBJECT",
+                            "properties": {
+                                "character": {"type": "STRING"},
+                                "display_name": {"type": "STRING"},
+                                "dialogue": {"type": "STRING"}
+                            },
+                            "required": ["character", "display_name", "dialogue"]
+                        }
+                    }
+                },
+                "required": ["scene_id", "slug", "location", "time_of_day", "characters", "action_lines", "dialogues"]
+            }
+        },
+        "stmf_content": {"type": "STRING"}
+    },
+    "required": ["meta", "scenes", "stmf_content"]
+}
+
+# 单场景方括号STMF输出为纯字符串
+_SCENE_STMF_SCHEMA = {"type": "STRING"}
+
+# 多场景合并请求时，输入与输出中场景之间的分隔行
+_SCENE_BOUNDARY = "=== SCENE_BOUNDARY ==="
+
+
+def _fast_load(path: str, default: Any = None) -> Any:
+    """读取JSON文件；orjson 可用时直接解析字节，省去解码与 json 模块开销"""
+    if orjson is None:
+        return PipelineUtils.load_json_file(path, default)
+    try:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    except Exception as e:
+        log.info(f"Warning: 无法读取 {path}: {e}")
+        return default
+
+
+def _fast_dump(path: str, obj: Any) -> None:
+    """写入JSON文件；orjson/msgspec 可用时直接写出UTF-8字节（二者均原生支持数据类）"""
+    if orjson is not None:
+        data = orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    elif msgspec is not None:
+        data = msgspec.json.format(msgspec.json.encode(obj), indent=2)
+    else:
+        PipelineUtils.save_json_file(path, asdict(obj) if is_dataclass(obj) else obj)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+@dataclass(slots=True)
+class ScriptScene:
     """剧本场景"""
     scene_id: str
     slug: str  # 场景标题，如 "INT. 菜市场 - DAY"
@@ -26,7 +236,8 @@ class ScriptScene(BaseModel):
     action_lines: List[str]
     dialogues: List[Dict[str, Any]]
 
-class ScriptMeta(BaseModel):
+@dataclass(slots=True)
+class ScriptMeta:
     """剧本元数据"""
     episode_id: str
     title: str
@@ -34,7 +245,8 @@ class ScriptMeta(BaseModel):
     total_scenes: int
     main_characters: List[str]
 
-class EpisodeScript(BaseModel):
+@dataclass(slots=True)
+class EpisodeScript:
     """单集剧本"""
     meta: ScriptMeta
     scenes: List[ScriptScene]
@@ -43,6 +255,17 @@ class EpisodeScript(BaseModel):
 class Step0_7ScriptWriting(PipelineStep):
     """Step0.7: 剧本撰写"""
     
+    def __init__(self, config):
+        super().__init__(config)
+        step_conf = self.config.get_step_config_by_name('step0_7')
+        try:
+            max_inflight = int(step_conf.get('max_inflight_llm_calls', 8))
+        except Exception:
+            max_inflight = 8
+        # 全局在途 LLM 调用上限，避免剧集×场景双层并发触发限流
+        self._llm_slots = threading.BoundedSemaphore(max(1, max_inflight))
+        self._max_workers_cached: Optional[int] = None
+    
     @property
     def step_number(self) -> int:
         return 7
@@ -77,14 +300,18 @@ class Step0_7ScriptWriting(PipelineStep):
             )
             return os.path.exists(flow_file)
         else:
-            # 检查所有剧集的Step0.6输出
+            # 检查所有剧集的Step0.6输出（并发 stat，网络文件系统上可重叠各次探测延迟）
             episodes = self.utils.get_episode_list(self.config.project_root)
-            for ep in episodes:
-                flow_file = os.path.join(
-                    self.utils.get_episode_output_dir(self.config.output_dir, ep),
-                    "0_6_script_flow.json"
-                )
-                if not os.path.exists(flow_file):
+            flow_files = [
+                os.path.join(self.utils.get_episode_output_dir(self.config.output_dir, ep), "0_6_script_flow.json")
+                for ep in episodes
+            ]
+            if not flow_files:
+                return True
+            with ThreadPoolExecutor(max_workers=min(32, len(flow_files))) as executor:
+                exists = list(executor.map(os.path.exists, flow_files))
+            for flow_file, ok in zip(flow_files, exists):
+                if not ok:
                     log.info(f"缺少依赖文件: {flow_file}")
                     return False
             return True
@@ -125,10 +352,10 @@ class Step0_7ScriptWriting(PipelineStep):
         
         script_flow = {}
         if os.path.exists(flow_file):
-            script_flow = self.utils.load_json_file(flow_file, {})
+            script_flow = _preupper_script_flow(_fast_load(flow_file, {}) or {})
         dialogue_turns = []
         if os.path.exists(turns_file):
-            td = self.utils.load_json_file(turns_file, {})
+            td = _fast_load(turns_file, {})
             dialogue_turns = td.get("dialogue_turns", [])
         
         # 获取视频URI
@@ -141,10 +368,20 @@ class Step0_7ScriptWriting(PipelineStep):
             step_conf = self.config.get_step_config_by_name('step0_7')
             stmf_mode = (step_conf.get('stmf_mode') or 'bracketed').lower()
             use_video = bool(step_conf.get('use_video', False))
+            cache_file = None
+            if script_flow:
+                cache_key = self._compute_cache_key(flow_file, turns_file, model_config, step_conf, video_uri)
+                cache_file = self._get_cache_file(cache_key)
+            
+            # 仅本地渲染：完全跳过 LLM，复用已缓存的结果
+            if step_conf.get('render_only') or os.environ.get('STEP0_7_RENDER_ONLY') == '1':
+                return self._render_only_path(episode_id, script_flow, dialogue_turns, cache_file,
+                                              script_file, analysis_file, use_video, start_time)
             
             # 优先：基于 Step0.6 简化输出 script_flow，通过 LLM 重写为好莱坞风格的方括号 STMF
             if script_flow and stmf_mode == 'bracketed':
-                stmf_content = self._render_from_script_flow_hollywood(script_flow, dialogue_turns, episode_id, model_config, use_video, video_uri)
+                stmf_content = self._render_from_script_flow_hollywood(script_flow, dialogue_turns, episode_id, model_config, use_video, video_uri,
+                                                                       cache_file=cache_file)
                 # 日志记录 stmf_content 位置
                 log.info(f"{episode_id}，{stmf_content} 0_7_script.stmf: {script_file}")
                 self.utils.save_text_file(script_file, stmf_content)
@@ -156,12 +393,14 @@ class Step0_7ScriptWriting(PipelineStep):
                     "scenes_count": len((script_flow or {}).get("scenes", [])),
                     "beats_count": 0
                 }
-                self.utils.save_json_file(analysis_file, analysis)
+                _fast_dump(analysis_file, analysis)
                 processing_time = time.time() - start_time
                 log.info(f"✅ {episode_id} Step0.7 完成 (用时: {processing_time:.2f}秒)")
                 return {"status": "success", "processing_time": round(processing_time, 2), "scenes_count": analysis["scenes_count"], "characters_count": None, "total_dialogues": len(dialogue_turns)}
             
-            # 否则：使用现有生成/规范化逻辑（兼容保留）
+            # 否则：使用现有生成/规范化逻辑（兼容保留，需显式开启，避免空 plot_data 白白消耗一次 LLM 调用）
+            if not step_conf.get('enable_legacy_write', False):
+                raise ConfigError("旧版剧本撰写路径未启用（script_flow 为空或 stmf_mode 非 bracketed），如需使用请设置 enable_legacy_write: true")
             plot_data = {}
             script_result = self._write_script(plot_data, dialogue_turns, video_uri, model_config, episode_id)
             step_conf2 = self.config.get_step_config(7)
@@ -172,7 +411,7 @@ class Step0_7ScriptWriting(PipelineStep):
                 normalized_stmf = self._normalize_stmf_for_fountain(script_result.stmf_content)
             script_result.stmf_content = normalized_stmf
             self.utils.save_text_file(script_file, normalized_stmf)
-            self.utils.save_json_file(analysis_file, script_result.dict())
+            _fast_dump(analysis_file, script_result)
             processing_time = time.time() - start_time
             log.info(f"✅ {episode_id} Step0.7 完成 (用时: {processing_time:.2f}秒),{script_file}保存了STMF文件")
             return {"status": "success", "processing_time": round(processing_time, 2), "scenes_count": len(script_result.scenes), "characters_count": None, "total_dialogues": len(dialogue_turns)}
@@ -180,6 +419,37 @@ class Step0_7ScriptWriting(PipelineStep):
             log.info(f"❌ {episode_id} Step0.7 失败: {e}")
             return {"status": "failed", "error": str(e)}
 
+    def _render_only_path(self, episode_id: str, script_flow: Dict, dialogue_turns: List[Dict],
+                          cache_file: Optional[str], script_file: str, analysis_file: str,
+                          use_video: bool, start_time: float) -> Dict[str, Any]:
+        """仅本地渲染STMF，不调用LLM：
+        - 优先使用内容哈希缓存中的逐场景LLM输出，重新执行后处理
+        - 其次使用已有的 0_7_script_analysis.json（旧版撰写结果）经 _render_bracketed_from_json 渲染
+        """
+        scenes = (script_flow or {}).get('scenes') or []
+        raw_outputs = self._load_scene_cache(cache_file, len(scenes)) if scenes else None
+        if raw_outputs is not None:
+            stmf_content = self._assemble_scene_outputs(script_flow, episode_id, raw_outputs)
+            scenes_count = len(scenes)
+            _fast_dump(analysis_file, {
+                "episode_id": episode_id,
+                "mode": "script_flow_hollywood",
+                "use_video": use_video,
+                "scenes_count": scenes_count,
+                "beats_count": 0
+            })
+        else:
+            analysis = _fast_load(analysis_file, {}) if os.path.exists(analysis_file) else {}
+            if not isinstance(analysis, dict) or not analysis.get('scenes'):
+                log.info(f"❌ {episode_id} render_only 模式下无可用缓存，跳过")
+                return {"status": "failed", "error": "render_only 模式下无可用缓存"}
+            stmf_content = self._render_bracketed_from_json(analysis, dialogue_turns, episode_id)
+            scenes_count = len(analysis['scenes'])
+        self.utils.save_text_file(script_file, stmf_content)
+        processing_time = time.time() - start_time
+        log.info(f"✅ {episode_id} Step0.7 本地渲染完成 (用时: {processing_time:.2f}秒)")
+        return {"status": "success", "processing_time": round(processing_time, 2), "scenes_count": scenes_count, "characters_count": None, "total_dialogues": len(dialogue_turns)}
+
     def _write_script(self, plot_data: Dict, dialogue_turns: List[Dict], 
                      video_uri: str, model_config: Dict, episode_id: str) -> EpisodeScript:
         """撰写剧本"""
@@ -296,7 +566,7 @@ class Step0_7ScriptWriting(PipelineStep):
 {self._format_plot_data(plot_data)}
 
 **对话轮次数据**:
-{self._format_dialogue_turns(dialogue_turns)}
+{self._format_dialogue_turns(dialogue_turns, step_conf.get('max_turns_in_prompt', 400))}
 
 **撰写要求**:
 
@@ -327,67 +597,11 @@ class Step0_7ScriptWriting(PipelineStep):
 
 请生成完整的STMF格式剧本，确保格式正确、内容完整、专业规范。"""
 
-        # 定义输出Schema
-        schema = {
-            "type": "OBJECT",
-            "properties": {
-                "meta": {
-                    "type": "OBJECT",
-                    "properties": {
-                        "episode_id": {"type": "STRING"},
-                        "title": {"type": "STRING"},
-                        "duration": {"type": "NUMBER"},
-                        "total_scenes": {"type": "INTEGER"},
-                        "main_characters": {
-                            "type": "ARRAY",
-                            "items": {"type": "STRING"}
-                        }
-                    },
-                    "required": ["episode_id", "title", "duration", "total_scenes", "main_characters"]
-                },
-                "scenes": {
-                    "type": "ARRAY",
-                    "items": {
-                        "type": "OBJECT",
-                        "properties": {
-                            "scene_id": {"type": "STRING"},
-                            "slug": {"type": "STRING"},
-                            "location": {"type": "STRING"},
-                            "time_of_day": {"type": "STRING"},
-                            "characters": {
-                                "type": "ARRAY",
-                                "items": {"type": "STRING"}
-                            },
-                            "action_lines": {
-                                "type": "ARRAY",
-                                "items": {"type": "STRING"}
-                            },
-                            "dialogues": {
-                                "type": "ARRAY",
-                                "items": {
-                                    "type": "OBJECT",
-                                    "properties": {
-                                        "character": {"type": "STRING"},
-                                        "display_name": {"type": "STRING"},
-                                        "dialogue": {"type": "STRING"}
-                                    },
-                                    "required": ["character", "display_name", "dialogue"]
-                                }
-                            }
-                        },
-                        "required": ["scene_id", "slug", "location", "time_of_day", "characters", "action_lines", "dialogues"]
-                    }
-                },
-                "stmf_content": {"type": "STRING"}
-            },
-            "required": ["meta", "scenes", "stmf_content"]
-        }
-        
         kwargs = {
             'model': model_config['model'],
             'prompt': user_prompt,
             'system_instruction': system_instruction,
-            'schema': schema,
+            'schema': _SCRIPT_SCHEMA,
             'max_tokens': model_config.get('max_tokens', 65535),
             'temperature': model_config.get('temperature', 0.1)
         }
@@ -404,50 +618,59 @@ class Step0_7ScriptWriting(PipelineStep):
     
     def _format_plot_data(self, plot_data: Dict) -> str:
         """格式化情节数据"""
-        formatted = []
-        formatted.append(f"剧集ID: {plot_data.get('episode_id', 'N/A')}")
-        formatted.append(f"标题: {plot_data.get('title', 'N/A')}")
-        formatted.append(f"主要角色: {', '.join(plot_data.get('main_characters', []))}")
-        formatted.append(f"场景数量: {len(plot_data.get('scenes', []))}")
-        formatted.append(f"情节节点数量: {len(plot_data.get('plot_beats', []))}")
-        formatted.append("")
+        buf = io.StringIO()
+        buf.write(f"剧集ID: {plot_data.get('episode_id', 'N/A')}\n")
+        buf.write(f"标题: {plot_data.get('title', 'N/A')}\n")
+        buf.write(f"主要角色: {', '.join(plot_data.get('main_characters', []))}\n")
+        buf.write(f"场景数量: {len(plot_data.get('scenes', []))}\n")
+        buf.write(f"情节节点数量: {len(plot_data.get('plot_beats', []))}\n")
+        buf.write("\n")
         
         # 场景信息
-        formatted.append("场景信息:")
+        buf.write("场景信息:\n")
         for scene in plot_data.get('scenes', []):
-            formatted.append(f"  场景 {scene.get('scene_id', 'N/A')}: {scene.get('location', 'N/A')}")
-            formatted.append(f"    轮次: {scene.get('start_turn', 0)}-{scene.get('end_turn', 0)}")
-            formatted.append(f"    角色: {', '.join(scene.get('characters', []))}")
-            formatted.append(f"    关键事件: {', '.join(scene.get('key_events', []))}")
-            formatted.append(f"    情感弧线: {scene.get('emotional_arc', 'N/A')}")
-            formatted.append("")
+            buf.write(
+                f"  场景 {scene.get('scene_id', 'N/A')}: {scene.get('location', 'N/A')}\n"
+                f"    轮次: {scene.get('start_turn', 0)}-{scene.get('end_turn', 0)}\n"
+                f"    角色: {', '.join(scene.get('characters', []))}\n"
+                f"    关键事件: {', '.join(scene.get('key_events', []))}\n"
+                f"    情感弧线: {scene.get('emotional_arc', 'N/A')}\n"
+                "\n"
+            )
         
         # 情节节点
-        formatted.append("情节节点:")
+        buf.write("情节节点:\n")
         for beat in plot_data.get('plot_beats', []):
-            formatted.append(f"  节点 {beat.get('beat_id', 'N/A')} ({beat.get('beat_type', 'N/A')})")
-            formatted.append(f"    描述: {beat.get('description', 'N/A')}")
-            formatted.append(f"    参与角色: {', '.join(beat.get('characters_involved', []))}")
-            formatted.append(f"    情感基调: {beat.get('emotional_tone', 'N/A')}")
-            formatted.append("")
+            buf.write(
+                f"  节点 {beat.get('beat_id', 'N/A')} ({beat.get('beat_type', 'N/A')})\n"
+                f"    描述: {beat.get('description', 'N/A')}\n"
+                f"    参与角色: {', '.join(beat.get('characters_involved', []))}\n"
+                f"    情感基调: {beat.get('emotional_tone', 'N/A')}\n"
+                "\n"
+            )
         
-        return "\n".join(formatted)
+        return buf.getvalue()
     
-    def _format_dialogue_turns(self, dialogue_turns: List[Dict]) -> str:
-        """格式化对话轮次数据"""
+    def _format_dialogue_turns(self, dialogue_turns: List[Dict], max_turns: Optional[int] = None) -> str:
+        """格式化对话轮次数据；超过 max_turns 时仅列出前 max_turns 轮，避免提示词超出上下文窗口"""
         if not dialogue_turns:
             return "无对话数据"
         
-        formatted = []
-        formatted.append(f"对话轮次数量: {len(dialogue_turns)}")
-        formatted.append("")
+        buf = io.StringIO()
+        buf.write(f"对话轮次数量: {len(dialogue_turns)}\n")
+        if max_turns and len(dialogue_turns) > max_turns:
+            buf.write(f"（轮次过多，仅列出前 {max_turns} 轮）\n")
+            dialogue_turns = dialogue_turns[:max_turns]
+        buf.write("\n")
         
-        for turn in dialogue_turns:
-            formatted.append(f"轮次 {turn.get('turn_id', 'N/A')}: [{turn.get('speaker', 'N/A')}] {turn.get('full_dialogue', 'N/A')}")
-            formatted.append(f"  情感: {turn.get('emotion', 'N/A')}, 意图: {turn.get('intent', 'N/A')}")
-            formatted.append("")
+        buf.writelines(
+            f"轮次 {turn.get('turn_id', 'N/A')}: [{turn.get('speaker', 'N/A')}] {turn.get('full_dialogue', 'N/A')}\n"
+            f"  情感: {turn.get('emotion', 'N/A')}, 意图: {turn.get('intent', 'N/A')}\n"
+            "\n"
+            for turn in dialogue_turns
+        )
         
-        return "\n".join(formatted)
+        return buf.getvalue()
     
     def _validate_and_convert_result(self, result: Dict, episode_id: str) -> EpisodeScript:
         """验证和转换结果"""
@@ -472,8 +695,32 @@ class Step0_7ScriptWriting(PipelineStep):
             if "stmf_content" not in result:
                 result["stmf_content"] = self._generate_default_stmf(result["meta"], result["scenes"])
             
-            # 创建EpisodeScript对象
-            return EpisodeScript(**result)
+            # 创建EpisodeScript对象（缺失必填字段时抛出异常，走默认结构）
+            if msgspec is not None:
+                return msgspec.convert(result, EpisodeScript, strict=False)
+            meta = result["meta"]
+            return EpisodeScript(
+                meta=ScriptMeta(
+                    episode_id=str(meta["episode_id"]),
+                    title=str(meta["title"]),
+                    duration=float(meta["duration"]),
+                    total_scenes=int(meta["total_scenes"]),
+                    main_characters=[str(c) for c in meta["main_characters"]]
+                ),
+                scenes=[
+                    ScriptScene(
+                        scene_id=str(sc["scene_id"]),
+                        slug=str(sc["slug"]),
+                        location=str(sc["location"]),
+                        time_of_day=str(sc["time_of_day"]),
+                        characters=[str(c) for c in sc["characters"]],
+                        action_lines=[str(a) for a in sc["action_lines"]],
+                        dialogues=[dict(d) for d in sc["dialogues"]]
+                    )
+                    for sc in result["scenes"]
+                ],
+                stmf_content=str(result["stmf_content"])
+            )
             
         except Exception as e:
             log.info(f"Warning: 结果验证失败，使用默认值: {e}")
@@ -532,7 +779,6 @@ class Step0_7ScriptWriting(PipelineStep):
         - 规范PAREN行为：保持`PAREN : 文本`（括号由下游添加）
         - 清理多余空格与多余空行
         """
-        import re
         src = content.split('\n')
         out: List[str] = []
         i = 0
@@ -602,30 +848,26 @@ class Step0_7ScriptWriting(PipelineStep):
             out.append(f"{tag} : {rest}")
             i += 1
 
-        # 二次压缩多余空行
-        normalized: List[str] = []
-        prev_blank = False
-        for l in out:
-            if l.strip() == "":
-                if not prev_blank:
-                    normalized.append("")
-                prev_blank = True
-            else:
-                normalized.append(l)
-                prev_blank = False
-        return "\n".join(normalized).strip() + "\n"
+        # 空行已在追加时压缩（首个分支），无需二次遍历
+        return "\n".join(out).strip() + "\n"
 
     def _render_bracketed_from_json(self, plot_data: Dict, dialogue_turns: List[Dict], episode_id: str) -> str:
         """直接从plot_data与dialogue_turns渲染为方括号STMF，遵循最大兼容格式：
         [EPISODE]/[SCENE]/[ACTION]/[CHARACTER]/[PAREN]/[DIALOG]/[TRANS]
         """
         out_lines: List[str] = []
-        import re
+
+        def emit(line: str) -> None:
+            # 追加时即合并连续空行，省去末尾的二次压缩
+            if line == '' and out_lines and out_lines[-1] == '':
+                return
+            out_lines.append(line)
+
         # EPISODE 头
-        ep_num_match = re.findall(r"\d+", episode_id or "")
+        ep_num_match = _DIGITS_RE.findall(episode_id or "")
         ep_num = ep_num_match[0] if ep_num_match else episode_id
-        out_lines.append(f"[EPISODE] Episode {ep_num}")
-        out_lines.append("")
+        emit(f"[EPISODE] Episode {ep_num}")
+        emit("")
 
         scenes = plot_data.get('scenes', [])
         # 建quick索引：turn_id -> turn
@@ -637,39 +879,29 @@ class Step0_7ScriptWriting(PipelineStep):
         def scene_heading(scene_idx: int, sc: Dict) -> str:
             loc = sc.get('location') or (sc.get('scene_snapshot') or {}).get('location_brief') or '场景'
             loc_up = str(loc).upper()
+            arc = sc.get('emotional_arc') or ''
             tod = '日'
             # 简易TOD判定
-            if '夜' in loc or '夜' in (sc.get('emotional_arc') or ''):
+            if '夜' in loc or '夜' in arc:
                 tod = '夜'
-            elif '白天' in (sc.get('emotional_arc') or ''):
+            elif '白天' in arc:
                 tod = '日'
             # INT/EXT判定
-            scene_type = 'INT.' if any(k in loc for k in ['内','中','室','厅']) else 'EXT.'
+            scene_type = 'EXT.' if _INT_KEYS.isdisjoint(loc) else 'INT.'
             return f"{scene_idx}-1. {scene_type} {loc_up} – {tod}"
 
         def map_emotion_to_paren(em: str, intent: str) -> str:
-            txt = ''
-            if em:
-                if any(k in em for k in ['轻蔑','冷笑']):
-                    txt = '轻蔑'
-                elif any(k in em for k in ['愤怒','生气']):
-                    txt = '愤怒'
-                elif any(k in em for k in ['担忧','不安','焦虑']):
-                    txt = '不安'
-                elif any(k in em for k in ['平静','冷静']):
-                    txt = ''
+            # 平静/冷静类情绪不产生标注，与未命中等价
+            txt = _match_tag(em, _EMOTION_TAGS) if em else ''
             if not txt and intent:
-                if '威胁' in intent or '施压' in intent:
-                    txt = '施压'
-                elif '试探' in intent:
-                    txt = '试探'
+                txt = _match_tag(intent, _INTENT_TAGS)
             return f"({txt})" if txt else ''
 
         scene_index = 1
         for sc in scenes:
             # 场景标题
-            out_lines.append(f"[SCENE] {scene_heading(scene_index, sc)}")
-            out_lines.append("")
+            emit(f"[SCENE] {scene_heading(scene_index, sc)}")
+            emit("")
             scene_index += 1
             # 场景动作（优先snapshot.actions / key_events）
             snap = sc.get('scene_snapshot') or {}
@@ -696,22 +928,22 @@ class Step0_7ScriptWriting(PipelineStep):
             # 开场动作（若有）
             a0 = pop_action()
             if a0:
-                out_lines.append(f"[ACTION] {a0}")
+                emit(f"[ACTION] {a0}")
 
             last_char = None
             for turn in turns_seq:
                 # 每个turn前尝试插入一条动作
                 ai = pop_action()
                 if ai:
-                    out_lines.append(f"[ACTION] {ai}")
+                    emit(f"[ACTION] {ai}")
 
                 spk = (turn.get('speaker') or '').strip()
                 if not spk:
                     continue
                 cue = spk.upper()
                 if cue != last_char:
-                    out_lines.append("")
-                    out_lines.append(f"[CHARACTER] {cue}")
+                    emit("")
+                    emit(f"[CHARACTER] {cue}")
                     last_char = cue
                 # paren（情绪/意图/V.O.等）
                 em = (turn.get('emotion') or '').strip()
@@ -721,33 +953,22 @@ class Step0_7ScriptWriting(PipelineStep):
                 if '(电话' in text or '电话' in text:
                     par = (par[:-1] + '; V.O.)') if par else '(V.O.)'
                 if par:
-                    out_lines.append(f"[PAREN] {par}")
+                    emit(f"[PAREN] {par}")
                 if text:
-                    out_lines.append(f"[DIALOG] {text}")
+                    emit(f"[DIALOG] {text}")
             # 输出剩余动作
             if actions_pool:
-                out_lines.append("")
+                emit("")
                 for a in actions_pool:
-                    out_lines.append(f"[ACTION] {a}")
+                    emit(f"[ACTION] {a}")
                 actions_pool.clear()
 
             # 场景结束转场
-            out_lines.append("")
-            out_lines.append("[TRANS] CUT TO:")
-            out_lines.append("")
+            emit("")
+            emit("[TRANS] CUT TO:")
+            emit("")
 
-        # 压缩空行
-        compact: List[str] = []
-        prev_blank = False
-        for l in out_lines:
-            if l.strip() == '':
-                if not prev_blank:
-                    compact.append("")
-                prev_blank = True
-            else:
-                compact.append(l)
-                prev_blank = False
-        return "\n".join(compact).strip() + "\n"
+        return "\n".join(out_lines).strip() + "\n"
 
     def _render_from_index_and_narrative(self, index_json: Dict[str, Any], narrative_md: str, dialogue_turns: List[Dict], episode_id: str) -> str:
         """基于Step0.6的narrative与index渲染方括号STMF：
@@ -755,20 +976,28 @@ class Step0_7ScriptWriting(PipelineStep):
         - ACTION来自narrative的对应[情节N]段落与index.key_actions
         - 台词来自0.5的turns，按beat起止贴入
         """
-        import re
-        lines: List[str] = []
+        buf = io.StringIO()
+        write = buf.write
+        prev_blank = False
+
+        def blank() -> None:
+            # 写入空行时即合并连续空行，省去末尾的二次压缩
+            nonlocal prev_blank
+            if not prev_blank:
+                write("\n")
+                prev_blank = True
+
         # EPISODE 头
-        import re as _re
-        ep_num_match = _re.findall(r"\d+", episode_id or "")
+        ep_num_match = _DIGITS_RE.findall(episode_id or "")
         ep_num = ep_num_match[0] if ep_num_match else episode_id
-        lines.append(f"[EPISODE] Episode {ep_num}")
-        lines.append("")
+        write(f"[EPISODE] Episode {ep_num}\n")
+        blank()
         # 解析narrative分段
         para_by_idx: Dict[int, List[str]] = {}
         cur = None
         for raw in (narrative_md or '').split('\n'):
             s = raw.strip()
-            m = re.match(r"^\[情节(\d+)\]", s)
+            m = _PLOT_PARA_RE.match(s)
             if m:
                 cur = int(m.group(1))
                 para_by_idx[cur] = []
@@ -787,95 +1016,86 @@ class Step0_7ScriptWriting(PipelineStep):
         # turn索引
         turns_map = {t.get('turn_id'): t for t in (dialogue_turns or []) if isinstance(t, dict)}
         turns_seq = dialogue_turns or []
-        # 场景标题辅助
-        def make_heading(idx: int, heading_hint: str, tod_hint: str) -> str:
-            loc = (heading_hint or '场景').upper()
-            tod = '日'
-            if '夜' in (tod_hint or ''):
-                tod = '夜'
-            stype = 'INT.' if any(k in loc for k in ['内','中','室','厅']) else 'EXT.'
-            return f"{idx}-1. {stype} {loc} – {tod}"
         # 遍历beats（无beats时退化：用scenes整体）
         if beats:
+            # 按 turn_id 预排序轮次下标，按beat区间二分切片（切片内恢复原始顺序）
+            sorted_pos = sorted(
+                (j for j, t in enumerate(turns_seq) if isinstance(t, dict) and t.get('turn_id') is not None),
+                key=lambda j: turns_seq[j]['turn_id']
+            )
+            turn_ids = [turns_seq[j]['turn_id'] for j in sorted_pos]
             scene_idx = 0
             last_scene_id = None
             for i, bt in enumerate(beats, start=1):
                 # 找到所属scene
                 sc_hint = scenes[scene_idx] if scenes else None
                 if sc_hint and (last_scene_id != sc_hint.get('scene_id')):
-                    lines.append(f"[SCENE] {make_heading(scene_idx+1, sc_hint.get('heading_hint',''), sc_hint.get('tod_hint',''))}")
-                    lines.append("")
+                    write(f"[SCENE] {_make_heading(scene_idx+1, sc_hint.get('heading_hint',''), sc_hint.get('tod_hint',''))}\n")
+                    prev_blank = False
+                    blank()
                     last_scene_id = sc_hint.get('scene_id')
                 # ACTION：来自narrative情节段落 i
                 for s in para_by_idx.get(i, []):
                     # 过滤列表前缀标记
-                    s_clean = re.sub(r"^[-•\*]\s*", "", s)
-                    lines.append(f"[ACTION] {s_clean}")
-                # 关键动作补充
-                for a in (bt.get('key_actions') or []):
-                    lines.append(f"[ACTION] {a}")
-                # 对话：按turn区间
+                    s_clean = s[1:].lstrip() if s[0] in _LIST_PREFIX_CHARS else s
+                    write(f"[ACTION] {s_clean}\n")
+                    prev_blank = False
                 st = bt.get('start_turn')
                 ed = bt.get('end_turn')
+                key_actions = bt.get('key_actions') or ()
+                # 关键动作补充
+                for a in key_actions:
+                    write(f"[ACTION] {a}\n")
+                    prev_blank = False
+                # 对话：按turn区间
                 beat_turns = []
                 if st is not None and ed is not None:
-                    for t in turns_seq:
-                        tid = t.get('turn_id')
-                        if tid is not None and st <= tid <= ed:
-                            beat_turns.append(t)
+                    lo = bisect.bisect_left(turn_ids, st)
+                    hi = bisect.bisect_right(turn_ids, ed)
+                    beat_turns = [turns_seq[j] for j in sorted(sorted_pos[lo:hi])]
                 for t in beat_turns:
-                    spk = (t.get('speaker') or '').strip().upper()
+                    spk_raw = t.get('speaker')
+                    if not spk_raw:
+                        continue
+                    spk = spk_raw.strip().upper()
                     if not spk:
                         continue
-                    lines.append(f"[CHARACTER] {spk}")
                     em = (t.get('emotion') or '').strip()
                     it = (t.get('intent') or '').strip()
                     par = ''
                     if em or it:
-                        p = []
-                        if any(k in em for k in ['轻蔑','冷笑']): p.append('轻蔑')
-                        elif any(k in em for k in ['愤怒','生气']): p.append('愤怒')
-                        elif any(k in em for k in ['担忧','不安','焦虑']): p.append('不安')
-                        if '威胁' in it or '施压' in it: p.append('施压')
-                        elif '试探' in it: p.append('试探')
+                        p = [tag for tag in (_match_tag(em, _EMOTION_TAGS), _match_tag(it, _INTENT_TAGS)) if tag]
                         if p:
-                            par = '(' + '; '.join(p) + ')'
+                            par = f"[PAREN] ({'; '.join(p)})\n"
                     text = (t.get('full_dialogue') or '').strip()
-                    if par:
-                        lines.append(f"[PAREN] {par}")
-                    if text:
-                        lines.append(f"[DIALOG] {text}")
-                lines.append("")
-                lines.append("[TRANS] CUT TO:")
-                lines.append("")
+                    # 每个轮次合并为一次写入
+                    write(f"[CHARACTER] {spk}\n{par}[DIALOG] {text}\n" if text else f"[CHARACTER] {spk}\n{par}")
+                    prev_blank = False
+                blank()
+                write("[TRANS] CUT TO:\n")
+                prev_blank = False
+                blank()
         else:
             # 退化：仅按scenes顺序 + 全量turns
             for idx, sc in enumerate(scenes or [], start=1):
-                lines.append(f"[SCENE] {make_heading(idx, sc.get('heading_hint',''), sc.get('tod_hint',''))}")
-                lines.append("")
+                write(f"[SCENE] {_make_heading(idx, sc.get('heading_hint',''), sc.get('tod_hint',''))}\n")
+                prev_blank = False
+                blank()
                 for t in turns_seq:
-                    spk = (t.get('speaker') or '').strip().upper()
+                    spk_raw = t.get('speaker')
+                    if not spk_raw:
+                        continue
+                    spk = spk_raw.strip().upper()
                     if not spk:
                         continue
-                    lines.append(f"[CHARACTER] {spk}")
                     text = (t.get('full_dialogue') or '').strip()
-                    if text:
-                        lines.append(f"[DIALOG] {text}")
-                lines.append("")
-                lines.append("[TRANS] CUT TO:")
-                lines.append("")
-        # 压缩空行
-        compact: List[str] = []
-        prev_blank = False
-        for l in lines:
-            if l.strip() == '':
-                if not prev_blank:
-                    compact.append("")
-                prev_blank = True
-            else:
-                compact.append(l)
+                    write(f"[CHARACTER] {spk}\n[DIALOG] {text}\n" if text else f"[CHARACTER] {spk}\n")
+                    prev_blank = False
+                blank()
+                write("[TRANS] CUT TO:\n")
                 prev_blank = False
-        return "\n".join(compact).strip() + "\n"
+                blank()
+        return buf.getvalue().strip() + "\n"
 
     def _normalize_scene_headings_from_flow(self, script_flow: Dict, stmf_text: str) -> str:
         """将生成的 STMF 中的 [SCENE] 行，按 script_flow.scenes 的顺序替换为标准 setting。
@@ -883,48 +1103,18 @@ class Step0_7ScriptWriting(PipelineStep):
         - 仅替换 [SCENE] 开头的行
         - 避免更改其它内容
         """
-        try:
-            scenes = script_flow.get('scenes') or []
-            def _std(s: str) -> str:
-                txt = (s or 'SCENE').strip()
-                up = txt.upper()
-                has_ie = up.startswith('INT.') or up.startswith('EXT.') or up.startswith('INT/EXT')
-                has_tod = any(t in up for t in [' DAY', ' NIGHT', ' DAWN', ' DUSK']) or ' – ' in txt or ' - ' in txt
-                if has_ie and any(k in up for k in [' DAY', ' NIGHT', ' DAWN', ' DUSK']):
-                    return txt
-                # 猜测INT/EXT
-                ie = 'INT.'
-                low = txt.lower()
-                if any(k in low for k in ['外', '室外', 'ext.']):
-                    ie = 'EXT.'
-                # 提取地点（去掉已有前缀）
-                loc = txt
-                loc = loc.replace('INT.', '').replace('EXT.', '').replace('INT/EXT.', '').strip(' -–—')
-                if not loc:
-                    loc = 'LOCATION'
-                # 猜测TOD
-                tod = 'DAY'
-                if any(k in low for k in ['夜', 'night']):
-                    tod = 'NIGHT'
-                elif any(k in low for k in ['黄昏', 'dusk']):
-                    tod = 'DUSK'
-                elif any(k in low for k in ['黎明', '清晨', 'dawn']):
-                    tod = 'DAWN'
-                return f"{ie} {loc} – {tod}"
-
-            settings = [ _std(s.get('setting')) for s in scenes ]
-            lines = stmf_text.split('\n')
-            out: List[str] = []
-            idx = 0
-            for line in lines:
-                if line.startswith('[SCENE]') and idx < len(settings):
-                    out.append(f"[SCENE] {settings[idx]}")
-                    idx += 1
-                else:
-                    out.append(line)
-            return "\n".join(out).rstrip('\n') + "\n"
-        except Exception:
-            return stmf_text
+        scenes = script_flow.get('scenes') or []
+        settings = [ _standardize_setting(s.get('setting')) for s in scenes ]
+        lines = stmf_text.split('\n')
+        out: List[str] = []
+        idx = 0
+        for line in lines:
+            if line.startswith('[SCENE]') and idx < len(settings):
+                out.append(f"[SCENE] {settings[idx]}")
+                idx += 1
+            else:
+                out.append(line)
+        return "\n".join(out).rstrip('\n') + "\n"
 
     def _postprocess_stmf(self, script_flow: Dict, episode_id: str, stmf_text: str) -> str:
         """后处理 STMF：
@@ -933,112 +1123,89 @@ class Step0_7ScriptWriting(PipelineStep):
         - 移除 [TRANS] 行
         - 压缩空行
         """
-        try:
-            # 移除 [TRANS]
-            lines = [l for l in stmf_text.split('\n') if not l.startswith('[TRANS]')]
+        # 移除 [TRANS]
+        lines = [l for l in stmf_text.split('\n') if not l.startswith('[TRANS]')]
 
-            # 合并连续的 [PAREN] 行
+        # 合并连续的 [PAREN] 行（文本中无 [PAREN] 时跳过）
+        has_par_lines = '[PAREN]' in stmf_text
+        if has_par_lines:
             lines = self._merge_consecutive_paren_lines(lines)
 
-            # 计算剧集编号
-            import re as _re
-            ep_num_match = _re.findall(r"\d+", episode_id or "")
-            ep_num = ep_num_match[0] if ep_num_match else (episode_id or "1")
-            # 去除前导零
-            try:
-                ep_num = str(int(ep_num))
-            except Exception:
-                pass
-
-            # 准备标准化后的 setting 列表
-            def std_setting(s: str) -> str:
-                tmp = self._normalize_scene_headings_from_flow({'scenes':[{'setting':s}]}, '[SCENE] X\n')
-                return tmp.split('\n')[0].replace('[SCENE] ','')
-            settings = [ std_setting((s.get('setting') or 'SCENE').strip()) for s in (script_flow.get('scenes') or []) ]
-
-            # 场景标题编号（追加 narrative_device 后缀）
-            idx = 0
-            for i, l in enumerate(lines):
-                if l.startswith('[SCENE]'):
-                    if idx < len(settings):
-                        suffix = ''
-                        # 从 script_flow 读取 narrative_device
-                        nd = None
-                        if idx < len((script_flow.get('scenes') or [])):
-                            nd = (script_flow['scenes'][idx].get('narrative_device') or '').strip()
-                        if nd:
-                            suffix = f" ({nd})"
-                        lines[i] = f"[SCENE] {ep_num}-{idx+1}. {settings[idx]}{suffix}"
-                    idx += 1
-
-            # 组织每场对白的 parenthetical 列表
-            par_by_scene: List[List[str]] = []
-            for sc in (script_flow.get('scenes') or []):
-                arr: List[str] = []
-                for el in (sc.get('elements') or []):
-                    if (el.get('element_type') or '').upper() == 'DIALOGUE':
-                        arr.append((el.get('parenthetical') or '').strip())
-                par_by_scene.append(arr)
-
-            # 切块：按 [SCENE]
-            blocks: List[List[str]] = []
-            cur: List[str] = []
-            for l in lines:
-                if l.startswith('[SCENE]'):
-                    if cur:
-                        blocks.append(cur)
-                    cur = [l]
-                else:
-                    cur.append(l)
-            if cur:
-                blocks.append(cur)
-            # 修正：若首块不是以 [SCENE] 开头（如包含 [EPISODE] 前言），丢弃该块以与场景索引对齐
-            if blocks and (not blocks[0] or not blocks[0][0].startswith('[SCENE]')):
-                blocks = blocks[1:]
-
-            # 注入 PAREN：改为“忠实渲染上游”，不再自行判断新增，仅当上游提供时渲染
-            new_blocks: List[List[str]] = []
-            for si, block in enumerate(blocks):
-                pars = par_by_scene[si] if si < len(par_by_scene) else []
-                di = 0
-                nb: List[str] = []
-                for l in block:
-                    if l.startswith('[DIALOG]'):
-                        # 检查前一行是否已经是 [PAREN]，如果是则不重复添加
-                        if nb and nb[-1].startswith('[PAREN]'):
-                            # 前一行已经是 [PAREN]，直接添加对话
-                            nb.append(l)
-                        else:
-                            # 前一行不是 [PAREN]，可以注入
-                            par_txt = pars[di] if di < len(pars) else ''
-                            if par_txt:
-                                nb.append(f"[PAREN] ({par_txt})")
-                            nb.append(l)
-                        di += 1
-                    else:
-                        nb.append(l)
-                new_blocks.append(nb)
-
-            # 压缩空行
-            out: List[str] = []
-            prev_blank = False
-            for block in new_blocks:
-                for l in block:
-                    if l.strip() == '':
-                        if not prev_blank:
-                            out.append('')
-                        prev_blank = True
-                    else:
-                        out.append(l.rstrip())
-                        prev_blank = False
-            return "\n".join(out).rstrip('\n') + "\n"
+        # 计算剧集编号
+        ep_num_match = _DIGITS_RE.findall(episode_id or "")
+        ep_num = ep_num_match[0] if ep_num_match else (episode_id or "1")
+        # 去除前导零
+        try:
+            ep_num = str(int(ep_num))
         except Exception:
-            return stmf_text
+            pass
+
+        # 准备标准化后的 setting 列表
+        settings = [ _standardize_setting((s.get('setting') or 'SCENE').strip()) for s in (script_flow.get('scenes') or []) ]
+
+        # 记录 [SCENE] 行下标，供标题编号与切块共用
+        scene_starts = [i for i, l in enumerate(lines) if l.startswith('[SCENE]')]
+
+        # 场景标题编号（追加 narrative_device 后缀）
+        for idx, i in enumerate(scene_starts):
+            if idx < len(settings):
+                suffix = ''
+                # 从 script_flow 读取 narrative_device（上游场景结构不规范时忽略）
+                nd = None
+                try:
+                    nd = (script_flow['scenes'][idx].get('narrative_device') or '').strip()
+                except (IndexError, KeyError, AttributeError, TypeError):
+                    pass
+                if nd:
+                    suffix = f" ({nd})"
+                lines[i] = f"[SCENE] {ep_num}-{idx+1}. {settings[idx]}{suffix}"
+
+        # 组织每场对白的 parenthetical 列表
+        par_by_scene: List[List[str]] = [
+            [
+                (el.get('parenthetical') or '').strip()
+                for el in (sc.get('elements') or _EMPTY)
+                if el.get('element_type') == 'DIALOGUE'
+            ]
+            for sc in (script_flow.get('scenes') or _EMPTY)
+        ]
+        # 上游无任何 parenthetical 时无需逐条对白注入
+        has_upstream_par = any(any(pars) for pars in par_by_scene)
+
+        # 切块：按 [SCENE] 下标划分区间；首个 [SCENE] 之前的前言（如 [EPISODE]）不属于任何场景，直接丢弃
+        scene_ranges = zip(scene_starts, scene_starts[1:] + [len(lines)])
+
+        # 注入 PAREN：改为“忠实渲染上游”，不再自行判断新增，仅当上游提供时渲染
+        # 输出时同步压缩空行，单次遍历完成
+        out: List[str] = []
+        prev_blank = False
+        for si, (start, end) in enumerate(scene_ranges):
+            pars = par_by_scene[si] if si < len(par_by_scene) else []
+            di = 0
+            for k in range(start, end):
+                l = lines[k]
+                if l.strip() == '':
+                    if not prev_blank:
+                        out.append('')
+                    prev_blank = True
+                    continue
+                prev_blank = False
+                if has_upstream_par and l.startswith('[DIALOG]'):
+                    # 前一行已经是 [PAREN] 则不重复添加，否则按上游注入
+                    if not (out and out[-1].startswith('[PAREN]')):
+                        par_txt = pars[di] if di < len(pars) else ''
+                        if par_txt:
+                            out.append(f"[PAREN] ({par_txt})")
+                    di += 1
+                out.append(l.rstrip())
+        return "\n".join(out).rstrip('\n') + "\n"
 
     def _extract_attr_value(self, line: str, attr_name: str) -> str:
         """从STMF行中提取属性值"""
-        import re
-        match = re.search(rf"\[{re.escape(attr_name)}\] : (.*)", line)
+        pattern = _ATTR_RE_CACHE.get(attr_name)
+        if pattern is None:
+            pattern = _ATTR_RE_CACHE.setdefault(attr_name, re.compile(rf"\[{re.escape(attr_name)}\] : (.*)"))
+        match = pattern.search(line)
         if match:
             return match.group(1).strip()
         return ""
@@ -1047,6 +1214,9 @@ class Step0_7ScriptWriting(PipelineStep):
         """合并连续的 [PAREN] 行"""
         if not lines:
             return lines
+        # 快速路径：无 [PAREN] 行时原样返回，不再分配新列表
+        if not any(l.startswith('[PAREN]') for l in lines):
+            return lines
         
         result = []
         i = 0
@@ -1057,11 +1227,14 @@ class Step0_7ScriptWriting(PipelineStep):
                 paren_contents = []
                 while i < len(lines) and lines[i].startswith('[PAREN]'):
                     paren_line = lines[i]
-                    # 提取括号内的内容
-                    import re
-                    match = re.search(r'\[PAREN\] \((.*?)\)', paren_line)
-                    if match:
-                        paren_contents.append(match.group(1))
+                    # 提取括号内的内容：标准形态 `[PAREN] (...)` 直接切片，其余回退正则
+                    body = paren_line[9:-1]
+                    if paren_line.startswith('[PAREN] (') and paren_line.endswith(')') and ')' not in body:
+                        paren_contents.append(body)
+                    else:
+                        match = _PAREN_EXTRACT_RE.search(paren_line)
+                        if match:
+                            paren_contents.append(match.group(1))
                     i += 1
                 
                 # 合并所有情绪标注
@@ -1076,10 +1249,15 @@ class Step0_7ScriptWriting(PipelineStep):
         
         return result
 
-    def _format_script_flow_for_prompt(self, script_flow: Dict, dialogue_turns: List[Dict]) -> str:
-        """将 Step0.6 的 script_flow 压缩为可读提示片段。"""
+    def _format_script_flow_title_line(self, script_flow: Dict) -> str:
+        """提示片段首行：剧集与标题"""
+        return f"剧集: {script_flow.get('episode_id','N/A')}｜标题: {script_flow.get('title','N/A')}"
+
+    def _format_script_flow_for_prompt(self, script_flow: Dict, dialogue_turns: List[Dict],
+                                       title_line: Optional[str] = None) -> str:
+        """将 Step0.6 的 script_flow 压缩为可读提示片段。title_line 可由调用方预先计算后复用。"""
         lines: List[str] = []
-        lines.append(f"剧集: {script_flow.get('episode_id','N/A')}｜标题: {script_flow.get('title','N/A')}")
+        lines.append(title_line if title_line is not None else self._format_script_flow_title_line(script_flow))
         scenes = script_flow.get('scenes') or []
         lines.append(f"场景数: {len(scenes)}")
         for sc in scenes:
@@ -1088,7 +1266,7 @@ class Step0_7ScriptWriting(PipelineStep):
             lines.append(f"- 场景 {sid}: {setting}")
             els = sc.get('elements') or []
             for el in els:
-                et = (el.get('element_type') or '').upper()
+                et = el.get('element_type')
                 if et == 'ACTION':
                     content = (el.get('content') or '').strip()
                     if content:
@@ -1115,33 +1293,29 @@ class Step0_7ScriptWriting(PipelineStep):
             out_lines: List[str] = []
             out_lines.append("示例输入（节选，自第一场）：")
             out_lines.append(f"- 场景 {sid}: {setting}")
-            for el in (sc.get('elements') or [])[:8]:
-                et = (el.get('element_type') or '').upper()
+            # 前 8 个元素只读取一次字段，输入/输出两段示例共用（无内容的元素两段均跳过）
+            elements_head = []
+            for el in (sc.get('elements') or _EMPTY)[:8]:
                 content = (el.get('content') or '').strip()
-                if not content:
-                    continue
+                if content:
+                    elements_head.append((el.get('element_type'), (el.get('character') or 'UNKNOWN').upper(),
+                                          content, (el.get('parenthetical') or '').strip()))
+            for et, speaker, content, _ in elements_head:
                 if et == 'ACTION':
                     out_lines.append(f"  ACTION: {content}")
                 elif et == 'DIALOGUE':
-                    speaker = (el.get('character') or 'UNKNOWN').upper()
                     out_lines.append(f"  DIALOGUE [{speaker}]: {content}")
 
             out_lines.append("")
             out_lines.append("对应输出（方括号STMF示例，仅展示第一场）：")
             out_lines.append(f"[SCENE] {setting}")
             out_lines.append("")
-            for el in (sc.get('elements') or [])[:8]:
-                et = (el.get('element_type') or '').upper()
-                content = (el.get('content') or '').strip()
-                if not content:
-                    continue
+            for et, speaker, content, par in elements_head:
                 if et == 'ACTION':
                     out_lines.append(f"[ACTION] {content}")
                 elif et == 'DIALOGUE':
-                    speaker = (el.get('character') or 'UNKNOWN').upper()
                     out_lines.append(f"[CHARACTER] {speaker}")
                     # 若上游已提供 parenthetical，则展示，强化示范
-                    par = (el.get('parenthetical') or '').strip()
                     if par:
                         out_lines.append(f"[PAREN] ({par})")
                     out_lines.append(f"[DIALOG] {content}")
@@ -1150,14 +1324,49 @@ class Step0_7ScriptWriting(PipelineStep):
             return ""
 
     def _render_from_script_flow_hollywood(self, script_flow: Dict, dialogue_turns: List[Dict], episode_id: str,
-                                           model_config: Dict, use_video: bool, video_uri: Optional[str]) -> str:
+                                           model_config: Dict, use_video: bool, video_uri: Optional[str],
+                                           cache_file: Optional[str] = None) -> str:
         """使用 Gemini 将 script_flow 重写为好莱坞风格的方括号 STMF。"""
         
         # 尝试分段处理来解决截断问题
-        return self._render_script_flow_in_chunks(script_flow, dialogue_turns, episode_id, model_config, use_video, video_uri)
+        return self._render_script_flow_in_chunks(script_flow, dialogue_turns, episode_id, model_config, use_video, video_uri,
+                                                  cache_file=cache_file)
     
+    def _compute_cache_key(self, flow_file: str, turns_file: str, model_config: Dict,
+                           step_conf: Dict, video_uri: Optional[str]) -> str:
+        """基于输入内容计算LLM结果缓存键（输入文件字节 + 模型生成参数 + 系统指令 + 影响输出的步骤配置项）"""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(_LLM_CACHE_VERSION.encode('utf-8'))
+        for path in (flow_file, turns_file):
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    h.update(f.read())
+            h.update(b'\0')
+        # 模型配置全部为生成参数（model/max_tokens/temperature/top_p/top_k），整体计入
+        h.update(json.dumps(model_config or {}, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+        h.update(_HOLLYWOOD_SYSTEM_INSTRUCTION.encode('utf-8'))
+        key_conf = {k: (step_conf or {}).get(k) for k in _CACHE_KEY_STEP_FIELDS}
+        h.update(json.dumps(key_conf, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+        h.update(str(video_uri or '').encode('utf-8'))
+        return h.hexdigest()
+
+    def _get_cache_file(self, cache_key: str) -> str:
+        """LLM结果缓存文件路径"""
+        return os.path.join(self.config.output_dir, '.cache', 'step0_7', f"{cache_key}.json")
+
+    def _load_scene_cache(self, cache_file: Optional[str], scenes_count: int) -> Optional[List[str]]:
+        """读取逐场景的LLM原始输出缓存；场景数不一致视为未命中"""
+        if not cache_file or not os.path.exists(cache_file):
+            return None
+        cached = _fast_load(cache_file, {}) or {}
+        raw_outputs = cached.get('scene_outputs') if isinstance(cached, dict) else None
+        if not isinstance(raw_outputs, list) or len(raw_outputs) != scenes_count:
+            return None
+        return [str(r or '') for r in raw_outputs]
+
     def _render_script_flow_in_chunks(self, script_flow: Dict, dialogue_turns: List[Dict], episode_id: str,
-                                     model_config: Dict, use_video: bool, video_uri: Optional[str]) -> str:
+                                     model_config: Dict, use_video: bool, video_uri: Optional[str],
+                                     cache_file: Optional[str] = None) -> str:
         """分段处理 script_flow 以避免截断问题"""
         
         # 检查是否有多个场景，如果有，分别处理
@@ -1165,32 +1374,139 @@ class Step0_7ScriptWriting(PipelineStep):
         if len(scenes) == 0:
             return ""
         
-        all_results = []
-        
-        for scene in scenes:
-            # 为每个场景创建单独的 script_flow
-            single_scene_flow = {
-                'title': script_flow.get('title', ''),
-                'scenes': [scene]
-            }
-            
-            # 处理单个场景
-            scene_result = self._render_single_scene_hollywood(
-                single_scene_flow, dialogue_turns, episode_id, model_config, use_video, video_uri
-            )
-            all_results.append(scene_result)
+        # 命中缓存时跳过 LLM，仅在本地执行后处理
+        raw_outputs = self._load_scene_cache(cache_file, len(scenes))
+        if raw_outputs is not None:
+            log.info(f"✅ {episode_id} 命中Step0.7缓存，跳过LLM调用: {cache_file}")
+        else:
+            # 为每个场景创建单独的 script_flow（scenes 用单元素元组：下游只读，无需列表）
+            title = script_flow.get('title', '')
+            single_scene_flows = [{'title': title, 'scenes': (scene,)} for scene in scenes]
+            # 同一集内各场景共用的提示片段只构建一次：标题行取自整集，格式示例取自第一场
+            title_line = self._format_script_flow_title_line(script_flow)
+            example_block = self._create_dynamic_bracketed_example(script_flow)
+            # 短场景合并为一次请求，减少重复发送系统指令与规范的次数
+            step_conf = self.config.get_step_config_by_name('step0_7')
+            try:
+                batch_max_chars = int(step_conf.get('scene_batch_max_chars', 8000))
+            except Exception:
+                batch_max_chars = 8000
+            # 每个场景的提示片段只格式化一次，合并分批与请求组装共用
+            formatted_scenes = [
+                self._format_script_flow_for_prompt(ssf, dialogue_turns, title_line=title_line)
+                for ssf in single_scene_flows
+            ]
+            batches = self._pack_scene_batches(formatted_scenes, batch_max_chars)
+            if len(batches) < len(scenes):
+                log.info(f"{episode_id} {len(scenes)} 个场景合并为 {len(batches)} 次LLM请求")
+            # 批次间并行请求（网络IO为主）；map 保持输出顺序与场景顺序一致
+            scene_workers = max(1, min(self._get_scene_parallelism(), len(batches)))
+            with ThreadPoolExecutor(max_workers=scene_workers) as executor:
+                batch_outputs = list(executor.map(
+                    lambda batch: self._request_scene_batch_stmf(
+                        [single_scene_flows[i] for i in batch], [formatted_scenes[i] for i in batch],
+                        dialogue_turns, model_config, use_video, video_uri,
+                        title_line=title_line, example_block=example_block),
+                    batches
+                ))
+            raw_outputs = [raw for outputs in batch_outputs for raw in outputs]
+            # 仅在全部场景均有输出时写入缓存，避免固化失败结果
+            if cache_file and all(raw_outputs):
+                _fast_dump(cache_file, {"episode_id": episode_id, "scene_outputs": raw_outputs})
         
+        return self._assemble_scene_outputs(script_flow, episode_id, raw_outputs)
+
+    def _get_scene_parallelism(self) -> int:
+        """单集内场景级并行度：步骤配置 scene_parallelism，默认 4"""
+        step_conf = self.config.get_step_config_by_name('step0_7')
+        try:
+            return max(1, int(step_conf.get('scene_parallelism', 4)))
+        except Exception:
+            return 4
+
+    def _pack_scene_batches(self, formatted_scenes: List[str], max_chars: int) -> List[List[int]]:
+        """按已格式化的提示片段长度贪心合并相邻场景，每批输入字符数不超过 max_chars；
+        单场景超限时独占一批，max_chars<=0 时不合并。"""
+        batches: List[List[int]] = []
+        cur: List[int] = []
+        cur_chars = 0
+        for i, formatted in enumerate(formatted_scenes):
+            size = len(formatted)
+            if cur and (max_chars <= 0 or cur_chars + size > max_chars):
+                batches.append(cur)
+                cur, cur_chars = [], 0
+            cur.append(i)
+            cur_chars += size
+        if cur:
+            batches.append(cur)
+        return batches
+
+    def _request_scene_batch_stmf(self, scene_flows: List[Dict], formatted_scenes: List[str], dialogue_turns: List[Dict],
+                                  model_config: Dict, use_video: bool, video_uri: Optional[str],
+                                  title_line: Optional[str] = None, example_block: Optional[str] = None) -> List[str]:
+        """一次请求渲染多个场景（formatted_scenes 为各场景已格式化的提示片段），
+        按 _SCENE_BOUNDARY 切分为逐场景原始输出；切分数量不符时回退为逐场景请求。"""
+        if len(scene_flows) == 1:
+            return [self._request_single_scene_stmf(scene_flows[0], dialogue_turns, model_config, use_video, video_uri,
+                                                    title_line=title_line, example_block=example_block,
+                                                    formatted_input=formatted_scenes[0])]
+        n = len(scene_flows)
+        formatted_input = f"\n\n{_SCENE_BOUNDARY}\n\n".join(formatted_scenes)
+        if example_block is None:
+            example_block = self._create_dynamic_bracketed_example(scene_flows[0])
+        batch_rule = (
+            f"【多场景输出】输入共 {n} 个场景，以 {_SCENE_BOUNDARY} 分隔。请按相同顺序逐场景输出方括号STMF，"
+            f"场景之间单独一行输出 {_SCENE_BOUNDARY}，共 {n} 段，不得增减。\n"
+        )
+        prompt = self._build_stmf_prompt(formatted_input, use_video, example_block, batch_rule=batch_rule)
+        log.info(f"多场景({n}) Prompt 总字符数: {len(prompt)}")
+        content = self._generate_stmf(prompt, model_config, use_video, video_uri)
+        segments = [seg.strip() for seg in content.split(_SCENE_BOUNDARY)]
+        segments = [seg for seg in segments if seg]
+        if len(segments) == n:
+            return segments
+        log.info(f"多场景输出切分为 {len(segments)} 段，与场景数 {n} 不符，回退逐场景请求")
+        return [
+            self._request_single_scene_stmf(ssf, dialogue_turns, model_config, use_video, video_uri,
+                                            title_line=title_line, example_block=example_block,
+                                            formatted_input=formatted)
+            for ssf, formatted in zip(scene_flows, formatted_scenes)
+        ]
+
+    def _assemble_scene_outputs(self, script_flow: Dict, episode_id: str, raw_outputs: List[str]) -> str:
+        """对逐场景的LLM原始输出执行后处理并拼接"""
+        all_results = []
+        title = script_flow.get('title', '')
+        for scene, raw in zip(script_flow.get('scenes', []), raw_outputs):
+            single_scene_flow = {'title': title, 'scenes': (scene,)}
+            all_results.append(self._finalize_single_scene_stmf(single_scene_flow, episode_id, raw))
         return "\n\n".join(all_results)
     
-    def _render_single_scene_hollywood(self, script_flow: Dict, dialogue_turns: List[Dict], episode_id: str,
-                                      model_config: Dict, use_video: bool, video_uri: Optional[str]) -> str:
-        """处理单个场景的格式化"""
-        system_instruction = (
-            "你是一位资深好莱坞编剧格式顾问。请将给定的简化剧本流(script_flow)重写为方括号STMF，"
-            "严格使用以下标签：[EPISODE]/[SCENE]/[ACTION]/[CHARACTER]/[PAREN]/[DIALOG]/[TRANS]。"
-            "**必须完整输出所有输入内容，不得截断或省略。**"
-            "请严格依据输入内容进行改写，禁止杜撰或强化结尾效果。"
-        )
+    def _request_single_scene_stmf(self, script_flow: Dict, dialogue_turns: List[Dict],
+                                   model_config: Dict, use_video: bool, video_uri: Optional[str],
+                                   title_line: Optional[str] = None, example_block: Optional[str] = None,
+                                   formatted_input: Optional[str] = None) -> str:
+        """调用 LLM 获取单个场景的方括号STMF原始输出；title_line/example_block/formatted_input 未传入时按本场景现算"""
+        if formatted_input is None:
+            formatted_input = self._format_script_flow_for_prompt(script_flow, dialogue_turns, title_line=title_line)
+        # 添加动态示例
+        if example_block is None:
+            example_block = self._create_dynamic_bracketed_example(script_flow)
+        prompt = self._build_stmf_prompt(formatted_input, use_video, example_block)
+
+        # 调试信息：检查 Prompt 长度
+        prompt_chars = len(prompt)
+        log.info(f"单场景 Prompt 总字符数: {prompt_chars}")
+        log.info(f"单场景输入数据字符数: {len(formatted_input)}")
+
+        content = self._generate_stmf(prompt, model_config, use_video, video_uri)
+        # debug
+        log.debug(f"单场景 LLM原始输出: {content}")
+        return content
+
+    def _build_stmf_prompt(self, formatted_input: str, use_video: bool, example_block: str,
+                           batch_rule: str = '') -> str:
+        """组装方括号STMF重写提示词；batch_rule 为多场景合并请求时追加的输出约定"""
         mode_header = (
             "【模式】视频+转写：以画面为真，并与台词一致。" if use_video else
             "【模式】纯转写编辑：仅基于 script_flow 与台词，禁止臆造画面细节。"
@@ -1217,41 +1533,37 @@ class Step0_7ScriptWriting(PipelineStep):
             "7) **禁止结尾杜撰**：不得为了增强效果而新增或强化结尾的 [ACTION]/[TRANS]，严格忠实于输入内容。\n"
         )
         
-        formatted_input = self._format_script_flow_for_prompt(script_flow, dialogue_turns)
-        # 添加动态示例
-        example_block = self._create_dynamic_bracketed_example(script_flow)
-        
-        prompt = (
+        return (
             f"{mode_header}\n\n"
             f"请基于下述 script_flow 进行好莱坞风格重写并输出完整方括号STMF：\n\n"
             f"{formatted_input}\n\n"
-            f"{guidelines}\n{strict_rules}\n\n"
+            f"{guidelines}\n{strict_rules}{batch_rule}\n\n"
             f"{example_block}\n\n"
             "【输出要求】只输出方括号STMF正文，不要任何额外说明。"
         )
-        
-        # 调试信息：检查 Prompt 长度
-        prompt_chars = len(prompt)
-        log.info(f"单场景 Prompt 总字符数: {prompt_chars}")
-        log.info(f"单场景输入数据字符数: {len(formatted_input)}")
 
-        schema = {"type": "STRING"}
+    def _generate_stmf(self, prompt: str, model_config: Dict, use_video: bool, video_uri: Optional[str]) -> str:
+        """发送方括号STMF重写请求并返回去除首尾空白的原始文本"""
         kwargs = {
             'model': model_config.get('model', 'gemini-2.5-pro'),
             'prompt': prompt,
-            'system_instruction': system_instruction,
-            'schema': schema,
+            'system_instruction': _HOLLYWOOD_SYSTEM_INSTRUCTION,
+            'schema': _SCENE_STMF_SCHEMA,
             'max_tokens': model_config.get('max_tokens', 65535),
             'temperature': model_config.get('temperature', 0.3)
         }
         if use_video and video_uri:
             kwargs['video_uri'] = video_uri
 
-        content = self.client.generate_content(**kwargs)
-        # debug
-        log.debug(f"单场景 LLM原始输出: {content}")
+        # 剧集级与场景级线程池嵌套，由信号量限制全局在途 LLM 调用数
+        with self._llm_slots:
+            content = self.client.generate_content(**kwargs)
+        return str(content or '').strip()
+
+    def _finalize_single_scene_stmf(self, script_flow: Dict, episode_id: str, raw_text: str) -> str:
+        """对单个场景的LLM原始输出执行后处理"""
         try:
-            text = str(content or '').strip()
+            text = raw_text
             if not text:
                 return ""
             if not text.endswith("\n"):
@@ -1267,37 +1579,22 @@ class Step0_7ScriptWriting(PipelineStep):
             log.info(f"单场景后处理输出行数: {len(result_lines)}")
             return result
         except Exception as e:
+            # 后处理失败时保留 LLM 原始输出，与此前 _postprocess_stmf 内部兜底行为一致
             log.info(f"单场景处理失败: {e}")
-            return ""
+            return text
     
     def _run_all_episodes(self) -> Dict[str, Any]:
         """处理所有剧集"""
+        from tqdm import tqdm  # 仅批量处理时需要进度条，延迟导入
         episodes = self.utils.get_episode_list(self.config.project_root)
         results = []
         
         log.info(f"开始Step0.7: 处理 {len(episodes)} 个剧集...")
         
-        # 获取并行配置：步骤级 -> 全局 -> 默认 3
-        step_conf_exact = self._get_this_step_config()
-        if step_conf_exact and 'max_workers' in step_conf_exact:
-            max_workers = step_conf_exact.get('max_workers')
-        else:
-            conc_conf = getattr(self.config, 'concurrency', {}) or {}
-            max_workers = conc_conf.get('max_workers', 3)
-        # 环境变量覆盖
-        try:
-            env_val = os.environ.get('STEP0_7_MAX_WORKERS')
-            if env_val:
-                max_workers = int(env_val)
-        except Exception:
-            pass
-        # 类型与范围保护
-        try:
-            max_workers = int(max_workers)
-        except Exception:
-            max_workers = 3
-        if not max_workers or max_workers < 1:
-            max_workers = 1
+        # 并行配置仅解析一次，重复调用（重试/子运行）复用结果
+        if self._max_workers_cached is None:
+            self._max_workers_cached = self._compute_max_workers()
+        max_workers = self._max_workers_cached
         log.info(f"使用 {max_workers} 个并行线程处理...")
         
         # 使用并行处理
@@ -1345,22 +1642,55 @@ class Step0_7ScriptWriting(PipelineStep):
             "results": results
         }
     
+    def _compute_max_workers(self) -> int:
+        """解析剧集级并行度：步骤级 -> 全局 -> 默认 3，环境变量 STEP0_7_MAX_WORKERS 覆盖"""
+        step_conf_exact = self._get_this_step_config()
+        if step_conf_exact and 'max_workers' in step_conf_exact:
+            max_workers = step_conf_exact.get('max_workers')
+        else:
+            conc_conf = getattr(self.config, 'concurrency', None) or _EMPTY_MAPPING
+            max_workers = conc_conf.get('max_workers', 3)
+        # 环境变量覆盖
+        try:
+            env_val = os.environ.get('STEP0_7_MAX_WORKERS')
+            if env_val:
+                max_workers = int(env_val)
+        except Exception:
+            pass
+        # 类型与范围保护
+        try:
+            max_workers = int(max_workers)
+        except Exception:
+            max_workers = 3
+        if not max_workers or max_workers < 1:
+            max_workers = 1
+        return max_workers
+    
     def _generate_statistics(self, results: List[Dict]) -> Dict[str, Any]:
         """生成处理统计信息"""
         total_episodes = len(results)
-        success_results = [r for r in results if r.get("status") == "success"]
-        success_count = len(success_results)
-        already_exists_count = len([r for r in results if r.get("status") == "already_exists"])
-        failed_count = len([r for r in results if r.get("status") == "failed"])
-        
-        # 处理时间统计
-        processing_times = [r.get("processing_time", 0) for r in success_results if r.get("processing_time")]
-        total_processing_time = sum(processing_times)
-        avg_processing_time = total_processing_time / len(processing_times) if processing_times else 0
-        
-        # 场景和对话统计
-        total_scenes = sum(r.get("scenes_count", 0) for r in success_results)
-        total_dialogues = sum(r.get("total_dialogues", 0) for r in success_results)
+        success_count = already_exists_count = failed_count = 0
+        total_processing_time = 0.0
+        timed_count = 0
+        total_scenes = total_dialogues = 0
+        # 单次遍历累计各项计数，不构建中间列表
+        for r in results:
+            status = r.get("status")
+            if status == "success":
+                success_count += 1
+                # 处理时间统计
+                pt = r.get("processing_time")
+                if pt:
+                    total_processing_time += pt
+                    timed_count += 1
+                # 场景和对话统计
+                total_scenes += r.get("scenes_count", 0)
+                total_dialogues += r.get("total_dialogues", 0)
+            elif status == "already_exists":
+                already_exists_count += 1
+            elif status == "failed":
+                failed_count += 1
+        avg_processing_time = total_processing_time / timed_count if timed_count else 0
         
         return {
             "total_episodes": total_episodes,
@@ -4,15 +4,69 @@ Step0.8: 最终剧本生成
 """
 
 import os
-import glob
 import re
-from typing import Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
 
 from core import PipelineConfig, GenAIClient, PipelineUtils
 from . import PipelineStep
 
 from new_pipeline.steps.commont_log import log
 
+# 方括号STMF标签行：一次匹配得到标签与正文
+_TAG_RE = re.compile(r'^\[(EPISODE|SCENE|ACTION|TRANS|CHARACTER|PAREN|DIALOG)\]\s*(.*)$')
+_DIGITS_RE = re.compile(r"\d+")
+# 场景标题中的 "<集>-<场>." 编号前缀
+_SCENE_NUM_PREFIX_RE = re.compile(r"^\s*\d+\s*-\s*\d+\s*\.\s*")
+# 动作行已有结尾标点时不再补句号
+_TERMINAL_PUNCT_RE = re.compile(r"[。！？.!?:：]$")
+_NORMALIZE_DASH = str.maketrans({'–': '-', '—': '-'})
+
+# FDX 文本转义：str.translate 单次 C 级遍历完成全部替换
+_XML_BASE = {ord('&'): '&amp;', ord('<'): '&lt;', ord('>'): '&gt;', ord('"'): '&quot;', ord("'"): '&apos;'}
+_XML_SPECIAL_RE = re.compile(r"[&<>\"']")
+
+# FDX 段落的固定前后缀
+_PARA_SCENE_PRE = '    <Paragraph Type="Scene Heading"><SceneProperties /><Text>'
+_PARA_ACTION_PRE = '    <Paragraph Type="Action"><Text>'
+_PARA_TRANS_PRE = '    <Paragraph Type="Transition"><Text>'
+_PARA_CHARACTER_PRE = '    <Paragraph Type="Character"><Text>'
+_PARA_PAREN_PRE = '    <Paragraph Type="Parenthetical"><Text>'
+_PARA_DIALOG_PRE = '    <Paragraph Type="Dialogue"><Text>'
+_PARA_POST = '</Text></Paragraph>'
+
+
+class _DecimalEntityTable(dict):
+    """str.translate 映射表：在基础实体之外，将非 ASCII 字符转为 &#N; 十进制实体；按码位缓存结果"""
+
+    def __missing__(self, cp: int) -> str:
+        v = f"&#{cp};" if cp >= 128 else chr(cp)
+        self[cp] = v
+        return v
+
+
+_XML_DECIMAL = _DecimalEntityTable(_XML_BASE)
+
+
+def _write_text_buffered(path: str, chunks: Iterable[str]) -> None:
+    """以 1MiB 缓冲逐块写入文本；newline='' 保留调用方给出的换行（FDX 的 CRLF 模式不再二次转换）"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8', buffering=1 << 20, newline='') as f:
+        f.writelines(chunks)
+
+
+def _rstrip_chunks(chunks: Iterable[str]) -> Iterator[str]:
+    """逐块透传文本，去掉整体末尾的空白后补一个换行（等价于对拼接结果 rstrip() + "\n"）"""
+    pending = ""
+    for c in chunks:
+        body = c.rstrip()
+        if body:
+            yield pending + body
+            pending = c[len(body):]
+        else:
+            pending += c
+    yield "\n"
+
 class Step0_8FinalScript(PipelineStep):
     """Step0.8: 最终剧本生成"""
     
@@ -67,170 +121,237 @@ class Step0_8FinalScript(PipelineStep):
                 log.info("Warning: 未找到任何0_7_script.stmf")
                 return {"status": "no_files"}
             
-            # 2) 合并
-            merged_content = self._merge_stmf_files(stmf_files)
+            # 2) 合并（流式写入 out_stmf）；写入时逐集解析为标记流，无需读回合并结果
+            # 3) 标记流由 Fountain（健壮解析器）与 FDX（最小可用映射）共用
+            tokens, scenes_count = self._merge_stmf_files(stmf_files, out_stmf)
             
-            # 3) 转换为Fountain（健壮解析器）
-            fountain_script = self._convert_stmf_to_fountain(merged_content)
-            # 3b) 转换为FDX（最小可用映射）
-            fdx_script = self._convert_stmf_to_fdx(merged_content)
+            # 4) 渲染结果逐块流式写入
+            _write_text_buffered(out_fountain, self._render_fountain(tokens))
+            _write_text_buffered(out_fdx, self._render_fdx(tokens))
             
-            # 4) 保存
-            self.utils.save_text_file(out_stmf, merged_content)
-            self.utils.save_text_file(out_fountain, fountain_script)
-            self.utils.save_text_file(out_fdx, fdx_script)
-            
-            scenes_count = len([line for line in merged_content.split('\n') if line.strip().startswith('SCENE')])
             log.info("✅ Step0.8 完成（已生成 STMF、Fountain 与 FDX）")
             return {"status": "completed", "episodes_count": len(stmf_files), "scenes_count": scenes_count}
         except Exception as e:
             log.info(f"❌ Step0.8 失败: {e}")
             return {"status": "failed", "error": str(e)}
     
-    def _collect_step07_stmf(self) -> List[str]:
-        pattern = os.path.join(self.config.output_dir, "episode_*", "0_7_script.stmf")
-        files = glob.glob(pattern)
-        # 排序
-        def ep_num(p):
-            try:
-                d = os.path.basename(os.path.dirname(p))
-                if d.startswith('episode_'):
-                    import re
-                    n = re.findall(r'\d+', d)
-                    return int(n[0]) if n else 0
-                return 0
-            except:
-                return 0
-        files.sort(key=ep_num)
-        return files
+    def _collect_step07_stmf(self) -> List[Tuple[str, str]]:
+        """返回按剧集编号排序的 (剧集编号, 0_7_script.stmf 路径) 列表，编号在此一次性解析好供合并时直接使用"""
+        # 单次 scandir 遍历输出目录（目录项自带类型信息），仅对最终的 .stmf 做一次 isfile
+        found = []
+        try:
+            with os.scandir(self.config.output_dir) as it:
+                for e in it:
+                    if e.name.startswith('episode_') and e.is_dir():
+                        p = os.path.join(e.path, "0_7_script.stmf")
+                        if os.path.isfile(p):
+                            n = _DIGITS_RE.findall(e.name)
+                            ep_num = e.name[len('episode_'):].lstrip('0') or '1'
+                            found.append((int(n[0]) if n else 0, ep_num, p))
+        except FileNotFoundError:
+            return []
+        # 按剧集编号排序
+        found.sort(key=lambda x: x[0])
+        return [(ep_num, p) for _, ep_num, p in found]
     
-    def _merge_stmf_files(self, stmf_files: List[str]) -> str:
-        all_content = []
-        for p in stmf_files:
-            try:
-                c = self.utils.load_text_file(p)
-                if c.strip():
-                    # 提取剧集编号
-                    episode_dir = os.path.basename(os.path.dirname(p))
-                    if episode_dir.startswith('episode_'):
-                        episode_num = episode_dir.replace('episode_', '').lstrip('0') or '1'
-                        # 添加 [EPISODE] 标记
-                        episode_header = f"[EPISODE] Episode {episode_num}\n"
-                        all_content.append(episode_header + c)
-                    else:
-                        all_content.append(c)
-                    log.info(f"加载: {episode_dir}")
-            except Exception as e:
-                log.info(f"Warning: 无法加载 {p}: {e}")
-        if not all_content:
+    def _load_and_tag(self, item: Tuple[str, str]) -> Optional[str]:
+        """读取单集 0_7_script.stmf 并在前面加上 [EPISODE] 标记；空白或读取失败时返回 None"""
+        ep_num, p = item
+        try:
+            with open(p, 'r', encoding='utf-8', buffering=1 << 20) as f:
+                c = f.read()
+            if not c.strip():
+                return None
+            log.info(f"加载: Episode {ep_num}")
+            # 添加 [EPISODE] 标记
+            return f"[EPISODE] Episode {ep_num}\n" + c
+        except Exception as e:
+            log.info(f"Warning: 无法加载 {p}: {e}")
+            return None
+
+    def _merge_stmf_files(self, stmf_files: List[Tuple[str, str]],
+                          out_path: str) -> Tuple[List[Tuple[Optional[str], str]], int]:
+        """并行读取各集 0_7_script.stmf，按剧集顺序写入 out_path（剧集间以空行分隔），
+        写入的同时逐集解析，返回 (合并结果的标记流, 以 SCENE 开头的行数)。
+        剧集间以空行分隔且解析时丢弃空行，逐集解析结果与解析整个合并文本一致。
+        先写入临时文件，全部完成后再替换，避免残留不完整的合并结果。"""
+        tmp_path = out_path + ".tmp"
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        merged = 0
+        tokens: List[Tuple[Optional[str], str]] = []
+        scenes_count = 0
+        workers = max(1, min(8, len(stmf_files)))
+        with open(tmp_path, 'w', encoding='utf-8', buffering=1 << 20) as dst, \
+                ThreadPoolExecutor(max_workers=workers) as executor:
+            # map 按提交顺序返回，stmf_files 已按剧集编号排序
+            for text in executor.map(self._load_and_tag, stmf_files):
+                if text is None:
+                    continue
+                if merged:
+                    dst.write("\n\n")
+                dst.write(text)
+                merged += 1
+                tokens.extend(self._tokenize_stmf(text))
+                scenes_count += sum(1 for line in text.split('\n') if line.strip().startswith('SCENE'))
+        if not merged:
+            os.remove(tmp_path)
             raise Exception("没有成功加载任何0_7_script.stmf")
-        return "\n\n".join(all_content)
+        os.replace(tmp_path, out_path)
+        return tokens, scenes_count
     
+    @staticmethod
+    def _tokenize_stmf(stmf_content: str) -> List[Tuple[Optional[str], str]]:
+        """将 STMF 逐行解析为 (标签, 正文) 标记流：
+        - 方括号标签行 -> ('SCENE', 正文) 等
+        - 非方括号纯文本行 -> (None, 整行)
+        - 空行与未识别的方括号标签行丢弃
+        """
+        tokens: List[Tuple[Optional[str], str]] = []
+        append = tokens.append
+        tag_match = _TAG_RE.match
+        for raw in stmf_content.split('\n'):
+            ln = raw.strip()
+            if not ln:
+                continue
+            m = tag_match(ln)
+            if m:
+                append((m.group(1), m.group(2)))
+            elif not ln.startswith('['):
+                append((None, ln))
+        return tokens
+
     # === 健壮的 STMF -> Fountain 转换器 ===
-    def _convert_stmf_to_fountain(self, stmf_content: str) -> str:
-        lines = stmf_content.split('\n')
-        out: List[str] = []
+    def _render_fountain(self, tokens: List[Tuple[Optional[str], str]]) -> Iterator[str]:
+        """逐块产出 Fountain 文本"""
         # 使用输出目录名作为标题（即集合名）
         try:
             title = os.path.basename(self.config.output_dir) or "完整剧本"
         except Exception:
             title = "完整剧本"
         # 如果是方括号标签，采用简单直译
-        if any(ln.strip().startswith('[') for ln in lines):
-            out.append(f"Title: {title}")
-            out.append("")
+        if any(tag for tag, _ in tokens):
+            # 首块以 "Title:" 开头，整体只需去除末尾空白
+            yield from _rstrip_chunks(self._fountain_chunks(tokens, title))
+            return
+        # 否则退回旧解析（兼容旧STMF）
+        yield f"Title: {title}\n"
+
+    def _fountain_chunks(self, tokens: List[Tuple[Optional[str], str]], title: str) -> Iterator[str]:
+        """按标记渲染 Fountain 记录，每累积一批即拼接产出（拼接结果与整体 "\n".join 一致）"""
+        out: List[str] = [f"Title: {title}\n"]
+        current_char = None
+        prev_tag = None  # 'SCENE'|'ACTION'|'CHARACTER'|'PAREN'|'DIALOG'|'EPISODE'|'TRANS'
+        # 输出是否以空行结尾（每条记录预先拼接为一个块，以 "\n" 结尾即表示其后有空行）
+        last_blank = True
+
+        def ensure_single_blank_between(prev_kind: str, next_kind: str):
+            nonlocal last_blank
+            if not last_blank:
+                # CHARACTER -> (PAREN or DIALOG) 不加空行
+                if prev_kind == 'CHARACTER' and next_kind in ('PAREN', 'DIALOG'):
+                    return
+                # PAREN -> DIALOG 不加空行
+                if prev_kind == 'PAREN' and next_kind == 'DIALOG':
+                    return
+                out.append("")
+                last_blank = True
+
+        def emit_episode(body: str) -> None:
+            # 转为章节标题，便于Celtx识别为分集
+            nonlocal prev_tag, current_char, last_blank
+            m = _DIGITS_RE.findall(body)
+            ep = m[0] if m else body
+            if prev_tag:
+                ensure_single_blank_between(prev_tag, 'EPISODE')
+            out.append(f"# EPISODE {ep}\n")
+            last_blank = True
+            prev_tag = 'EPISODE'
             current_char = None
-            prev_tag = None  # 'SCENE'|'ACTION'|'CHARACTER'|'PAREN'|'DIALOG'|'EPISODE'|'TRANS'
 
-            def ensure_single_blank_between(prev_kind: str, next_kind: str):
-                if out and out[-1] != "":
-                    # CHARACTER -> (PAREN or DIALOG) 不加空行
-                    if prev_kind == 'CHARACTER' and next_kind in ('PAREN', 'DIALOG'):
-                        return
-                    # PAREN -> DIALOG 不加空行
-                    if prev_kind == 'PAREN' and next_kind == 'DIALOG':
-                        return
-                    out.append("")
+        def emit_scene(body: str) -> None:
+            nonlocal prev_tag, current_char, last_blank
+            if prev_tag:
+                ensure_single_blank_between(prev_tag, 'SCENE')
+            hdr = _SCENE_NUM_PREFIX_RE.sub("", body).translate(_NORMALIZE_DASH)
+            out.append(f"{hdr}\n")
+            last_blank = True
+            current_char = None
+            prev_tag = 'SCENE'
 
-            for raw in lines:
-                ln = raw.strip()
-                if not ln:
-                    continue
-                if ln.startswith('[EPISODE]'):
-                    # 转为章节标题，便于Celtx识别为分集
-                    import re as _re
-                    m = _re.findall(r"\d+", ln)
-                    ep = m[0] if m else ln[len('[EPISODE]'):].strip()
-                    ensure_single_blank_between(prev_tag, 'EPISODE') if prev_tag else None
-                    out.append(f"# EPISODE {ep}")
-                    out.append("")
-                    prev_tag = 'EPISODE'
-                    current_char = None
-                    continue
-                if ln.startswith('[SCENE]'):
-                    ensure_single_blank_between(prev_tag, 'SCENE') if prev_tag else None
-                    hdr = ln[len('[SCENE]'):].strip()
-                    import re as _re
-                    hdr = _re.sub(r"^\s*\d+\s*-\s*\d+\s*\.\s*", "", hdr)
-                    hdr = hdr.replace(' – ', ' - ').replace('—', '-').replace('–', '-')
-                    out.append(hdr)
-                    out.append("")
-                    current_char = None
-                    prev_tag = 'SCENE'
-                    continue
-                if ln.startswith('[ACTION]'):
-                    ensure_single_blank_between(prev_tag, 'ACTION') if prev_tag else None
-                    import re as _re
-                    txt = ln[len('[ACTION]'):].strip().lstrip()
-                    if not _re.search(r"[。！？.!?:：]$", txt):
-                        txt = txt + "。"
-                    # 关键：前缀 '! ' 强制声明为动作（不再清洗年龄括注，按上游控制）
-                    out.append(f"! {txt}")
-                    current_char = None
-                    prev_tag = 'ACTION'
-                    continue
-                if ln.startswith('[TRANS]'):
-                    ensure_single_blank_between(prev_tag, 'TRANS') if prev_tag else None
-                    trans = ln[len('[TRANS]'):].strip() or 'CUT TO:'
-                    out.append(f"> {trans}")
-                    out.append("")
-                    current_char = None
-                    prev_tag = 'TRANS'
-                    continue
-                if ln.startswith('[CHARACTER]'):
-                    ensure_single_blank_between(prev_tag, 'CHARACTER') if prev_tag else None
-                    cue = ln[len('[CHARACTER]'):].strip().upper()
-                    out.append(cue)
-                    current_char = cue
-                    prev_tag = 'CHARACTER'
-                    continue
-                if ln.startswith('[PAREN]'):
-                    # CHARACTER -> PAREN 之间无空行
-                    if prev_tag not in ('CHARACTER',):
-                        ensure_single_blank_between(prev_tag, 'PAREN') if prev_tag else None
-                    text = ln[len('[PAREN]'):].strip()
-                    if not text.startswith('('):
-                        text = f"({text})"
-                    out.append(text)
-                    prev_tag = 'PAREN'
-                    # 不在 PAREN 后补空行，紧接 DIALOG
-                    continue
-                if ln.startswith('[DIALOG]'):
-                    # CHARACTER/PAREN -> DIALOG 无空行；其余情况保持单空行
-                    if prev_tag not in ('CHARACTER', 'PAREN'):
-                        ensure_single_blank_between(prev_tag, 'DIALOG') if prev_tag else None
-                    text = ln[len('[DIALOG]'):].strip()
-                    if current_char is None:
-                        out.append("角色")
-                        current_char = "角色"
-                    out.append(f"    {text}")
-                    # 对白块结束后补单一空行
-                    out.append("")
-                    prev_tag = 'DIALOG'
-                    continue
-            return "\n".join(out).strip() + "\n"
-        # 否则退回旧解析（兼容旧STMF）
-        return f"Title: {title}\n"
+        def emit_action(body: str) -> None:
+            nonlocal prev_tag, current_char, last_blank
+            if prev_tag:
+                ensure_single_blank_between(prev_tag, 'ACTION')
+            txt = body
+            if not _TERMINAL_PUNCT_RE.search(txt):
+                txt = txt + "。"
+            # 关键：前缀 '! ' 强制声明为动作（不再清洗年龄括注，按上游控制）
+            out.append(f"! {txt}")
+            last_blank = False
+            current_char = None
+            prev_tag = 'ACTION'
+
+        def emit_trans(body: str) -> None:
+            nonlocal prev_tag, current_char, last_blank
+            if prev_tag:
+                ensure_single_blank_between(prev_tag, 'TRANS')
+            out.append(f"> {body or 'CUT TO:'}\n")
+            last_blank = True
+            current_char = None
+            prev_tag = 'TRANS'
+
+        def emit_character(body: str) -> None:
+            nonlocal prev_tag, current_char, last_blank
+            if prev_tag:
+                ensure_single_blank_between(prev_tag, 'CHARACTER')
+            cue = body.upper()
+            out.append(cue)
+            last_blank = not cue
+            current_char = cue
+            prev_tag = 'CHARACTER'
+
+        def emit_paren(body: str) -> None:
+            nonlocal prev_tag, last_blank
+            # CHARACTER -> PAREN 之间无空行
+            if prev_tag and prev_tag != 'CHARACTER':
+                ensure_single_blank_between(prev_tag, 'PAREN')
+            out.append(body if body.startswith('(') else f"({body})")
+            last_blank = False
+            # 不在 PAREN 后补空行，紧接 DIALOG
+            prev_tag = 'PAREN'
+
+        def emit_dialog(body: str) -> None:
+            nonlocal prev_tag, current_char, last_blank
+            # CHARACTER/PAREN -> DIALOG 无空行；其余情况保持单空行
+            if prev_tag and prev_tag not in ('CHARACTER', 'PAREN'):
+                ensure_single_blank_between(prev_tag, 'DIALOG')
+            # 对白块结束后补单一空行
+            if current_char is None:
+                out.append(f"角色\n    {body}\n")
+                current_char = "角色"
+            else:
+                out.append(f"    {body}\n")
+            last_blank = True
+            prev_tag = 'DIALOG'
+
+        handlers = {
+            'EPISODE': emit_episode,
+            'SCENE': emit_scene,
+            'ACTION': emit_action,
+            'TRANS': emit_trans,
+            'CHARACTER': emit_character,
+            'PAREN': emit_paren,
+            'DIALOG': emit_dialog,
+        }
+        # 每个标记一次字典分派；非标签行忽略
+        for tag, body in tokens:
+            if tag:
+                handlers[tag](body)
+                if len(out) >= 512:
+                    yield "\n".join(out) + "\n"
+                    out.clear()
+        if out:
+            yield "\n".join(out) + "\n"
     
     @staticmethod
     def _extract_attr_value(line: str, key: str) -> str:
@@ -239,80 +360,49 @@ class Step0_8FinalScript(PipelineStep):
         return m.group(1).strip() if m else ""
 
     # === 最小可用的 STMF -> FDX 转换器 ===
-    def _convert_stmf_to_fdx(self, stmf_content: str) -> str:
+    def _render_fdx(self, tokens: List[Tuple[Optional[str], str]]) -> Iterator[str]:
+        """逐段落产出 FDX 文本"""
         import os as _os
         mode = (_os.getenv('FDX_ENCODING_MODE') or 'decimal_entities').strip().lower()
-        def base_escape(text: str) -> str:
-            return (
-                text.replace("&", "&amp;")
-                    .replace("<", "&lt;")
-                    .replace(">", "&gt;")
-                    .replace('"', "&quot;")
-                    .replace("'", "&apos;")
-            )
+        # plain 模式：仅基础实体，不做非 ASCII 转义
+        xml_table = _XML_DECIMAL if mode.startswith('decimal') else _XML_BASE
         def xml_escape(text: str) -> str:
-            escaped = base_escape(text)
-            if mode.startswith('decimal'):
-                return ''.join(c if ord(c) < 128 else f"&#{ord(c)};" for c in escaped)
-            # plain 模式：仅基础实体，不做非 ASCII 转义
-            return escaped
-        lines = stmf_content.split('\n')
-        out: List[str] = []
+            # 纯 ASCII 行（场景标题、转场等）无需十进制实体；不含特殊字符时原样返回
+            if text.isascii():
+                return text.translate(_XML_BASE) if _XML_SPECIAL_RE.search(text) else text
+            return text.translate(xml_table)
+        nl = "\r\n" if mode.endswith('_crlf') else "\n"
+        post = _PARA_POST + nl
         # 使用 UTF-8，无 BOM（除非显式指定 plain_utf8_bom）
-        out.append('<?xml version="1.0" encoding="UTF-8" standalone="no"?>')
-        out.append('<FinalDraft DocumentType="Script" Template="No" Version="1">')
-        out.append('  <Content>')
-        current_char = None
-        for raw in lines:
-            ln = raw.strip()
-            if not ln:
-                continue
-            if ln.startswith('['):
-                if ln.startswith('[EPISODE]'):
-                    ep_nums = re.findall(r"\d+", ln)
-                    label = f"Episode {ep_nums[0]}" if ep_nums else ln[len('[EPISODE]'):].strip()
-                    out.append(f'    <Paragraph Type="Scene Heading"><SceneProperties /><Text>{xml_escape(label)}</Text></Paragraph>')
-                    current_char = None
-                    continue
-                if ln.startswith('[SCENE]'):
-                    hdr = ln[len('[SCENE]'):].strip()
-                    hdr = hdr.replace(' – ', ' - ').replace('—', '-').replace('–', '-')
-                    out.append(f'    <Paragraph Type="Scene Heading"><SceneProperties /><Text>{xml_escape(hdr)}</Text></Paragraph>')
-                    current_char = None
-                    continue
-                if ln.startswith('[ACTION]'):
-                    txt = ln[len('[ACTION]'):].strip()
-                    out.append(f'    <Paragraph Type="Action"><Text>{xml_escape(txt)}</Text></Paragraph>')
-                    current_char = None
-                    continue
-                if ln.startswith('[TRANS]'):
-                    txt = ln[len('[TRANS]'):].strip() or 'CUT TO:'
-                    if not txt.endswith(':'):
-                        txt = txt + ':'
-                    out.append(f'    <Paragraph Type="Transition"><Text>{xml_escape(txt)}</Text></Paragraph>')
-                    current_char = None
-                    continue
-                if ln.startswith('[CHARACTER]'):
-                    cue = ln[len('[CHARACTER]'):].strip().upper()
-                    out.append(f'    <Paragraph Type="Character"><Text>{xml_escape(cue)}</Text></Paragraph>')
-                    current_char = cue
-                    continue
-                if ln.startswith('[PAREN]'):
-                    text = ln[len('[PAREN]'):].strip()
-                    if not text.startswith('('):
-                        text = f'({text})'
-                    out.append(f'    <Paragraph Type="Parenthetical"><Text>{xml_escape(text)}</Text></Paragraph>')
-                    continue
-                if ln.startswith('[DIALOG]'):
-                    text = ln[len('[DIALOG]'):].strip()
-                    out.append(f'    <Paragraph Type="Dialogue"><Text>{xml_escape(text)}</Text></Paragraph>')
-                    continue
-                continue
-            out.append(f'    <Paragraph Type="Action"><Text>{xml_escape(ln)}</Text></Paragraph>')
-            current_char = None
-        out.append('  </Content>')
-        out.append('</FinalDraft>')
-        xml_text = ("\r\n" if mode.endswith('_crlf') else "\n").join(out) + ("\r\n" if mode.endswith('_crlf') else "\n")
         if mode == 'plain_utf8_bom' or mode == 'plain_utf8_bom_crlf':
-            return "\ufeff" + xml_text
-        return xml_text
+            yield "\ufeff"
+        yield '<?xml version="1.0" encoding="UTF-8" standalone="no"?>' + nl
+        yield '<FinalDraft DocumentType="Script" Template="No" Version="1">' + nl
+        yield '  <Content>' + nl
+        for tag, body in tokens:
+            if tag is None:
+                # 纯文本行按动作输出
+                yield _PARA_ACTION_PRE + xml_escape(body) + post
+            elif tag == 'EPISODE':
+                ep_nums = _DIGITS_RE.findall(body)
+                label = f"Episode {ep_nums[0]}" if ep_nums else body
+                yield _PARA_SCENE_PRE + xml_escape(label) + post
+            elif tag == 'SCENE':
+                hdr = body.translate(_NORMALIZE_DASH)
+                yield _PARA_SCENE_PRE + xml_escape(hdr) + post
+            elif tag == 'ACTION':
+                yield _PARA_ACTION_PRE + xml_escape(body) + post
+            elif tag == 'TRANS':
+                txt = body or 'CUT TO:'
+                if not txt.endswith(':'):
+                    txt = txt + ':'
+                yield _PARA_TRANS_PRE + xml_escape(txt) + post
+            elif tag == 'CHARACTER':
+                yield _PARA_CHARACTER_PRE + xml_escape(body.upper()) + post
+            elif tag == 'PAREN':
+                text = body if body.startswith('(') else f'({body})'
+                yield _PARA_PAREN_PRE + xml_escape(text) + post
+            else:  # DIALOG
+                yield _PARA_DIALOG_PRE + xml_escape(body) + post
+        yield '  </Content>' + nl
+        yield '</FinalDraft>' + nl
@@ -4,19 +4,39 @@ Step0: 上传准备
 """
 
 import os
+import re
+import mimetypes
 import glob
 import time
-from typing import Dict, Any, List
+import threading
+from collections import Counter
+from typing import Dict, Any, List, Tuple
 from google.cloud import storage
 from google.cloud.exceptions import NotFound
+from google.api_core.exceptions import PreconditionFailed
 
 from core import PipelineConfig, GenAIClient, PipelineUtils
 from core.exceptions import StepDependencyError, FileNotFoundError
 from . import PipelineStep
 
+# 视频文件名中的首个数字，作为剧集编号
+_FILENAME_NUM_RE = re.compile(r"(\d+)")
+
 class Step0Upload(PipelineStep):
     """Step0: 上传视频到GCS"""
     
+    def __init__(self, config: PipelineConfig):
+        super().__init__(config)
+        # GCS 客户端与 bucket 在各上传线程间共享，首次使用时初始化
+        self._gcs_lock = threading.Lock()
+        self._gcs_client = None
+        self._gcs_bucket = None
+        self._gcs_pool_size = 10
+        # 集合前缀下已存在的对象键（一次 LIST 获得）；None 表示未列举，需逐个 exists() 检查
+        self._existing_blobs = None
+        # episode_id -> 本地视频路径（批量流程在进程内传递，无需读写标记文件）
+        self._ep_to_local_path: Dict[str, str] = {}
+    
     @property
     def step_number(self) -> int:
         return 0
@@ -44,7 +64,7 @@ class Step0Upload(PipelineStep):
             return self._run_all_episodes()
     
     def _run_single_episode(self, episode_id: str, retry_count: int = 0) -> Dict[str, Any]:
-        """处理单个剧集"""
+        """处理单个剧集；本地视频路径取自批量流程登记的 _ep_to_local_path，未登记时读取输出目录中的路径标记文件"""
         print(f"Step0: 处理 {episode_id}")
         
         # 计算集合根（可选）：将 gcs_path.txt 写入集合/episode_XXX
@@ -60,10 +80,13 @@ class Step0Upload(PipelineStep):
                 gcs_path = f.read().strip()
             return {"status": "already_exists", "gcs_path": gcs_path}
         
-        # 优先：从输出目录读取本地视频路径标记
+        # 优先：进程内登记的本地视频路径；其次读取输出目录中的路径标记（多进程或单独重跑）
+        local_path = self._ep_to_local_path.get(episode_id)
         mark_file = os.path.join(ep_out_dir, "_local_mp4_path.txt")
         mp4_files = []
-        if os.path.exists(mark_file):
+        if local_path:
+            mp4_files = [local_path]
+        elif os.path.exists(mark_file):
             try:
                 with open(mark_file, 'r', encoding='utf-8') as f:
                     p = f.read().strip()
@@ -108,7 +131,6 @@ class Step0Upload(PipelineStep):
     
     def _run_all_episodes(self) -> Dict[str, Any]:
         """处理所有剧集"""
-        import re
         from concurrent.futures import ThreadPoolExecutor, as_completed
         from tqdm import tqdm
         # 读取环境参数：输入目录/输出集合/桶名
@@ -126,27 +148,35 @@ class Step0Upload(PipelineStep):
         output_root = os.path.abspath(os.path.join(self.config.output_dir, collection_name))
         os.makedirs(output_root, exist_ok=True)
 
-        # 递归搜索输入目录中的视频文件
-        exts = {'.mp4', '.MP4', '.mov', '.MOV', '.m4v', '.M4V', '.mkv', '.MKV', '.avi', '.AVI'}
-        mp4_paths = []
-        for root, dirs, files in os.walk(input_dir):
-            for fn in files:
-                _, ext = os.path.splitext(fn)
-                if ext in exts:
-                    mp4_paths.append(os.path.join(root, fn))
-        mp4_paths.sort()
+        # 递归搜索输入目录中的视频文件（遍历时按小写扩展名过滤，一次排序）
+        exts = {'.mp4', '.mov', '.m4v', '.mkv', '.avi'}
+        mp4_paths = sorted(
+            os.path.join(root, fn)
+            for root, _, files in os.walk(input_dir)
+            for fn in files
+            if os.path.splitext(fn)[1].lower() in exts
+        )
+        # 可选：仅处理排序后的前 N 个视频（试跑/抽样）
+        max_episodes = os.environ.get('STEP0_MAX_EPISODES')
+        if max_episodes:
+            try:
+                mp4_paths = mp4_paths[:max(0, int(max_episodes))]
+            except ValueError:
+                print(f"Warning: 忽略无效的 STEP0_MAX_EPISODES: {max_episodes}")
         if not mp4_paths:
             print(f"Warning: 在输入目录未找到视频文件: {input_dir}")
             return {"status": "no_input"}
 
         # 为每个 mp4 生成 episode_xxx 名称：优先使用文件名中的数字
         episodes = []
+        local_paths = self._ep_to_local_path
+        # 标记文件仅在跨进程处理时需要；同进程线程池直接读取 _ep_to_local_path
+        write_marker = bool(os.environ.get('STEP0_MULTIPROCESS'))
         used_ids = set()
         next_seq = 1
-        import re as _re
         for p in mp4_paths:
             bn = os.path.basename(p)
-            m = _re.search(r"(\d+)", bn)
+            m = _FILENAME_NUM_RE.search(bn)
             ep_num = None
             if m:
                 try:
@@ -164,18 +194,19 @@ class Step0Upload(PipelineStep):
                 ep_num += 1
             used_ids.add(ep_num)
             ep_id = f"episode_{ep_num:03d}"
-            # 在输出集合根下创建该 episode 目录，并写入占位，供 _run_single_episode 使用
+            # 在输出集合根下创建该 episode 目录
             ep_out_dir = os.path.join(output_root, ep_id)
             os.makedirs(ep_out_dir, exist_ok=True)
-            # 将该 episode 的本地文件路径记录到一个临时标记文件，供单集处理读取
-            with open(os.path.join(ep_out_dir, "_local_mp4_path.txt"), 'w', encoding='utf-8') as f:
-                f.write(p)
+            if write_marker:
+                with open(os.path.join(ep_out_dir, "_local_mp4_path.txt"), 'w', encoding='utf-8') as f:
+                    f.write(p)
             episodes.append(ep_id)
+            local_paths[ep_id] = p
 
         print(f"开始Step0: 上传 {len(episodes)} 个剧集到GCS -> {output_root} ...")
 
         # 修改配置的 project_root 指向输出集合根，以复用 _run_single_episode 逻辑
-        # 并让 _run_single_episode 读取 _local_mp4_path.txt 作为上传源
+        # 上传源由 _ep_to_local_path 提供
         results = []
         # 将集合名传递给子调用
         os.environ['STEP0_OUT_COLLECTION'] = collection_name
@@ -191,120 +222,200 @@ class Step0Upload(PipelineStep):
             max_workers = 2
         if max_workers < 1:
             max_workers = 1
-        # 第一轮上传
-        print("🚀 开始第一轮上传...")
-        results = self._upload_episodes_batch(episodes, max_workers)
+        # 连接池需容纳所有并发上传；bucket 检查在启动线程前完成一次
+        self._gcs_pool_size = max(10, max_workers * 4)
+        try:
+            self._ensure_bucket()
+            self._existing_blobs = self._list_existing_blobs()
+        except Exception as e:
+            print(f"⚠️ 预检查 bucket 失败，将在上传时重试: {e}")
+        # 上传：优先用 transfer_manager 共享一个客户端批量上传，未成功的剧集再走逐集上传（逐集上传自带退避重试）
+        print("🚀 开始上传...")
+        use_tm = step_conf.get('use_transfer_manager', True) and os.environ.get('STEP0_TRANSFER_MANAGER', '1') != '0'
+        results_by_id: Dict[str, Dict[str, Any]] = {}
+        if use_tm:
+            results_by_id = self._bulk_upload(
+                [(ep, local_paths[ep], os.path.join(output_root, ep, "0_gcs_path.txt")) for ep in episodes],
+                max_workers
+            )
+        results_by_id.update(
+            self._upload_episodes_batch([ep for ep in episodes if ep not in results_by_id], max_workers)
+        )
+        results = [results_by_id[ep] for ep in episodes if ep in results_by_id]
         
-        # 统计结果
-        success_count = len([r for r in results if r.get("status") == "success"])
-        already_exists_count = len([r for r in results if r.get("status") == "already_exists"])
-        failed_episodes = [r for r in results if r.get("status") in ["failed", "upload_failed", "no_mp4_found"]]
-        failed_count = len(failed_episodes)
+        # 统计结果（按状态一次计数）
+        status_counts = Counter(r.get("status") for r in results)
+        success_count = status_counts["success"]
+        already_exists_count = status_counts["already_exists"]
+        failed_count = status_counts["failed"] + status_counts["upload_failed"] + status_counts["no_mp4_found"]
 
-        print(f"\n第一轮上传统计:")
+        print(f"\n上传统计:")
         print(f"- 成功上传: {success_count}")
         print(f"- 已存在: {already_exists_count}")
         print(f"- 失败: {failed_count}")
 
-        # 如果有失败的文件，进行重试
-        if failed_episodes:
-            print(f"\n🔄 开始重试失败的 {len(failed_episodes)} 个文件...")
-            failed_episode_ids = [r.get("episode_id") for r in failed_episodes if r.get("episode_id")]
-            
-            # 重试失败的文件
-            retry_results = self._upload_episodes_batch(failed_episode_ids, max_workers)
-            
-            # 更新结果
-            for retry_result in retry_results:
-                episode_id = retry_result.get("episode_id")
-                if episode_id:
-                    # 找到原来的结果并更新
-                    for i, original_result in enumerate(results):
-                        if original_result.get("episode_id") == episode_id:
-                            results[i] = retry_result
-                            break
-            
-            # 重新统计
-            success_count = len([r for r in results if r.get("status") == "success"])
-            already_exists_count = len([r for r in results if r.get("status") == "already_exists"])
-            final_failed_count = len([r for r in results if r.get("status") in ["failed", "upload_failed", "no_mp4_found"]])
-            
-            print(f"\n重试后最终统计:")
-            print(f"- 成功上传: {success_count}")
-            print(f"- 已存在: {already_exists_count}")
-            print(f"- 失败: {final_failed_count}")
-        else:
-            print("✅ 所有文件上传成功，无需重试")
-
         return {
             "status": "completed",
             "total_episodes": len(episodes),
             "success_count": success_count,
             "already_exists_count": already_exists_count,
-            "failed_count": len([r for r in results if r.get("status") in ["failed", "upload_failed", "no_mp4_found"]]),
+            "failed_count": failed_count,
             "results": results
         }
     
-    def _upload_episodes_batch(self, episodes: List[str], max_workers: int) -> List[Dict[str, Any]]:
-        """批量上传剧集"""
+    def _run_single_episode_in_pool(self, episode_id: str) -> Dict[str, Any]:
+        """线程池内处理单个剧集；上传重试由 _run_single_episode 内部的退避循环负责，这里只兜底异常"""
+        try:
+            result = self._run_single_episode(episode_id)
+        except Exception as e:
+            print(f"Step0 处理 {episode_id} 失败: {e}")
+            result = {"status": "failed", "error": str(e)}
+        result["episode_id"] = episode_id  # 确保包含episode_id
+        return result
+
+    def _upload_episodes_batch(self, episodes: List[str], max_workers: int) -> Dict[str, Dict[str, Any]]:
+        """批量上传剧集（单个线程池），返回以 episode_id 为键的结果"""
         from concurrent.futures import ThreadPoolExecutor, as_completed
         from tqdm import tqdm
         
-        results = []
+        results: Dict[str, Dict[str, Any]] = {}
+        if not episodes:
+            return results
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {executor.submit(self._run_single_episode, ep): ep for ep in episodes}
+            futures = {
+                executor.submit(self._run_single_episode_in_pool, ep): ep
+                for ep in episodes
+            }
             for future in tqdm(as_completed(futures), total=len(episodes), desc="Step0"):
                 episode_id = futures[future]
-                try:
-                    result = future.result()
-                    result["episode_id"] = episode_id  # 确保包含episode_id
-                    results.append(result)
-                except Exception as e:
-                    print(f"Step0 处理 {episode_id} 失败: {e}")
-                    results.append({"episode_id": episode_id, "status": "failed", "error": str(e)})
+                results[episode_id] = future.result()
         return results
     
-    def _upload_to_gcs(self, local_file: str, episode_id: str, file_name: str) -> str:
-        """上传文件到GCS"""
-        import requests
-        from google.cloud.storage import transfer_manager
-        
-        # 初始化GCS客户端，设置超时
-        gcp_config = self.config.gcp_config
-        client = storage.Client.from_service_account_json(gcp_config['credentials_path'])
-        
-        # 构建GCS路径
-        bucket_name = os.environ.get('STEP0_BUCKET_NAME', gcp_config.get('bucket_name', 'script-generation-videos'))
-        # 若设置了集合名，则按集合名归档；不再使用 episode 子路径
+    def _bulk_upload(self, items: List[Tuple[str, str, str]], max_workers: int) -> Dict[str, Dict[str, Any]]:
+        """使用 transfer_manager.upload_many 批量上传（共享一个客户端与连接池）。
+        items 为 (episode_id, 本地文件, 0_gcs_path.txt 路径)；返回成功的剧集结果，
+        失败或已有 0_gcs_path.txt 的剧集不在返回值中，由逐集上传流程处理。"""
+        pending = [it for it in items if not os.path.exists(it[2])]
+        if not pending:
+            return {}
+        try:
+            from google.cloud.storage import transfer_manager
+
+            bucket = self._ensure_bucket()
+            targets = [self._gcs_target(bucket.name, os.path.basename(local_file)) for _, local_file, _ in pending]
+            # 前缀列举中已存在的对象直接视为已上传
+            existing = self._existing_blobs or set()
+            upload_idx = [i for i, (gcs_key, _) in enumerate(targets) if gcs_key not in existing]
+            outcomes: List[Any] = [None] * len(pending)
+            if len(upload_idx) < len(pending):
+                print(f"✅ {len(pending) - len(upload_idx)} 个文件已存在于GCS，跳过上传")
+            if upload_idx:
+                print(f"📤 批量上传 {len(upload_idx)} 个文件到 gs://{bucket.name} (并发: {max_workers})")
+                # skip_if_exists：远端已存在时返回 412（PreconditionFailed），视为已上传
+                uploaded = transfer_manager.upload_many(
+                    [(pending[i][1], bucket.blob(targets[i][0])) for i in upload_idx],
+                    skip_if_exists=True,
+                    upload_kwargs={'timeout': 600},
+                    raise_exception=False,
+                    worker_type=transfer_manager.THREAD,
+                    max_workers=max_workers,
+                )
+                for i, outcome in zip(upload_idx, uploaded):
+                    outcomes[i] = outcome
+        except Exception as e:
+            print(f"⚠️ 批量上传不可用，改为逐集上传: {e}")
+            return {}
+
+        results: Dict[str, Dict[str, Any]] = {}
+        for (episode_id, _, output_file), (_, gcs_path), outcome in zip(pending, targets, outcomes):
+            if isinstance(outcome, Exception) and not isinstance(outcome, PreconditionFailed):
+                print(f"⚠️ {episode_id} 批量上传失败，稍后逐集重试: {outcome}")
+                continue
+            self.utils.save_text_file(output_file, gcs_path)
+            results[episode_id] = {"episode_id": episode_id, "status": "success", "gcs_path": gcs_path}
+        print(f"✅ 批量上传完成: {len(results)}/{len(pending)}")
+        return results
+
+    def _list_existing_blobs(self):
+        """一次 LIST 列出集合前缀下已有的对象键；未设置集合名（对象位于 bucket 根）时不列举整桶"""
         collection = os.environ.get('STEP0_COLLECTION')
-        if collection:
-            gcs_key = f"{collection}/{file_name}"
-            gcs_path = f"gs://{bucket_name}/{collection}/{file_name}"
-        else:
-            gcs_key = file_name
-            gcs_path = f"gs://{bucket_name}/{file_name}"
-        
+        if not collection:
+            return None
+        bucket = self._ensure_bucket()
         try:
-            # 检查bucket是否存在
-            bucket = client.bucket(bucket_name)
-            bucket.reload()  # 验证bucket存在
-        except NotFound:
-            print(f"⚠️  Bucket {bucket_name} 不存在，尝试创建...")
+            return {b.name for b in self._get_gcs_client().list_blobs(bucket, prefix=f"{collection}/")}
+        except Exception as e:
+            print(f"⚠️ 列举已有对象失败，改为逐个检查: {e}")
+            return None
+
+    @staticmethod
+    def _gcs_target(bucket_name: str, file_name: str) -> Tuple[str, str]:
+        """返回 (对象键, gs:// 路径)；设置了集合名则按集合名归档，不再使用 episode 子路径"""
+        collection = os.environ.get('STEP0_COLLECTION')
+        gcs_key = f"{collection}/{file_name}" if collection else file_name
+        return gcs_key, f"gs://{bucket_name}/{gcs_key}"
+
+    def _get_gcs_client(self):
+        """返回共享的 GCS 客户端（凭证只解析一次），并按并发数放大 HTTPS 连接池"""
+        client = self._gcs_client
+        if client is not None:
+            return client
+        with self._gcs_lock:
+            if self._gcs_client is None:
+                gcp_config = self.config.gcp_config
+                client = storage.Client.from_service_account_json(gcp_config['credentials_path'])
+                try:
+                    import requests
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=self._gcs_pool_size,
+                                                            pool_maxsize=self._gcs_pool_size)
+                    client._http.mount('https://', adapter)
+                except Exception as e:
+                    print(f"⚠️ 无法调整GCS连接池大小: {e}")
+                self._gcs_client = client
+            return self._gcs_client
+
+    def _ensure_bucket(self):
+        """返回共享的 bucket；存在性检查（必要时创建或回退默认 bucket）成功后不再重复。
+        首个进入的线程持锁完成检查，其余线程等待后直接复用；检查完成后的调用不再加锁。"""
+        bucket = self._gcs_bucket
+        if bucket is not None:
+            return bucket
+        client = self._get_gcs_client()
+        with self._gcs_lock:
+            if self._gcs_bucket is not None:
+                return self._gcs_bucket
+            gcp_config = self.config.gcp_config
+            bucket_name = os.environ.get('STEP0_BUCKET_NAME', gcp_config.get('bucket_name', 'script-generation-videos'))
             try:
-                bucket = client.create_bucket(bucket_name, location=gcp_config['location'])
-                print(f"✅ 成功创建bucket: {bucket_name}")
-            except Exception as e:
-                print(f"❌ 无法创建bucket: {e}")
-                # 使用默认bucket
-                bucket_name = f"{gcp_config['project_id']}-script-videos"
+                # 检查bucket是否存在
                 bucket = client.bucket(bucket_name)
-                gcs_path = f"gs://{bucket_name}/{file_name}"
-                print(f"🔄 使用默认bucket: {bucket_name}")
+                bucket.reload()  # 验证bucket存在
+            except NotFound:
+                print(f"⚠️  Bucket {bucket_name} 不存在，尝试创建...")
+                try:
+                    bucket = client.create_bucket(bucket_name, location=gcp_config['location'])
+                    print(f"✅ 成功创建bucket: {bucket_name}")
+                except Exception as e:
+                    print(f"❌ 无法创建bucket: {e}")
+                    # 使用默认bucket
+                    bucket_name = f"{gcp_config['project_id']}-script-videos"
+                    bucket = client.bucket(bucket_name)
+                    print(f"🔄 使用默认bucket: {bucket_name}")
+            self._gcs_bucket = bucket
+            return bucket
+
+    def _upload_to_gcs(self, local_file: str, episode_id: str, file_name: str) -> str:
+        """上传文件到GCS"""
+        # 共享客户端与 bucket（首次调用时初始化并检查）
+        bucket = self._ensure_bucket()
+        gcs_key, gcs_path = self._gcs_target(bucket.name, file_name)
         
-        # 检查文件是否已存在
+        # 检查文件是否已存在：优先使用批量列举结果，未列举时才单独 HEAD
         blob = bucket.blob(gcs_key)
+        existing = self._existing_blobs
+        already_exists = gcs_key in existing if existing is not None else blob.exists()
         
-        if blob.exists():
+        if already_exists:
             print(f"✅ 文件已存在于GCS: {gcs_path}")
             return gcs_path
         
@@ -317,33 +428,42 @@ class Step0Upload(PipelineStep):
         
         print(f"📤 上传 {local_file} ({file_size_mb:.1f}MB) 到 {gcs_path} (超时: {timeout_seconds}秒)")
         
-        # 使用优化的上传设置
+        content_type = mimetypes.guess_type(local_file)[0] or 'application/octet-stream'
+        
+        # 使用优化的上传设置；if_generation_match=0 使远端已存在时直接返回 412 而不覆盖
         try:
             # 设置重试策略
             retry_strategy = storage.retry.DEFAULT_RETRY.with_deadline(timeout_seconds)
             
             # 对于大文件，使用更长的超时时间
+            upload_timeout = timeout_seconds
             if file_size > 50 * 1024 * 1024:  # 50MB
                 print(f"🔄 上传大文件 (文件大小: {file_size_mb:.1f}MB)")
                 # 大文件使用更长的超时时间
-                extended_timeout = max(timeout_seconds, 300)  # 至少5分钟
-                blob.upload_from_filename(
-                    local_file,
-                    timeout=extended_timeout,
-                    retry=retry_strategy
-                )
-            else:
-                # 小文件直接上传
-                blob.upload_from_filename(
-                    local_file,
-                    timeout=timeout_seconds,
+                upload_timeout = max(timeout_seconds, 300)  # 至少5分钟
+            if file_size > 8 * 1024 * 1024:
+                # 可续传上传使用 16MB 分块，减少 PUT 请求次数
+                blob.chunk_size = 16 << 20
+            with open(local_file, 'rb', buffering=1 << 20) as fp:
+                blob.upload_from_file(
+                    fp,
+                    size=file_size,
+                    content_type=content_type,
+                    if_generation_match=0,
+                    timeout=upload_timeout,
                     retry=retry_strategy
                 )
+        except PreconditionFailed:
+            print(f"✅ 文件已存在于GCS: {gcs_path}")
+            return gcs_path
         except Exception as e:
             # 如果上传失败，尝试更简单的设置
             print(f"⚠️ 标准上传失败，尝试简化上传: {e}")
             try:
-                blob.upload_from_filename(local_file)
+                blob.upload_from_filename(local_file, if_generation_match=0)
+            except PreconditionFailed:
+                print(f"✅ 文件已存在于GCS: {gcs_path}")
+                return gcs_path
             except Exception as e2:
                 print(f"❌ 简化上传也失败: {e2}")
                 raise e2
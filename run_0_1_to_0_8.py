@@ -9,12 +9,14 @@ import sys
 import time
 import json
 import argparse
-from typing import Dict, List, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from new_pipeline.core import PipelineConfig, PipelineUtils
 from new_pipeline.core.report_generator import PipelineReportGenerator
+from new_pipeline.core.steps_meta import EXPECTED_FILES, GLOBAL_STEPS, ROOT_STEPS, STEP_INDEX, STEP_ORDER, is_failed, json_output_valid, missing_output_files
 from new_pipeline.steps.step0_1_asr import Step0_1ASR
 from new_pipeline.steps.step0_2_clue_extraction import Step0_2ClueExtraction
 from new_pipeline.steps.step0_3_global_alignment_llm import Step0_3GlobalAlignmentLLM
@@ -32,122 +34,183 @@ load_dotenv()
 
 
 
+def _log_lines(lines: List[str]) -> None:
+    """整段输出：多行合并为一条日志，减少逐行写出的开销"""
+    if lines:
+        log.info("\n".join(lines))
+
+
 class PipelineStats:
-    """流水线统计信息"""
+    """流水线统计信息（按步骤的并行数组存放，_idx 记录步骤名对应的下标）"""
+    __slots__ = ("total_start_time", "names", "start", "end", "tokens", "status", "_idx")
+    
     def __init__(self):
-        self.step_stats: Dict[str, Dict[str, Any]] = {}
         self.total_start_time = time.time()
+        self.names: List[str] = []
+        self.start: List[float] = []
+        self.end: List[Optional[float]] = []
+        self.tokens: List[int] = []
+        self.status: List[str] = []
+        self._idx: Dict[str, int] = {}
     
     def start_step(self, step_name: str):
-        """开始步骤计时"""
-        self.step_stats[step_name] = {
-            "start_time": time.time(),
-            "end_time": None,
-            "duration": None,
-            "tokens_used": 0,
-            "status": "running"
-        }
+        """开始步骤计时（同名步骤重新开始时覆盖原记录）"""
+        idx = self._idx.get(step_name)
+        if idx is None:
+            self._idx[step_name] = len(self.names)
+            self.names.append(step_name)
+            self.start.append(time.time())
+            self.end.append(None)
+            self.tokens.append(0)
+            self.status.append("running")
+        else:
+            self.start[idx] = time.time()
+            self.end[idx] = None
+            self.tokens[idx] = 0
+            self.status[idx] = "running"
     
     def end_step(self, step_name: str, tokens_used: int = 0, status: str = "completed"):
         """结束步骤计时"""
-        if step_name in self.step_stats:
-            self.step_stats[step_name]["end_time"] = time.time()
-            self.step_stats[step_name]["duration"] = self.step_stats[step_name]["end_time"] - self.step_stats[step_name]["start_time"]
-            self.step_stats[step_name]["tokens_used"] = tokens_used
-            self.step_stats[step_name]["status"] = status
+        idx = self._idx.get(step_name)
+        if idx is not None:
+            self.end[idx] = time.time()
+            self.tokens[idx] = tokens_used
+            self.status[idx] = status
     
     def print_summary(self):
-        """打印统计摘要"""
-        log.info("\n" + "="*60)
-        log.info("📊 流水线执行统计")
-        log.info("="*60)
-        
+        """打印统计摘要（整表拼好后一次输出）"""
         total_duration = time.time() - self.total_start_time
-        total_tokens = sum(stats.get("tokens_used", 0) for stats in self.step_stats.values())
+        total_tokens = sum(self.tokens)
         
-        log.info(f"总执行时间: {total_duration:.2f}秒 ({total_duration/60:.1f}分钟)")
-        log.info(f"总Token消耗: {total_tokens:,}")
-        log.info("")
+        lines = [
+            "\n" + "="*60,
+            "📊 流水线执行统计",
+            "="*60,
+            f"总执行时间: {total_duration:.2f}秒 ({total_duration/60:.1f}分钟)",
+            f"总Token消耗: {total_tokens:,}",
+            "",
+        ]
         
-        for step_name, stats in self.step_stats.items():
-            duration = stats.get("duration", 0)
-            tokens = stats.get("tokens_used", 0)
-            status = stats.get("status", "unknown")
+        for step_name, start, end, tokens, status in zip(self.names, self.start, self.end, self.tokens, self.status):
+            duration = end - start if end is not None else 0.0
             status_icon = "✅" if status == "completed" else "❌" if status == "failed" else "⏳"
             
-            log.info(f"{status_icon} {step_name}: {duration:.2f}秒, {tokens:,} tokens")
+            lines.append(f"{status_icon} {step_name}: {duration:.2f}秒, {tokens:,} tokens")
         
-        log.info("="*60)
+        lines.append("="*60)
+        _log_lines(lines)
+
+
+def _io_workers(n: int) -> int:
+    """文件检查/删除线程池的并发数：按 CPU 数估算，且不超过任务数"""
+    return max(1, min(32, (os.cpu_count() or 1) * 4, n))
+
+
+def _paths_for(step_name: str, output_root: str, episodes: List[str]) -> List[Tuple[str, List[Tuple[str, str]]]]:
+    """一次性生成步骤产物路径：[(episode_id, [(文件名, 路径), ...]), ...]
+    0.3 在 global/ 下，0.8 在集合根目录下（两者与剧集无关，只拼接一次），其余在剧集目录下"""
+    root = os.path.normpath(output_root)
+    sep = os.sep
+    filenames = EXPECTED_FILES[step_name]
+    if step_name in GLOBAL_STEPS:  # 全局文件（在 global/ 下）
+        shared = [(fn, f"{root}{sep}global{sep}{fn}") for fn in filenames]
+    elif step_name in ROOT_STEPS:  # 全局合并文件（集合根目录下）
+        shared = [(fn, f"{root}{sep}{fn}") for fn in filenames]
+    else:  # 剧集文件
+        return [(ep, [(fn, f"{root}{sep}{ep}{sep}{fn}") for fn in filenames]) for ep in episodes]
+    return [(ep, shared) for ep in episodes]
+
+
+def _scan_dir(dir_path: str) -> Dict[str, os.stat_result]:
+    """单次 scandir 读取目录下所有文件的 stat：{路径: stat_result}；目录不存在时返回空字典"""
+    stats = {}
+    try:
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                try:
+                    if entry.is_file():
+                        stats[entry.path] = entry.stat()
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return stats
+
+
+def _scan_stats(items: List[Tuple[str, List[Tuple[str, str]]]]) -> Dict[str, os.stat_result]:
+    """对 _paths_for 结果涉及的每个目录各 scandir 一次（全局目录只扫描一次），合并为 {路径: stat_result}"""
+    dirs = {os.path.dirname(file_path) for _, files in items for _, file_path in files}
+    stats: Dict[str, os.stat_result] = {}
+    with ThreadPoolExecutor(max_workers=_io_workers(len(dirs))) as executor:
+        for part in executor.map(_scan_dir, dirs):
+            stats.update(part)
+    return stats
 
 
-def check_file_integrity(config: PipelineConfig, step_name: str) -> bool:
-    """检查步骤输出文件的完整性"""
+# 无效文件检查的校验结果缓存（集合根目录下），按 (mtime_ns, size) 判断文件是否变化；
+# 校验规则变化时更换文件名，使旧结果失效
+_INTEGRITY_CACHE_FILE = os.path.join(".cache", "integrity.v2.json")
+
+
+def _load_integrity_cache(output_root: str) -> Dict[str, list]:
+    """读取校验缓存 {路径: [mtime_ns, size, 是否有效]}；不存在或损坏时返回空字典"""
+    try:
+        with open(os.path.join(output_root, _INTEGRITY_CACHE_FILE), 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_integrity_cache(output_root: str, cache: Dict[str, list]) -> None:
+    """写回校验缓存（先写临时文件再替换）；写入失败不影响检查结果"""
+    path = os.path.join(output_root, _INTEGRITY_CACHE_FILE)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        log.info(f"⚠️ 写入校验缓存失败: {e}")
+
+
+def _check_episode(episode_id: str, files: List[Tuple[str, str]], stats: Dict[str, os.stat_result]) -> List[str]:
+    """检查单个剧集的步骤产物（存在性与大小取自 stats），返回缺失/损坏文件的描述列表"""
+    return missing_output_files(episode_id, ((filename, file_path, stats.get(file_path)) for filename, file_path in files))
+
+
+def check_file_integrity(config: PipelineConfig, step_name: str, episodes: Optional[List[str]] = None) -> bool:
+    """检查步骤输出文件的完整性；episodes 为调用方已获取的剧集列表（None 时重新扫描）"""
     output_root = config.project_root
-    episodes = PipelineUtils.get_episode_list(output_root)
-    
-    # 定义每个步骤的预期输出文件
-    expected_files = {
-        "0.1": ["0_1_timed_dialogue.srt"],
-        "0.2": ["0_2_clues.json"],
-        "0.3": ["global_character_graph_llm.json"],
-        "0.4": ["0_4_calibrated_dialogue.txt"],
-        "0.5": ["0_5_dialogue_turns.json"],
-        "0.6": ["0_6_script_flow.json", "0_6_script_draft.md"],
-        "0.7": ["0_7_script.stmf", "0_7_script_analysis.json"],
-        # 0.8 为集合级别汇总产物（存放在集合根目录 output_root 下）
-        "0.8": ["0_8_complete_screenplay.fountain", "0_8_complete_screenplay.fdx"]
-    }
+    if episodes is None:
+        episodes = PipelineUtils.get_episode_list(output_root)
     
-    if step_name not in expected_files:
+    if step_name not in EXPECTED_FILES:
         log.info(f"⚠️ 未知步骤: {step_name}")
         return True
     
-    required_files = expected_files[step_name]
-    missing_files = []
-    
-    for episode_id in episodes:
-        for filename in required_files:
-            if step_name == "0.3":  # 全局文件（在 global/ 下）
-                file_path = os.path.join(output_root, "global", filename)
-            elif step_name == "0.8":  # 全局合并文件（集合根目录下）
-                file_path = os.path.join(output_root, filename)
-            else:  # 剧集文件
-                file_path = os.path.join(output_root, episode_id, filename)
-            
-            if not os.path.exists(file_path):
-                missing_files.append(f"{episode_id}/{filename}")
-            else:
-                # 检查文件是否为空或损坏
-                try:
-                    if filename.endswith('.json'):
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            json.load(f)
-                    elif os.path.getsize(file_path) == 0:
-                        missing_files.append(f"{episode_id}/{filename} (空文件)")
-                except (json.JSONDecodeError, Exception) as e:
-                    missing_files.append(f"{episode_id}/{filename} (损坏: {e})")
+    # 各剧集的检查互不依赖，以线程池并发执行（耗时主要在文件 stat/读取，I/O 期间释放 GIL）
+    items = _paths_for(step_name, output_root, episodes)
+    stats = _scan_stats(items)
+    with ThreadPoolExecutor(max_workers=_io_workers(len(items))) as executor:
+        missing_files = [m for missing in executor.map(lambda item: _check_episode(*item, stats), items) for m in missing]
     
     if missing_files:
-        log.info(f"❌ {step_name} 文件完整性检查失败:")
-        for missing in missing_files[:10]:  # 只显示前10个
-            log.info(f"   缺少: {missing}")
+        lines = [f"❌ {step_name} 文件完整性检查失败:"]
+        lines.extend(f"   缺少: {missing}" for missing in missing_files[:10])  # 只显示前10个
         if len(missing_files) > 10:
-            log.info(f"   ... 还有 {len(missing_files) - 10} 个文件")
+            lines.append(f"   ... 还有 {len(missing_files) - 10} 个文件")
+        _log_lines(lines)
         return False
     
     log.info(f"✅ {step_name} 文件完整性检查通过")
     return True
 
 
-def _fail(step: str, result) -> bool:
-    status = (result or {}).get("status")
-    if step in ("0.1", "0.2", "0.3", "0.4", "0.5", "0.6", "0.7", "0.8"):
-        return status != "completed" and status != "already_exists"
-    return status != "success" and status != "already_exists"
-
-
-def run_step(step_name: str, step_class, config: PipelineConfig, stats: PipelineStats) -> tuple[bool, Any, Any]:
-    """运行单个步骤，返回 (成功状态, 步骤实例, 结果)"""
+def run_step(step_name: str, step_class, config: PipelineConfig, stats: PipelineStats,
+             episodes: Optional[List[str]] = None, skip_integrity: bool = False) -> tuple[bool, Any, Any]:
+    """运行单个步骤，返回 (成功状态, 步骤实例, 结果)；skip_integrity 为 True 时跳过文件完整性检查"""
     log.info(f"\n{step_name}: {step_class.__name__} …")
     stats.start_step(step_name)
     
@@ -156,13 +219,13 @@ def run_step(step_name: str, step_class, config: PipelineConfig, stats: Pipeline
         result = step_instance.run()
         
         # 检查步骤是否成功
-        if _fail(step_name, result):
+        if is_failed(step_name, result):
             log.info(f"❌ {step_name} 失败: {result}")
             stats.end_step(step_name, status="failed")
             return False, step_instance, result
         
         # 文件完整性检查
-        if not check_file_integrity(config, step_name):
+        if not skip_integrity and not check_file_integrity(config, step_name, episodes):
             log.info(f"❌ {step_name} 文件完整性检查失败")
             stats.end_step(step_name, status="failed")
             return False, step_instance, result
@@ -182,134 +245,116 @@ def run_step(step_name: str, step_class, config: PipelineConfig, stats: Pipeline
         return False, None, {"error": str(e)}
 
 
-def delete_step_files(config: PipelineConfig, step_name: str, target_episodes: Optional[List[str]] = None):
-    """删除指定步骤及其之后步骤的输出文件"""
+def _remove_file(file_path: str) -> Tuple[bool, Optional[str]]:
+    """删除存在的文件，返回 (是否删除, 日志行)；直接 remove，不存在时由 FileNotFoundError 判定，省去一次 stat"""
+    try:
+        os.remove(file_path)
+        return True, f"🗑️ 删除: {file_path}"
+    except FileNotFoundError:
+        return False, None
+    except Exception as e:
+        return False, f"❌ 删除失败: {file_path} - {e}"
+
+
+def delete_step_files(config: PipelineConfig, step_name: str, target_episodes: Optional[List[str]] = None,
+                      episodes: Optional[List[str]] = None):
+    """删除指定步骤及其之后步骤的输出文件；未指定 target_episodes 时作用于全部剧集（episodes 或重新扫描）"""
     output_root = config.project_root
     
-    # 定义每个步骤的预期输出文件
-    expected_files = {
-        "0.1": ["0_1_timed_dialogue.srt"],
-        "0.2": ["0_2_clues.json"],
-        "0.3": ["global_character_graph_llm.json"],
-        "0.4": ["0_4_calibrated_dialogue.txt"],
-        "0.5": ["0_5_dialogue_turns.json"],
-        "0.6": ["0_6_script_flow.json", "0_6_script_draft.md"],
-        "0.7": ["0_7_script.stmf", "0_7_script_analysis.json"],
-        "0.8": ["0_8_complete_screenplay.fountain", "0_8_complete_screenplay.fdx"]
-    }
-    
-    # 获取所有步骤列表
-    all_steps = list(expected_files.keys())
-    
     # 找到起始步骤的索引
-    if step_name not in all_steps:
+    start_index = STEP_INDEX.get(step_name)
+    if start_index is None:
         return
     
-    start_index = all_steps.index(step_name)
-    deleted_count = 0
-    
-    # 处理从起始步骤开始的所有步骤
-    for i in range(start_index, len(all_steps)):
-        current_step = all_steps[i]
-        required_files = expected_files[current_step]
+    # 汇总从起始步骤开始的所有步骤的待删路径（全局文件按路径去重，避免并发重复删除）
+    paths: Dict[str, None] = {}
+    for current_step in STEP_ORDER[start_index:]:
         
         if target_episodes:
-            episodes = target_episodes
+            step_episodes = target_episodes
         else:
-            episodes = PipelineUtils.get_episode_list(output_root)
+            if episodes is None:
+                episodes = PipelineUtils.get_episode_list(output_root)
+            step_episodes = episodes
         
-        for episode_id in episodes:
-            for filename in required_files:
-                if current_step == "0.3":  # 全局文件（在 global/ 下）
-                    file_path = os.path.join(output_root, "global", filename)
-                elif current_step == "0.8":  # 全局合并文件（集合根目录下）
-                    file_path = os.path.join(output_root, filename)
-                else:  # 剧集文件
-                    file_path = os.path.join(output_root, episode_id, filename)
-                
-                if os.path.exists(file_path):
-                    try:
-                        os.remove(file_path)
-                        deleted_count += 1
-                        log.info(f"🗑️ 删除: {file_path}")
-                    except Exception as e:
-                        log.info(f"❌ 删除失败: {file_path} - {e}")
-    
-    log.info(f"✅ 删除了 {deleted_count} 个文件")
-
-
-def check_invalid_files(config: PipelineConfig, step_name: str) -> List[str]:
-    """检查指定步骤的无效文件"""
+        for _, files in _paths_for(current_step, output_root, step_episodes):
+            for _, file_path in files:
+                paths[file_path] = None
+    
+    with ThreadPoolExecutor(max_workers=_io_workers(len(paths))) as executor:
+        outcomes = list(executor.map(_remove_file, paths))
+    deleted_count = sum(1 for deleted, _ in outcomes if deleted)
+    
+    lines = [line for _, line in outcomes if line]
+    lines.append(f"✅ 删除了 {deleted_count} 个文件")
+    _log_lines(lines)
+
+
+def _episode_invalid(step_name: str, files: List[Tuple[str, str]], stats: Dict[str, os.stat_result],
+                     cache: Optional[Dict[str, list]] = None) -> bool:
+    """单个剧集的步骤产物是否缺失、过小或损坏（存在性与大小取自 stats）；
+    cache 中 mtime/size 未变的 JSON 直接使用上次的校验结果，新结果写回 cache"""
+    for filename, file_path in files:
+        st = stats.get(file_path)
+        if st is None:
+            return True
+        size = st.st_size
+        if filename.endswith('.json'):
+            cached = cache.get(file_path) if cache is not None else None
+            if cached and cached[0] == st.st_mtime_ns and cached[1] == size:
+                valid = cached[2]
+            else:
+                valid = json_output_valid(step_name, file_path, size)
+                if cache is not None:
+                    cache[file_path] = [st.st_mtime_ns, size, valid]
+            if not valid:
+                return True
+        elif size < 100:  # 文件太小
+            return True
+    return False
+
+
+def check_invalid_files(config: PipelineConfig, step_name: str, episodes: Optional[List[str]] = None) -> List[str]:
+    """检查指定步骤的无效文件；episodes 为调用方已获取的剧集列表（None 时重新扫描）"""
     output_root = config.project_root
-    episodes = PipelineUtils.get_episode_list(output_root)
+    if episodes is None:
+        episodes = PipelineUtils.get_episode_list(output_root)
     
-    # 定义每个步骤的预期输出文件
-    expected_files = {
-        "0.1": ["0_1_timed_dialogue.srt"],
-        "0.2": ["0_2_clues.json"],
-        "0.3": ["global_character_graph_llm.json"],
-        "0.4": ["0_4_calibrated_dialogue.txt"],
-        "0.5": ["0_5_dialogue_turns.json"],
-        "0.6": ["0_6_script_flow.json", "0_6_script_draft.md"],
-        "0.7": ["0_7_script.stmf", "0_7_script_analysis.json"],
-        "0.8": ["0_8_complete_screenplay.fountain", "0_8_complete_screenplay.fdx"]
-    }
-    
-    if step_name not in expected_files:
+    if step_name not in EXPECTED_FILES:
         return []
     
-    required_files = expected_files[step_name]
-    invalid_episodes = []
-    
-    for episode_id in episodes:
-        for filename in required_files:
-            if step_name == "0.3":  # 全局文件（在 global/ 下）
-                file_path = os.path.join(output_root, "global", filename)
-            elif step_name == "0.8":  # 全局合并文件（集合根目录下）
-                file_path = os.path.join(output_root, filename)
-            else:  # 剧集文件
-                file_path = os.path.join(output_root, episode_id, filename)
-            
-            if not os.path.exists(file_path):
-                invalid_episodes.append(episode_id)
-                break
-            else:
-                # 检查文件是否为空或损坏
-                try:
-                    if filename.endswith('.json'):
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            # 针对不同步骤的结构校验
-                            if step_name == "0.5":
-                                valid = False
-                                if isinstance(data, dict):
-                                    # 接受 dialogue_turns（主）、turns/dialogues（兼容）
-                                    valid = bool(data.get('dialogue_turns') or data.get('turns') or data.get('dialogues'))
-                                elif isinstance(data, list):
-                                    valid = len(data) > 0
-                                if not valid:
-                                    invalid_episodes.append(episode_id)
-                                    break
-                            else:
-                                # 通用（宽松）校验：非空即可
-                                if not data:
-                                    invalid_episodes.append(episode_id)
-                                    break
-                    elif os.path.getsize(file_path) < 100:  # 文件太小
-                        invalid_episodes.append(episode_id)
-                        break
-                except (json.JSONDecodeError, Exception):
-                    invalid_episodes.append(episode_id)
-                    break
-    
-    return invalid_episodes
-
-
-def interactive_step_selection(config: PipelineConfig) -> tuple:
+    return _invalid_episodes([step_name], output_root, episodes)[step_name]
+
+
+def scan_all_steps(config: PipelineConfig, episodes: Optional[List[str]] = None) -> Dict[str, List[str]]:
+    """一次扫描检查全部步骤的无效文件：{步骤: 无效剧集列表}（与逐步调用 check_invalid_files 结果一致）"""
+    if episodes is None:
+        episodes = PipelineUtils.get_episode_list(config.project_root)
+    return _invalid_episodes(list(EXPECTED_FILES), config.project_root, episodes)
+
+
+def _invalid_episodes(step_names: List[str], output_root: str, episodes: List[str]) -> Dict[str, List[str]]:
+    """对给定步骤的产物做一轮目录扫描后并发校验，返回 {步骤: 无效剧集列表}"""
+    items_by_step = {st: _paths_for(st, output_root, episodes) for st in step_names}
+    # 所有步骤共用一次目录扫描：每个剧集目录、global/ 与集合根目录各 scandir 一次
+    stats = _scan_stats([item for items in items_by_step.values() for item in items])
+    cache = _load_integrity_cache(output_root)
+    cached_before = dict(cache)
+    tasks = [(st, episode_id, files) for st, items in items_by_step.items() for episode_id, files in items]
+    with ThreadPoolExecutor(max_workers=_io_workers(len(tasks))) as executor:
+        flags = list(executor.map(lambda t: _episode_invalid(t[0], t[2], stats, cache), tasks))
+    # 有新增或更新的校验结果时才写回
+    if cache != cached_before:
+        _save_integrity_cache(output_root, cache)
+    invalid: Dict[str, List[str]] = {st: [] for st in step_names}
+    for (st, episode_id, _), bad in zip(tasks, flags):
+        if bad:
+            invalid[st].append(episode_id)
+    return invalid
+
+
+def interactive_step_selection(config: PipelineConfig, episodes: Optional[List[str]] = None) -> tuple:
     """互动式步骤选择"""
-    log.info("\n" + "="*60)
-    log.info("🎯 互动式流水线配置")
-    log.info("="*60)
     
     # 检查各步骤的文件状态
     steps = [
@@ -323,11 +368,14 @@ def interactive_step_selection(config: PipelineConfig) -> tuple:
         ("0.8", "合并与导出")
     ]
     
-    log.info("📊 各步骤文件状态检查:")
+    lines = ["\n" + "="*60, "🎯 互动式流水线配置", "="*60, "📊 各步骤文件状态检查:"]
+    if episodes is None:
+        episodes = PipelineUtils.get_episode_list(config.project_root)
+    total_episodes = len(episodes)
+    invalid_by_step = scan_all_steps(config, episodes)
     step_status = {}
     for step_num, step_desc in steps:
-        invalid_files = check_invalid_files(config, step_num)
-        total_episodes = len(PipelineUtils.get_episode_list(config.project_root))
+        invalid_files = invalid_by_step.get(step_num, [])
         valid_count = total_episodes - len(invalid_files)
         
         if step_num == "0.3":  # 全局步骤
@@ -353,13 +401,16 @@ def interactive_step_selection(config: PipelineConfig) -> tuple:
             "valid_count": valid_count,
             "total_count": total_episodes
         }
-        log.info(f"  {step_num}: {step_desc} - {status}")
-    
-    log.info("\n🎮 选择执行模式:")
-    log.info("1. 从头开始 (重新执行所有步骤)")
-    log.info("2. 从指定步骤开始 (跳过已完成的步骤)")
-    log.info("3. 从指定步骤强制重跑 (删除当前步骤及其之后步骤的文件重新执行)")
-    log.info("4. 修复无效文件 (只重跑有问题的文件)")
+        lines.append(f"  {step_num}: {step_desc} - {status}")
+    
+    lines += [
+        "\n🎮 选择执行模式:",
+        "1. 从头开始 (重新执行所有步骤)",
+        "2. 从指定步骤开始 (跳过已完成的步骤)",
+        "3. 从指定步骤强制重跑 (删除当前步骤及其之后步骤的文件重新执行)",
+        "4. 修复无效文件 (只重跑有问题的文件)",
+    ]
+    _log_lines(lines)
     
     while True:
         try:
@@ -374,42 +425,39 @@ def interactive_step_selection(config: PipelineConfig) -> tuple:
     if choice == "1":
         return "0.1", "rerun", []
     elif choice == "2":
-        log.info("\n📋 可用步骤:")
-        for step_num, step_desc in steps:
-            log.info(f"  {step_num}: {step_desc}")
+        _log_lines(["\n📋 可用步骤:"] + [f"  {step_num}: {step_desc}" for step_num, step_desc in steps])
         
         while True:
             try:
                 start_step = input("\n请输入起始步骤 (0.1-0.8): ").strip()
-                if start_step in [s[0] for s in steps]:
+                if start_step in STEP_INDEX:
                     return start_step, "resume", []
                 log.info("❌ 无效步骤，请输入 0.1-0.8")
             except KeyboardInterrupt:
                 log.info("\n👋 用户取消")
                 return None, None, None
     elif choice == "3":
-        log.info("\n📋 可重跑的步骤:")
-        for step_num, step_desc in steps:
-            status_info = step_status[step_num]
-            log.info(f"  {step_num}: {step_desc} - {status_info['status']}")
+        _log_lines(["\n📋 可重跑的步骤:"] +
+                   [f"  {step_num}: {step_desc} - {step_status[step_num]['status']}" for step_num, step_desc in steps])
         
         while True:
             try:
                 target_step = input("\n请输入要重跑的步骤 (0.1-0.8): ").strip()
-                if target_step in [s[0] for s in steps]:
+                if target_step in STEP_INDEX:
                     return target_step, "force_rerun", []
                 log.info("❌ 无效步骤，请输入 0.1-0.8")
             except KeyboardInterrupt:
                 log.info("\n👋 用户取消")
                 return None, None, None
     elif choice == "4":
-        log.info("\n🔧 检测到的问题文件:")
+        lines = ["\n🔧 检测到的问题文件:"]
         problem_steps = []
         for step_num, step_desc in steps:
             status_info = step_status[step_num]
             if status_info["invalid_files"]:
                 problem_steps.append(step_num)
-                log.info(f"  {step_num}: {step_desc} - {len(status_info['invalid_files'])} 个问题文件")
+                lines.append(f"  {step_num}: {step_desc} - {len(status_info['invalid_files'])} 个问题文件")
+        _log_lines(lines)
         
         if not problem_steps:
             log.info("✅ 没有发现问题文件")
@@ -446,39 +494,41 @@ def main() -> int:
     
     # 检查是否没有传入任何参数
     if len(sys.argv) == 1:
-        log.info("🎬 剧集剧本生成流水线")
-        log.info("="*60)
-        log.info("📋 使用说明:")
-        log.info("  本工具支持从 Step 0.1 到 Step 0.8 的完整流水线执行")
-        log.info("")
-        log.info("🚀 快速开始:")
-        log.info("  python run_0_1_to_0_8.py --interactive")
-        log.info("  (推荐: 启用互动式模式，引导您完成配置)")
-        log.info("")
-        log.info("⚙️ 主要参数:")
-        log.info("  --interactive           启用互动式模式 (推荐新手使用)")
-        log.info("  --collection NAME       指定输出集合名称")
-        log.info("  --start-step STEP       从指定步骤开始 (0.1-0.8)")
-        log.info("  --force-rerun          强制重跑指定步骤")
-        log.info("  --fix-invalid          只修复无效文件")
-        log.info("  --skip-integrity-check  跳过文件完整性检查")
-        log.info("  --bucket NAME          GCS存储桶名称")
-        log.info("")
-        log.info("📖 使用示例:")
-        log.info("  # 互动式运行 (推荐)")
-        log.info("  python run_0_1_to_0_8.py --interactive")
-        log.info("")
-        log.info("  # 从头开始运行指定集合")
-        log.info("  python run_0_1_to_0_8.py --collection 我的剧本集合")
-        log.info("")
-        log.info("  # 从指定步骤开始")
-        log.info("  python run_0_1_to_0_8.py --collection 我的剧本集合 --start-step 0.5")
-        log.info("")
-        log.info("  # 强制重跑某个步骤")
-        log.info("  python run_0_1_to_0_8.py --collection 我的剧本集合 --start-step 0.6 --force-rerun")
-        log.info("")
-        log.info("💡 提示: 使用 --help 查看完整参数说明")
-        log.info("="*60)
+        _log_lines([
+            "🎬 剧集剧本生成流水线",
+            "="*60,
+            "📋 使用说明:",
+            "  本工具支持从 Step 0.1 到 Step 0.8 的完整流水线执行",
+            "",
+            "🚀 快速开始:",
+            "  python run_0_1_to_0_8.py --interactive",
+            "  (推荐: 启用互动式模式，引导您完成配置)",
+            "",
+            "⚙️ 主要参数:",
+            "  --interactive           启用互动式模式 (推荐新手使用)",
+            "  --collection NAME       指定输出集合名称",
+            "  --start-step STEP       从指定步骤开始 (0.1-0.8)",
+            "  --force-rerun          强制重跑指定步骤",
+            "  --fix-invalid          只修复无效文件",
+            "  --skip-integrity-check  跳过文件完整性检查",
+            "  --bucket NAME          GCS存储桶名称",
+            "",
+            "📖 使用示例:",
+            "  # 互动式运行 (推荐)",
+            "  python run_0_1_to_0_8.py --interactive",
+            "",
+            "  # 从头开始运行指定集合",
+            "  python run_0_1_to_0_8.py --collection 我的剧本集合",
+            "",
+            "  # 从指定步骤开始",
+            "  python run_0_1_to_0_8.py --collection 我的剧本集合 --start-step 0.5",
+            "",
+            "  # 强制重跑某个步骤",
+            "  python run_0_1_to_0_8.py --collection 我的剧本集合 --start-step 0.6 --force-rerun",
+            "",
+            "💡 提示: 使用 --help 查看完整参数说明",
+            "="*60,
+        ])
         return 0
     
     args = parser.parse_args()
@@ -488,26 +538,7 @@ def main() -> int:
     if args.interactive and not collection:
         # 在 new_pipeline/output 下列出候选集合目录（支持双层同名或单层包含 episode_*/global 的目录）
         base_output_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "new_pipeline", "output"))
-        candidates = []
-        try:
-            for name in sorted(os.listdir(base_output_dir)):
-                outer_path = os.path.join(base_output_dir, name)
-                if not os.path.isdir(outer_path):
-                    continue
-                inner_same = os.path.isdir(os.path.join(outer_path, name))
-                has_global = os.path.isdir(os.path.join(outer_path, "global"))
-                has_episode = False
-                try:
-                    for d in os.listdir(outer_path):
-                        if d.startswith("episode_") and os.path.isdir(os.path.join(outer_path, d)):
-                            has_episode = True
-                            break
-                except Exception:
-                    pass
-                if inner_same or has_global or has_episode:
-                    candidates.append(name)
-        except FileNotFoundError:
-            candidates = []
+        candidates = PipelineUtils.list_collections(base_output_dir)
         if not candidates:
             log.info("❌ 未找到可用集合目录，请使用 --collection 指定或先生成输出")
             return 1
@@ -552,11 +583,13 @@ def main() -> int:
 
     # 检查输入目录，root_dir
     log.info(f"项目根目录: {config.project_root}, 输出目录: {config.output_dir}")
+    # 剧集列表在本次运行内不变（由 Step0 的 0_gcs_path.txt 决定），只扫描一次供各检查复用
+    episodes = PipelineUtils.get_episode_list(config.project_root)
 
 
     # 互动式模式处理
     if args.interactive:
-        result = interactive_step_selection(config)
+        result = interactive_step_selection(config, episodes)
         if result is None:
             return 1
         start_step, mode, target_episodes = result
@@ -567,7 +600,7 @@ def main() -> int:
         elif args.fix_invalid:
             mode = "fix_invalid"
             # 检查无效文件
-            invalid_episodes = check_invalid_files(config, start_step)
+            invalid_episodes = check_invalid_files(config, start_step, episodes)
             if not invalid_episodes:
                 log.info(f"✅ 步骤 {start_step} 没有无效文件")
                 return 0
@@ -576,17 +609,20 @@ def main() -> int:
             mode = "resume"
         target_episodes = []
 
-    log.info("="*60)
-    log.info("🎬 剧集剧本生成流水线")
-    log.info("="*60)
-    log.info(f"输出目录: {output_root}")
-    log.info(f"集合名称: {collection}")
-    log.info(f"起始步骤: {start_step}")
-    log.info(f"执行模式: {mode}")
-    log.info(f"跳过完整性检查: {args.skip_integrity_check}")
+    lines = [
+        "="*60,
+        "🎬 剧集剧本生成流水线",
+        "="*60,
+        f"输出目录: {output_root}",
+        f"集合名称: {collection}",
+        f"起始步骤: {start_step}",
+        f"执行模式: {mode}",
+        f"跳过完整性检查: {args.skip_integrity_check}",
+    ]
     if target_episodes:
-        log.info(f"目标剧集: {len(target_episodes)} 个")
-    log.info("="*60)
+        lines.append(f"目标剧集: {len(target_episodes)} 个")
+    lines.append("="*60)
+    _log_lines(lines)
 
     # 初始化统计
     stats = PipelineStats()
@@ -603,22 +639,17 @@ def main() -> int:
         ("0.8", Step0_8FinalScript, "合并与导出")
     ]
     
-    # 找到起始步骤
-    start_index = 0
-    for i, (step_num, _, _) in enumerate(steps):
-        if step_num == start_step:
-            start_index = i
-            break
-    else:
-        log.info(f"❌ 无效的起始步骤: {start_step}")
-        log.info(f"可用步骤: {', '.join([s[0] for s in steps])}")
+    # 找到起始步骤（steps 与 STEP_ORDER 顺序一致）
+    start_index = STEP_INDEX.get(start_step)
+    if start_index is None:
+        _log_lines([f"❌ 无效的起始步骤: {start_step}", f"可用步骤: {', '.join(STEP_ORDER)}"])
         return 1
     
     # 处理强制重跑模式
     if mode == "force_rerun":
         log.info(f"🗑️ 强制重跑模式：删除步骤 {start_step} 的现有文件...")
         log.info("⚠️ 注意：强制重跑将删除现有文件，请确保已备份重要数据")
-        delete_step_files(config, start_step, target_episodes)
+        delete_step_files(config, start_step, target_episodes, episodes=episodes)
     
     log.info(f"从步骤 {start_step} 开始执行 ({mode} 模式)...")
     
@@ -634,17 +665,8 @@ def main() -> int:
             # 记录步骤开始
             report_generator.record_step_start(step_name)
             
-            # 如果跳过完整性检查，则修改检查函数
-            if args.skip_integrity_check:
-                global check_file_integrity
-                original_check = check_file_integrity
-                check_file_integrity = lambda config, step_name: True
-            
-            success, step_instance, step_result = run_step(step_num, step_class, config, stats)
-            
-            # 恢复原始检查函数
-            if args.skip_integrity_check:
-                check_file_integrity = original_check
+            success, step_instance, step_result = run_step(step_num, step_class, config, stats, episodes,
+                                                           skip_integrity=args.skip_integrity_check)
             
             # 记录步骤结束（获取客户端token使用信息）
             client = getattr(step_instance, 'client', None) if step_instance else None
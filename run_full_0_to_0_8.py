@@ -8,6 +8,8 @@
 - STEP0_BUCKET_NAME: GCS 存储桶名（覆盖 pipeline.yaml 中的 gcp.bucket_name）
 - SKIP_LLM=1: Step0.4 仅回填，跳过 LLM
 - FORCE_OVERWRITE=1: 跳过已存在输出检查（各步自身判定）
+- PIPELINE_EPISODE_OVERLAP=1: Step0.4~0.7 按剧集流水执行（某集完成 0.4 即进入 0.5，无需等待全部剧集）
+- PIPELINE_EPISODE_WORKERS: 上述模式下同时在途的剧集数（默认取 concurrency.max_workers，缺省 3）
 
 使用：
   python run_full_0_to_0_8.py
@@ -15,11 +17,16 @@
 
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from new_pipeline.core import PipelineConfig
+from new_pipeline.core import PipelineConfig, PipelineUtils
+from new_pipeline.core.steps_meta import is_failed
+from new_pipeline.steps import PipelineStep
 from new_pipeline.steps.step0_upload import Step0Upload
 from new_pipeline.steps.step0_1_asr import Step0_1ASR
 from new_pipeline.steps.step0_2_clue_extraction import Step0_2ClueExtraction
@@ -36,21 +43,67 @@ logger = get_logger(__name__)
 
 load_dotenv()  # 从 .env 文件加载环境变量（如果存在）
 
-def _fail(step: str, result) -> bool:
-    status = (result or {}).get("status")
-    if step in ("0",):
-        return status != "success" and status != "completed" and status != "already_exists"
-    if step in ("0.1", "0.2", "0.3", "0.4", "0.5", "0.6", "0.7", "0.8"):
-        return status != "completed" and status != "already_exists"
-    return status != "success" and status != "already_exists"
+
+@dataclass(frozen=True, slots=True)
+class RunEnv:
+    """本脚本使用的环境变量，main() 开始时解析一次"""
+    input_dir: str
+    collection: str
+    bucket: Optional[str]
+    skip_llm: bool
+    force_overwrite: bool
+    episode_overlap: bool
+    episode_workers: Optional[int]
+
+    @classmethod
+    def from_environ(cls) -> "RunEnv":
+        env = os.environ
+        workers = (env.get("PIPELINE_EPISODE_WORKERS") or "").strip()
+        return cls(
+            input_dir=env.get("STEP0_INPUT_DIR", "").strip(),
+            collection=env.get("STEP0_COLLECTION", "").strip(),
+            bucket=env.get("STEP0_BUCKET_NAME") or None,
+            skip_llm=env.get("SKIP_LLM") == "1",
+            force_overwrite=bool(env.get("FORCE_OVERWRITE")),
+            episode_overlap=env.get("PIPELINE_EPISODE_OVERLAP") == "1",
+            episode_workers=int(workers) if workers.isdigit() else None,
+        )
+
+
+def _run_episode_pipeline(stages: List[Tuple[str, PipelineStep]], episodes: List[str],
+                          max_workers: int) -> Dict[str, Dict[str, Any]]:
+    """按剧集流水执行多个步骤：每集依次经过 stages，不同剧集的不同步骤相互重叠。
+    同时在途的剧集数受 max_workers 限制（即对 LLM 调用的全局限流）；某集某步失败后不再执行该集的后续步骤。
+    返回 {步骤: {"status": "completed", "results": [...]}}，与逐步 run() 的返回结构一致。"""
+    def run_chain(episode_id: str) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for step_num, step in stages:
+            try:
+                result = step.run_episode(episode_id)
+            except Exception as e:
+                result = {"status": "failed", "error": str(e)}
+            result["episode_id"] = episode_id
+            out[step_num] = result
+            if result.get("status") not in ("success", "completed", "already_exists"):
+                print(f"❌ {episode_id} 在 Step{step_num} 失败: {result.get('error')}")
+                break
+        return out
+
+    per_step: Dict[str, List[Dict[str, Any]]] = {step_num: [] for step_num, _ in stages}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for out in executor.map(run_chain, episodes):
+            for step_num, result in out.items():
+                per_step[step_num].append(result)
+    return {step_num: {"status": "completed", "results": results} for step_num, results in per_step.items()}
 
 
 def main() -> int:
     print("=== 运行 Step0 → Step0.8 ===")
 
     # 读取输入与集合
-    input_dir = os.environ.get("STEP0_INPUT_DIR", "").strip()
-    collection = os.environ.get("STEP0_COLLECTION", "").strip()
+    run_env = RunEnv.from_environ()
+    input_dir = run_env.input_dir
+    collection = run_env.collection
 
     if not input_dir:
         print("❌ 缺少 STEP0_INPUT_DIR 环境变量（本地 mp4 输入目录）")
@@ -70,25 +123,23 @@ def main() -> int:
     output_root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "new_pipeline", "output", combined_collection_name))
     os.makedirs(output_root, exist_ok=True)
 
-    # 允许外部覆盖 bucket
-    if os.environ.get("STEP0_BUCKET_NAME"):
-        config.config.setdefault("gcp", {})
-        config.config["gcp"]["bucket_name"] = os.environ["STEP0_BUCKET_NAME"]
-
-    config.config.setdefault("project", {})
-    config.config["project"]["root_dir"] = output_root
-    config.config["project"]["output_dir"] = output_root
+    # 输出目录与（可选）外部指定的 bucket 一次性覆盖到配置
+    config.apply_overrides(root_dir=output_root, output_dir=output_root, bucket_name=run_env.bucket)
 
-    print(f"输入目录: {input_dir}")
-    print(f"输出目录: {output_root}")
-    print(f"集合名称: {collection}")
+    # 运行信息整段输出一次
+    lines = [f"输入目录: {input_dir}", f"输出目录: {output_root}", f"集合名称: {collection}"]
+    if run_env.skip_llm:
+        lines.append("SKIP_LLM=1: Step0.4 仅回填，跳过 LLM")
+    if run_env.force_overwrite:
+        lines.append("FORCE_OVERWRITE: 忽略已存在的输出，全部重新生成")
+    print("\n".join(lines))
 
     try:
         # Step0: 上传到 GCS
         print("\n1) Step0: 上传到 GCS …")
         s0 = Step0Upload(config)
         r0 = s0.run()
-        if _fail("0", r0):
+        if is_failed("0", r0):
             print(f"❌ Step0 失败: {r0}")
             return 1
         print("✅ Step0 完成")
@@ -97,7 +148,7 @@ def main() -> int:
         print("\n2) Step0.1: ASR …")
         s01 = Step0_1ASR(config)
         r01 = s01.run()
-        if _fail("0.1", r01):
+        if is_failed("0.1", r01):
             print(f"❌ Step0.1 失败: {r01}")
             return 1
         print("✅ Step0.1 完成")
@@ -106,7 +157,7 @@ def main() -> int:
         print("\n3) Step0.2: 线索提取 …")
         s02 = Step0_2ClueExtraction(config)
         r02 = s02.run()
-        if _fail("0.2", r02):
+        if is_failed("0.2", r02):
             print(f"❌ Step0.2 失败: {r02}")
             return 1
         print("✅ Step0.2 完成")
@@ -115,52 +166,71 @@ def main() -> int:
         print("\n4) Step0.3: 全局角色对齐 …")
         s03 = Step0_3GlobalAlignmentLLM(config)
         r03 = s03.run()
-        if _fail("0.3", r03):
+        if is_failed("0.3", r03):
             print(f"❌ Step0.3 失败: {r03}")
             return 1
         print("✅ Step0.3 完成")
 
-        # Step0.4: 说话人校准（支持 SKIP_LLM=1 回填模式）
-        print("\n5) Step0.4: 说话人校准 …")
-        s04 = Step0_4SpeakerCalibration(config)
-        r04 = s04.run()
-        if _fail("0.4", r04):
-            print(f"❌ Step0.4 失败: {r04}")
-            return 1
-        print("✅ Step0.4 完成")
-
-        # Step0.5: 对话轮次重构
-        print("\n6) Step0.5: 对话轮次重构 …")
-        s05 = Step0_5IntegratedAnalysis(config)
-        r05 = s05.run()
-        if _fail("0.5", r05):
-            print(f"❌ Step0.5 失败: {r05}")
-            return 1
-        print("✅ Step0.5 完成")
-
-        # Step0.6: 情节抽取
-        print("\n7) Step0.6: 情节抽取 …")
-        s06 = Step0_6PlotExtraction(config)
-        r06 = s06.run()
-        if _fail("0.6", r06):
-            print(f"❌ Step0.6 失败: {r06}")
-            return 1
-        print("✅ Step0.6 完成")
-
-        # Step0.7: 剧本撰写（STMF）
-        print("\n8) Step0.7: 剧本撰写（STMF） …")
-        s07 = Step0_7ScriptWriting(config)
-        r07 = s07.run()
-        if _fail("0.7", r07):
-            print(f"❌ Step0.7 失败: {r07}")
-            return 1
-        print("✅ Step0.7 完成")
+        if run_env.episode_overlap:
+            # Step0.4 ~ Step0.7: 按剧集流水执行（Step0.3 与 Step0.8 为全局步骤，作为前后屏障）
+            print("\n5-8) Step0.4 → Step0.7: 按剧集流水执行 …")
+            stages = [
+                ("0.4", Step0_4SpeakerCalibration(config)),
+                ("0.5", Step0_5IntegratedAnalysis(config)),
+                ("0.6", Step0_6PlotExtraction(config)),
+                ("0.7", Step0_7ScriptWriting(config)),
+            ]
+            conc_conf = getattr(config, 'concurrency', {}) or {}
+            workers = run_env.episode_workers or int(conc_conf.get('max_workers', 3))
+            episodes = PipelineUtils.get_episode_list(config.project_root)
+            stage_results = _run_episode_pipeline(stages, episodes, workers)
+            lines = []
+            for step_num, result in stage_results.items():
+                failed = sum(1 for r in result["results"] if r.get("status") not in ("success", "completed", "already_exists"))
+                lines.append(f"✅ Step{step_num} 完成（{len(result['results'])} 集，失败 {failed}）")
+            print("\n".join(lines))
+        else:
+            # Step0.4: 说话人校准（支持 SKIP_LLM=1 回填模式）
+            print("\n5) Step0.4: 说话人校准 …")
+            s04 = Step0_4SpeakerCalibration(config)
+            r04 = s04.run()
+            if is_failed("0.4", r04):
+                print(f"❌ Step0.4 失败: {r04}")
+                return 1
+            print("✅ Step0.4 完成")
+
+            # Step0.5: 对话轮次重构
+            print("\n6) Step0.5: 对话轮次重构 …")
+            s05 = Step0_5IntegratedAnalysis(config)
+            r05 = s05.run()
+            if is_failed("0.5", r05):
+                print(f"❌ Step0.5 失败: {r05}")
+                return 1
+            print("✅ Step0.5 完成")
+
+            # Step0.6: 情节抽取
+            print("\n7) Step0.6: 情节抽取 …")
+            s06 = Step0_6PlotExtraction(config)
+            r06 = s06.run()
+            if is_failed("0.6", r06):
+                print(f"❌ Step0.6 失败: {r06}")
+                return 1
+            print("✅ Step0.6 完成")
+
+            # Step0.7: 剧本撰写（STMF）
+            print("\n8) Step0.7: 剧本撰写（STMF） …")
+            s07 = Step0_7ScriptWriting(config)
+            r07 = s07.run()
+            if is_failed("0.7", r07):
+                print(f"❌ Step0.7 失败: {r07}")
+                return 1
+            print("✅ Step0.7 完成")
 
         # Step0.8: 合并与导出（STMf→Fountain/FDX）
         print("\n9) Step0.8: 合并与导出 …")
         s08 = Step0_8FinalScript(config)
         r08 = s08.run()
-        if _fail("0.8", r08):
+        if is_failed("0.8", r08):
             print(f"❌ Step0.8 失败: {r08}")
             return 1
         print("✅ Step0.8 完成")
@@ -6,15 +6,22 @@ FastAPI 服务：剧集剧本生成流水线 Web API
 
 import os
 import time
-import json
 import asyncio
+import functools
+import hashlib
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from email.utils import formatdate
 from typing import Dict, List, Any, Optional, Literal
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Response
 from pydantic import BaseModel
 from enum import Enum
 
 from new_pipeline.core import PipelineConfig, PipelineUtils
 from new_pipeline.core.report_generator import PipelineReportGenerator
+from new_pipeline.core.steps_meta import EXPECTED_FILES, GLOBAL_STEPS, ROOT_STEPS, STEP_INDEX, STEP_ORDER, is_failed, json_output_valid, missing_output_files
 from new_pipeline.steps.step0_1_asr import Step0_1ASR
 from new_pipeline.steps.step0_2_clue_extraction import Step0_2ClueExtraction
 from new_pipeline.steps.step0_3_global_alignment_llm import Step0_3GlobalAlignmentLLM
@@ -29,6 +36,12 @@ from new_pipeline.steps.commont_log import log
 from dotenv import load_dotenv
 load_dotenv()
 
+try:
+    from celery_app import celery_app, run_pipeline_task  # 可选依赖：存在时可将流水线分发到 Celery worker
+except ImportError:
+    celery_app = None
+    run_pipeline_task = None
+
 
 class ExecutionMode(str, Enum):
     """执行模式枚举"""
@@ -38,29 +51,131 @@ class ExecutionMode(str, Enum):
     FIX_INVALID = "fix_invalid"  # 只修复无效文件
 
 
+# 集合输出根目录
+BASE_OUTPUT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "new_pipeline", "output"))
+
+# 剧集列表缓存的时间窗口（秒）：目录 mtime 捕获剧集增删，时间窗口兜底 gcs_path.txt 的后续写入
+_EPISODE_CACHE_TTL = 5.0
+
+
+@functools.lru_cache(maxsize=32)
+def _episode_list_cached(output_root: str, mtime_ns: int, ttl_bucket: int) -> tuple[str, ...]:
+    return tuple(PipelineUtils.get_episode_list(output_root))
+
+
+def _episode_list(output_root: str) -> tuple[str, ...]:
+    """获取剧集列表（按目录 mtime + 短 TTL 缓存）"""
+    try:
+        mtime_ns = os.stat(output_root).st_mtime_ns
+    except OSError:
+        return ()
+    return _episode_list_cached(output_root, mtime_ns, int(time.monotonic() // _EPISODE_CACHE_TTL))
+
+
+@functools.lru_cache(maxsize=64)
+def _output_root_cached(collection: str, mtime_ns: int) -> str:
+    outer_path = os.path.join(BASE_OUTPUT_DIR, collection)
+    inner_same_path = os.path.join(outer_path, collection)
+    
+    # 兼容双层与单层目录结构
+    if os.path.isdir(inner_same_path):
+        return os.path.abspath(inner_same_path)
+    return os.path.abspath(outer_path)
+
+
+def _resolve_output_root(collection: str) -> str:
+    """解析集合的输出根目录（按外层目录 mtime 缓存，内层同名目录增删会使缓存失效）"""
+    outer_path = os.path.join(BASE_OUTPUT_DIR, collection)
+    try:
+        mtime_ns = os.stat(outer_path).st_mtime_ns
+    except OSError:
+        return os.path.abspath(outer_path)
+    return _output_root_cached(collection, mtime_ns)
+
+
+# 集合列表缓存的时间窗口（秒）：输出目录 mtime 捕获集合增删，时间窗口兜底集合内 episode_*/global 的后续创建
+_COLLECTIONS_CACHE_TTL = 5.0
+
+
+@functools.lru_cache(maxsize=4)
+def _list_collections_cached(mtime_ns: int, ttl_bucket: int) -> tuple[str, ...]:
+    """列出输出目录下的候选集合目录（支持双层同名或单层包含 episode_*/global 的目录）"""
+    return tuple(PipelineUtils.list_collections(BASE_OUTPUT_DIR))
+
+
+def _scan_dir(dir_path: str) -> Dict[str, os.DirEntry]:
+    """单次 scandir 读取目录条目：{文件名: DirEntry}；目录不存在时返回空字典"""
+    try:
+        with os.scandir(dir_path) as it:
+            return {entry.name: entry for entry in it}
+    except OSError:
+        return {}
+
+
+def _entry_stat(entries: Dict[str, os.DirEntry], filename: str) -> Optional[os.stat_result]:
+    """取目录条目的 stat（只对需要的文件发起，DirEntry 会缓存结果）；不存在或失效的符号链接返回 None"""
+    entry = entries.get(filename)
+    if entry is None:
+        return None
+    try:
+        return entry.stat()
+    except OSError:
+        return None
+
+
+def _shared_dir(output_root: str, step_name: str) -> Optional[str]:
+    """与剧集无关的步骤产物目录：0.3 在 global/ 下，0.8 在集合根目录下；剧集级步骤返回 None"""
+    if step_name in GLOBAL_STEPS:
+        return os.path.join(output_root, "global")
+    if step_name in ROOT_STEPS:
+        return output_root
+    return None
+
+
+def _step_dirs(output_root: str, step_name: str, episodes: List[str]):
+    """逐集给出 (episode_id, 目录条目)；全局步骤的目录只扫描一次"""
+    shared_dir = _shared_dir(output_root, step_name)
+    if shared_dir is not None:
+        shared = _scan_dir(shared_dir)
+        for episode_id in episodes:
+            yield episode_id, shared
+    else:
+        for episode_id in episodes:
+            yield episode_id, _scan_dir(os.path.join(output_root, episode_id))
+
+
+@dataclass(slots=True)
+class StepStat:
+    """单个步骤的统计"""
+    start_time: float
+    end_time: Optional[float] = None
+    duration: Optional[float] = None
+    tokens_used: int = 0
+    status: str = "running"
+
+
 class PipelineStats:
     """流水线统计信息"""
     def __init__(self):
-        self.step_stats: Dict[str, Dict[str, Any]] = {}
+        self.step_stats: Dict[str, StepStat] = {}
         self.total_start_time = time.time()
     
     def start_step(self, step_name: str):
         """开始步骤计时"""
-        self.step_stats[step_name] = {
-            "start_time": time.time(),
-            "end_time": None,
-            "duration": None,
-            "tokens_used": 0,
-            "status": "running"
-        }
+        self.step_stats[step_name] = StepStat(start_time=time.time())
     
     def end_step(self, step_name: str, tokens_used: int = 0, status: str = "completed"):
         """结束步骤计时"""
-        if step_name in self.step_stats:
-            self.step_stats[step_name]["end_time"] = time.time()
-            self.step_stats[step_name]["duration"] = self.step_stats[step_name]["end_time"] - self.step_stats[step_name]["start_time"]
-            self.step_stats[step_name]["tokens_used"] = tokens_used
-            self.step_stats[step_name]["status"] = status
+        stat = self.step_stats.get(step_name)
+        if stat is not None:
+            stat.end_time = time.time()
+            stat.duration = stat.end_time - stat.start_time
+            stat.tokens_used = tokens_used
+            stat.status = status
+    
+    def total_tokens(self) -> int:
+        """各步骤 token 消耗合计"""
+        return sum(stat.tokens_used for stat in self.step_stats.values())
     
     def print_summary(self):
         """打印统计摘要"""
@@ -69,93 +184,71 @@ class PipelineStats:
         log.info("="*60)
         
         total_duration = time.time() - self.total_start_time
-        total_tokens = sum(stats.get("tokens_used", 0) for stats in self.step_stats.values())
+        total_tokens = self.total_tokens()
         
-        log.info(f"总执行时间: {total_duration:.2f}秒 ({total_duration/60:.1f}分钟)")
-        log.info(f"总Token消耗: {total_tokens:,}")
+        log.info("总执行时间: {:.2f}秒 ({:.1f}分钟)", total_duration, total_duration / 60)
+        log.info("总Token消耗: {:,}", total_tokens)
         log.info("")
         
-        for step_name, stats in self.step_stats.items():
-            duration = stats.get("duration", 0)
-            tokens = stats.get("tokens_used", 0)
-            status = stats.get("status", "unknown")
+        for step_name, stat in self.step_stats.items():
+            # 未结束的步骤没有耗时
+            duration = stat.duration if stat.duration is not None else 0.0
+            status = stat.status
             status_icon = "✅" if status == "completed" else "❌" if status == "failed" else "⏳"
             
-            log.info(f"{status_icon} {step_name}: {duration:.2f}秒, {tokens:,} tokens")
+            log.info("{} {}: {:.2f}秒, {:,} tokens", status_icon, step_name, duration, stat.tokens_used)
         
         log.info("="*60)
 
 
-def check_file_integrity(config: PipelineConfig, step_name: str) -> bool:
+def _episode_missing_files(step_name: str, episode_id: str, entries: Dict[str, os.DirEntry]) -> List[str]:
+    """检查单个剧集的步骤产物，返回缺失/损坏文件的描述列表"""
+    return missing_output_files(episode_id, (
+        (filename, entries[filename].path if filename in entries else "", _entry_stat(entries, filename))
+        for filename in EXPECTED_FILES[step_name]
+    ))
+
+
+def check_file_integrity(config: PipelineConfig, step_name: str, episodes: Optional[List[str]] = None) -> bool:
     """检查步骤输出文件的完整性"""
     output_root = config.project_root
-    episodes = PipelineUtils.get_episode_list(output_root)
-    
-    # 定义每个步骤的预期输出文件
-    expected_files = {
-        "0.1": ["0_1_timed_dialogue.srt"],
-        "0.2": ["0_2_clues.json"],
-        "0.3": ["global_character_graph_llm.json"],
-        "0.4": ["0_4_calibrated_dialogue.txt"],
-        "0.5": ["0_5_dialogue_turns.json"],
-        "0.6": ["0_6_script_flow.json", "0_6_script_draft.md"],
-        "0.7": ["0_7_script.stmf", "0_7_script_analysis.json"],
-        # 0.8 为集合级别汇总产物（存放在集合根目录 output_root 下）
-        "0.8": ["0_8_complete_screenplay.fountain", "0_8_complete_screenplay.fdx"]
-    }
+    if episodes is None:
+        episodes = _episode_list(output_root)
     
-    if step_name not in expected_files:
-        log.info(f"⚠️ 未知步骤: {step_name}")
+    if step_name not in EXPECTED_FILES:
+        log.info("⚠️ 未知步骤: {}", step_name)
         return True
     
-    required_files = expected_files[step_name]
     missing_files = []
-    
-    for episode_id in episodes:
-        for filename in required_files:
-            if step_name == "0.3":  # 全局文件（在 global/ 下）
-                file_path = os.path.join(output_root, "global", filename)
-            elif step_name == "0.8":  # 全局合并文件（集合根目录下）
-                file_path = os.path.join(output_root, filename)
-            else:  # 剧集文件
-                file_path = os.path.join(output_root, episode_id, filename)
-            
-            if not os.path.exists(file_path):
-                missing_files.append(f"{episode_id}/{filename}")
-            else:
-                # 检查文件是否为空或损坏
-                try:
-                    if filename.endswith('.json'):
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            json.load(f)
-                    elif os.path.getsize(file_path) == 0:
-                        missing_files.append(f"{episode_id}/{filename} (空文件)")
-                except (json.JSONDecodeError, Exception) as e:
-                    missing_files.append(f"{episode_id}/{filename} (损坏: {e})")
-    
+    for episode_id, entries in _step_dirs(output_root, step_name, episodes):
+        missing_files.extend(_episode_missing_files(step_name, episode_id, entries))
+    return _log_integrity(step_name, missing_files)
+
+
+def _log_integrity(step_name: str, missing_files: List[str]) -> bool:
+    """输出完整性检查结果，返回是否通过"""
     if missing_files:
-        log.info(f"❌ {step_name} 文件完整性检查失败:")
+        log.info("❌ {} 文件完整性检查失败:", step_name)
         for missing in missing_files[:10]:  # 只显示前10个
-            log.info(f"   缺少: {missing}")
+            log.info("   缺少: {}", missing)
         if len(missing_files) > 10:
-            log.info(f"   ... 还有 {len(missing_files) - 10} 个文件")
+            log.info("   ... 还有 {} 个文件", len(missing_files) - 10)
         return False
     
-    log.info(f"✅ {step_name} 文件完整性检查通过")
+    log.info("✅ {} 文件完整性检查通过", step_name)
     return True
 
 
-def _fail(step: str, result) -> bool:
-    """判断步骤是否失败"""
-    status = (result or {}).get("status")
-    if step in ("0.1", "0.2", "0.3", "0.4", "0.5", "0.6", "0.7", "0.8"):
-        return status != "completed" and status != "already_exists"
-    return status != "success" and status != "already_exists"
+def _short(value: Any, limit: int = 500) -> str:
+    """日志用的截断 repr，避免整段打印庞大的步骤结果"""
+    text = repr(value)
+    return text if len(text) <= limit else text[:limit] + "…"
 
 
-def run_step(step_name: str, step_class, config: PipelineConfig, stats: PipelineStats) -> tuple[bool, Any, Any]:
-    """运行单个步骤，返回 (成功状态, 步骤实例, 结果)"""
-    log.info(f"\n{step_name}: {step_class.__name__} …")
+def run_step(step_name: str, step_class, config: PipelineConfig, stats: PipelineStats,
+             skip_integrity: bool = False) -> tuple[bool, Any, Any]:
+    """运行单个步骤，返回 (成功状态, 步骤实例, 结果)；skip_integrity=True 时跳过文件完整性检查"""
+    log.info("\n{}: {} …", step_name, step_class.__name__)
     stats.start_step(step_name)
     
     try:
@@ -163,14 +256,14 @@ def run_step(step_name: str, step_class, config: PipelineConfig, stats: Pipeline
         result = step_instance.run()
         
         # 检查步骤是否成功
-        if _fail(step_name, result):
-            log.info(f"❌ {step_name} 失败: {result}")
+        if is_failed(step_name, result):
+            log.info("❌ {} 失败: {}", step_name, _short(result))
             stats.end_step(step_name, status="failed")
             return False, step_instance, result
         
         # 文件完整性检查
-        if not check_file_integrity(config, step_name):
-            log.info(f"❌ {step_name} 文件完整性检查失败")
+        if not skip_integrity and not check_file_integrity(config, step_name):
+            log.info("❌ {} 文件完整性检查失败", step_name)
             stats.end_step(step_name, status="failed")
             return False, step_instance, result
         
@@ -180,136 +273,208 @@ def run_step(step_name: str, step_class, config: PipelineConfig, stats: Pipeline
             tokens_used = result.get("tokens_used", 0)
         
         stats.end_step(step_name, tokens_used=tokens_used, status="completed")
-        log.info(f"✅ {step_name} 完成")
+        log.info("✅ {} 完成", step_name)
         return True, step_instance, result
         
     except Exception as e:
-        log.info(f"❌ {step_name} 异常: {e}")
+        log.info("❌ {} 异常: {}", step_name, e)
         stats.end_step(step_name, status="failed")
         return False, None, {"error": str(e)}
 
 
+def _delete_in_dir(base_dir: str, filenames: List[str]) -> List[tuple[str, Optional[OSError]]]:
+    """删除目录中实际存在的目标文件（单次 scandir 确认存在），返回 [(路径, 删除失败时的异常)]"""
+    entries = _scan_dir(base_dir)
+    outcomes = []
+    for filename in filenames:
+        entry = entries.get(filename)
+        if entry is None:
+            continue
+        try:
+            os.unlink(entry.path)
+            outcomes.append((entry.path, None))
+        except OSError as e:
+            outcomes.append((entry.path, e))
+    return outcomes
+
+
 def delete_step_files(config: PipelineConfig, step_name: str, target_episodes: Optional[List[str]] = None):
     """删除指定步骤及其之后步骤的输出文件"""
     output_root = config.project_root
     
-    # 定义每个步骤的预期输出文件
-    expected_files = {
-        "0.1": ["0_1_timed_dialogue.srt"],
-        "0.2": ["0_2_clues.json"],
-        "0.3": ["global_character_graph_llm.json"],
-        "0.4": ["0_4_calibrated_dialogue.txt"],
-        "0.5": ["0_5_dialogue_turns.json"],
-        "0.6": ["0_6_script_flow.json", "0_6_script_draft.md"],
-        "0.7": ["0_7_script.stmf", "0_7_script_analysis.json"],
-        "0.8": ["0_8_complete_screenplay.fountain", "0_8_complete_screenplay.fdx"]
-    }
-    
-    # 获取所有步骤列表
-    all_steps = list(expected_files.keys())
-    
     # 找到起始步骤的索引
-    if step_name not in all_steps:
+    start_index = STEP_INDEX.get(step_name)
+    if start_index is None:
         return
     
-    start_index = all_steps.index(step_name)
+    if target_episodes:
+        episodes = target_episodes
+    else:
+        episodes = _episode_list(output_root)
+    
+    # 汇总从起始步骤开始的所有步骤在各目录下的待删文件名（global/ 与集合根目录只出现一次）
+    episode_dirs = [os.path.join(output_root, episode_id) for episode_id in episodes]
+    targets: Dict[str, Dict[str, None]] = {}
+    for current_step in STEP_ORDER[start_index:]:
+        shared_dir = _shared_dir(output_root, current_step)
+        if shared_dir is None:  # 剧集文件
+            dirs = episode_dirs
+        else:  # 全局文件（global/ 或集合根目录下）
+            dirs = [shared_dir] if episodes else []
+        for base_dir in dirs:
+            targets.setdefault(base_dir, {}).update(dict.fromkeys(EXPECTED_FILES[current_step]))
+    
+    # 每个目录一次 scandir 确认存在后直接删除，目录间并行
+    with ThreadPoolExecutor(max_workers=max(1, min(16, len(targets)))) as executor:
+        outcomes = list(executor.map(_delete_in_dir, targets, map(list, targets.values())))
+    
     deleted_count = 0
+    for dir_outcomes in outcomes:
+        for file_path, error in dir_outcomes:
+            if error is None:
+                deleted_count += 1
+                # 逐文件明细量大，只在 DEBUG 级别输出
+                log.debug("🗑️ 删除: {}", file_path)
+            else:
+                log.info("❌ 删除失败: {} - {}", file_path, error)
     
-    # 处理从起始步骤开始的所有步骤
-    for i in range(start_index, len(all_steps)):
-        current_step = all_steps[i]
-        required_files = expected_files[current_step]
-        
-        if target_episodes:
-            episodes = target_episodes
-        else:
-            episodes = PipelineUtils.get_episode_list(output_root)
-        
-        for episode_id in episodes:
-            for filename in required_files:
-                if current_step == "0.3":  # 全局文件（在 global/ 下）
-                    file_path = os.path.join(output_root, "global", filename)
-                elif current_step == "0.8":  # 全局合并文件（集合根目录下）
-                    file_path = os.path.join(output_root, filename)
-                else:  # 剧集文件
-                    file_path = os.path.join(output_root, episode_id, filename)
-                
-                if os.path.exists(file_path):
-                    try:
-                        os.remove(file_path)
-                        deleted_count += 1
-                        log.info(f"🗑️ 删除: {file_path}")
-                    except Exception as e:
-                        log.info(f"❌ 删除失败: {file_path} - {e}")
-    
-    log.info(f"✅ 删除了 {deleted_count} 个文件")
-
-
-def check_invalid_files(config: PipelineConfig, step_name: str) -> List[str]:
+    log.info("✅ 删除了 {} 个文件", deleted_count)
+
+
+def _episode_invalid(step_name: str, entries: Dict[str, os.DirEntry]) -> bool:
+    """单个剧集的步骤产物是否缺失、过小或损坏"""
+    for filename in EXPECTED_FILES[step_name]:
+        st = _entry_stat(entries, filename)
+        if st is None:
+            return True
+        # 检查文件是否为空或损坏
+        if filename.endswith('.json'):
+            if not json_output_valid(step_name, entries[filename].path, st.st_size):
+                return True
+        elif st.st_size < 100:  # 文件太小
+            return True
+    return False
+
+
+def check_invalid_files(config: PipelineConfig, step_name: str, episodes: Optional[List[str]] = None) -> List[str]:
     """检查指定步骤的无效文件"""
     output_root = config.project_root
-    episodes = PipelineUtils.get_episode_list(output_root)
-    
-    # 定义每个步骤的预期输出文件
-    expected_files = {
-        "0.1": ["0_1_timed_dialogue.srt"],
-        "0.2": ["0_2_clues.json"],
-        "0.3": ["global_character_graph_llm.json"],
-        "0.4": ["0_4_calibrated_dialogue.txt"],
-        "0.5": ["0_5_dialogue_turns.json"],
-        "0.6": ["0_6_script_flow.json", "0_6_script_draft.md"],
-        "0.7": ["0_7_script.stmf", "0_7_script_analysis.json"],
-        "0.8": ["0_8_complete_screenplay.fountain", "0_8_complete_screenplay.fdx"]
-    }
+    if episodes is None:
+        episodes = _episode_list(output_root)
     
-    if step_name not in expected_files:
+    if step_name not in EXPECTED_FILES:
         return []
     
-    required_files = expected_files[step_name]
-    invalid_episodes = []
-    
-    for episode_id in episodes:
-        for filename in required_files:
-            if step_name == "0.3":  # 全局文件（在 global/ 下）
-                file_path = os.path.join(output_root, "global", filename)
-            elif step_name == "0.8":  # 全局合并文件（集合根目录下）
-                file_path = os.path.join(output_root, filename)
-            else:  # 剧集文件
-                file_path = os.path.join(output_root, episode_id, filename)
-            
-            if not os.path.exists(file_path):
-                invalid_episodes.append(episode_id)
-                break
-            else:
-                # 检查文件是否为空或损坏
-                try:
-                    if filename.endswith('.json'):
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            # 针对不同步骤的结构校验
-                            if step_name == "0.5":
-                                valid = False
-                                if isinstance(data, dict):
-                                    # 接受 dialogue_turns（主）、turns/dialogues（兼容）
-                                    valid = bool(data.get('dialogue_turns') or data.get('turns') or data.get('dialogues'))
-                                elif isinstance(data, list):
-                                    valid = len(data) > 0
-                                if not valid:
-                                    invalid_episodes.append(episode_id)
-                                    break
-                            else:
-                                # 通用（宽松）校验：非空即可
-                                if not data:
-                                    invalid_episodes.append(episode_id)
-                                    break
-                    elif os.path.getsize(file_path) < 100:  # 文件太小
-                        invalid_episodes.append(episode_id)
-                        break
-                except (json.JSONDecodeError, Exception):
-                    invalid_episodes.append(episode_id)
-                    break
-    
-    return invalid_episodes
+    return [episode_id for episode_id, entries in _step_dirs(output_root, step_name, episodes)
+            if _episode_invalid(step_name, entries)]
+
+
+# 状态检查的并发上限（避免慢速文件系统上同时打开过多文件）
+_CHECK_CONCURRENCY = 32
+
+
+async def _in_thread(semaphore: asyncio.Semaphore, func, *args):
+    """在线程池中执行阻塞的文件系统操作，并发数受 semaphore 限制"""
+    async with semaphore:
+        return await asyncio.to_thread(func, *args)
+
+
+async def _invalid_files_by_step(output_root: str, episodes: List[str],
+                                 steps: tuple[str, ...] = STEP_ORDER) -> Dict[str, List[str]]:
+    """并发检查各步骤的无效文件：{步骤: 无效剧集列表}（与逐步调用 check_invalid_files 结果一致）
+    每集在线程池中扫描一次目录并检查全部剧集级步骤；global/ 与集合根目录各只检查一次"""
+    semaphore = asyncio.Semaphore(_CHECK_CONCURRENCY)
+    steps = tuple(step for step in steps if step in EXPECTED_FILES)
+    
+    def check_shared(step_name: str) -> bool:
+        return _episode_invalid(step_name, _scan_dir(_shared_dir(output_root, step_name)))
+    
+    def check_episode(episode_id: str) -> List[str]:
+        entries = _scan_dir(os.path.join(output_root, episode_id))
+        return [step for step in episode_steps if _episode_invalid(step, entries)]
+    
+    shared_steps = [step for step in steps if _shared_dir(output_root, step) is not None]
+    episode_steps = [step for step in steps if _shared_dir(output_root, step) is None]
+    
+    # 没有剧集时全局步骤也不会产生无效剧集，无需检查
+    shared_tasks = [_in_thread(semaphore, check_shared, step) for step in shared_steps] if episodes else []
+    episode_tasks = [_in_thread(semaphore, check_episode, episode_id) for episode_id in episodes] if episode_steps else []
+    results = await asyncio.gather(*shared_tasks, *episode_tasks)
+    shared_invalid, episode_invalid = results[:len(shared_tasks)], results[len(shared_tasks):]
+    
+    result: Dict[str, List[str]] = {step: [] for step in steps}
+    for step, invalid in zip(shared_steps, shared_invalid):
+        if invalid:
+            result[step] = list(episodes)
+    for episode_id, steps in zip(episodes, episode_invalid):
+        for step in steps:
+            result[step].append(episode_id)
+    return result
+
+
+async def _missing_files_async(output_root: str, step_name: str, episodes: List[str]) -> List[str]:
+    """并发版 check_file_integrity 的逐集检查，返回缺失/损坏文件描述（顺序与串行一致）"""
+    semaphore = asyncio.Semaphore(_CHECK_CONCURRENCY)
+    shared_dir = _shared_dir(output_root, step_name)
+    shared = await asyncio.to_thread(_scan_dir, shared_dir) if shared_dir is not None else None
+    
+    def check_episode(episode_id: str) -> List[str]:
+        entries = shared if shared is not None else _scan_dir(os.path.join(output_root, episode_id))
+        return _episode_missing_files(step_name, episode_id, entries)
+    
+    results = await asyncio.gather(*(_in_thread(semaphore, check_episode, episode_id) for episode_id in episodes))
+    return [missing for episode_missing in results for missing in episode_missing]
+
+
+async def _existing_output_root(collection: str) -> str:
+    """在线程池中解析集合输出根目录；目录不存在时返回 404"""
+    output_root = await asyncio.to_thread(_resolve_output_root, collection)
+    if not await asyncio.to_thread(os.path.exists, output_root):
+        raise HTTPException(status_code=404, detail=f"集合目录不存在: {output_root}")
+    return output_root
+
+
+def _validators(mtimes_ns: List[int], *parts: Any) -> tuple[str, str]:
+    """由目录 mtime 与附加信息生成 (ETag, Last-Modified)"""
+    key = ":".join(map(str, (*mtimes_ns, *parts)))
+    etag = '"' + hashlib.blake2b(key.encode(), digest_size=8).hexdigest() + '"'
+    last_modified = formatdate(max(mtimes_ns, default=0) / 1e9, usegmt=True)
+    return etag, last_modified
+
+
+# 各步骤的全部产物文件名（集合根目录下的旧版 0.3 全局图谱同名，一并覆盖）
+_OUTPUT_FILENAMES = frozenset(filename for filenames in EXPECTED_FILES.values() for filename in filenames)
+
+
+def _status_validators(output_root: str, episodes: tuple[str, ...]) -> tuple[str, str]:
+    """集合状态的缓存校验值：集合根目录、global/ 与各剧集目录下每个产物文件的 (mtime, 大小) 加剧集数
+    状态取决于文件大小与内容，原地覆盖写入不改变目录 mtime，因此逐文件计入"""
+    mtimes_ns: List[int] = []
+    parts: List[Any] = [len(episodes)]
+    for index, path in enumerate((output_root, os.path.join(output_root, "global"),
+                                  *(os.path.join(output_root, e) for e in episodes))):
+        for name, entry in sorted(_scan_dir(path).items()):
+            if name not in _OUTPUT_FILENAMES:
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            mtimes_ns.append(st.st_mtime_ns)
+            parts.append(f"{index}/{name}/{st.st_size}")
+    return _validators(mtimes_ns, *parts)
+
+
+def _not_modified(request: Request, response: Response, etag: str, last_modified: str) -> Optional[Response]:
+    """If-None-Match 命中时返回 304 响应，否则在响应上附加 ETag/Last-Modified 并返回 None"""
+    headers = {"ETag": etag, "Last-Modified": last_modified}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
 
 
 # 定义 Pydantic 模型
@@ -353,10 +518,91 @@ class PipelineResult(BaseModel):
     stats: Optional[Dict[str, Any]] = None
 
 
+class JobSubmitResponse(BaseModel):
+    """任务提交响应模型"""
+    job_id: str
+    status: str
+
+
+class JobStatusResponse(BaseModel):
+    """任务状态响应模型"""
+    job_id: str
+    collection: Optional[str] = None
+    status: str  # queued / running / completed / failed
+    submitted_at: Optional[float] = None
+    result: Optional[PipelineResult] = None
+    error: Optional[str] = None
+
+
+# 后台任务：流水线在独立进程中执行，请求线程只负责入队
+# PIPELINE_JOB_BACKEND=celery 且已安装 celery 时分发到 Celery worker，否则使用本机进程池
+_USE_CELERY = os.getenv("PIPELINE_JOB_BACKEND", "").strip().lower() == "celery" and celery_app is not None
+
+
+def _env_positive_int(name: str, default: int) -> int:
+    """读取正整数环境变量；未设置或取值非法时使用默认值"""
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        log.info("⚠️ 环境变量 {}={!r} 不是整数，使用默认值 {}", name, raw, default)
+        return default
+    return value if value > 0 else default
+
+
+# 同时执行的流水线数，可通过 PIPELINE_JOB_WORKERS 覆盖；每条流水线内部已按剧集/场景并发调用 LLM，默认一次只跑一条
+_JOB_WORKERS = _env_positive_int("PIPELINE_JOB_WORKERS", 1)
+_executor = ProcessPoolExecutor(max_workers=_JOB_WORKERS)
+
+# 任务表（内存存储，生产环境应使用 Redis/DB）；结束超过 _JOB_TTL 秒的任务被清理，总数超过 _JOB_MAX 时先清理最早结束的任务
+JOBS: Dict[str, Dict[str, Any]] = {}
+_JOB_TTL = 3600.0
+_JOB_MAX = 1000
+# 集合输出根目录 -> 排队/执行中的任务 id：同一集合同时只允许一个任务，避免 force_rerun/fix_invalid 互删文件
+# （仅在本 API 进程内生效）
+_ACTIVE_JOBS: Dict[str, str] = {}
+
+
+def _job_done(job_id: str, job: Dict[str, Any]) -> bool:
+    """任务是否已结束（本机进程池看 future，Celery 查结果存储）"""
+    future: Optional[Future] = job["future"]
+    if future is None:
+        return celery_app.AsyncResult(job_id).ready()
+    return future.done()
+
+
+def _prune_jobs() -> None:
+    """清理过期的任务记录；Celery 任务以提交时间计（状态仍可从结果存储查询）"""
+    now = time.time()
+    for job_id, job in list(JOBS.items()):
+        finished_at = job.get("finished_at") if job["future"] is not None else job["submitted_at"]
+        if finished_at is not None and now - finished_at > _JOB_TTL:
+            del JOBS[job_id]
+    if len(JOBS) > _JOB_MAX:
+        finished = sorted((job["finished_at"], job_id) for job_id, job in JOBS.items() if job.get("finished_at") is not None)
+        for _, job_id in finished[:len(JOBS) - _JOB_MAX]:
+            del JOBS[job_id]
+
+
+def _mark_finished(job: Dict[str, Any], future: Future) -> None:
+    """future 结束回调：记录结束时间，供 _prune_jobs 清理"""
+    job["finished_at"] = time.time()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # 关闭时取消排队中的任务，不等待正在执行的流水线
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+
 # FastAPI 应用
 app = FastAPI(title="剧集剧本生成流水线 API", 
               description="支持从 Step 0.1 到 Step 0.8 的完整流水线执行，支持多种执行模式",
-              version="1.0.0")
+              version="1.0.0",
+              lifespan=lifespan)
 
 
 @app.get("/")
@@ -365,70 +611,138 @@ def read_root():
 
 
 @app.get("/collections", response_model=CollectionResponse)
-def get_collections():
-    """获取可用集合列表"""
-    base_output_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "new_pipeline", "output"))
-    candidates = []
-    
+def get_collections(request: Request, response: Response):
+    """获取可用集合列表（支持 If-None-Match 条件请求）"""
     try:
-        for name in sorted(os.listdir(base_output_dir)):
-            outer_path = os.path.join(base_output_dir, name)
-            if not os.path.isdir(outer_path):
-                continue
-            inner_same = os.path.isdir(os.path.join(outer_path, name))
-            has_global = os.path.isdir(os.path.join(outer_path, "global"))
-            has_episode = False
-            
-            try:
-                for d in os.listdir(outer_path):
-                    if d.startswith("episode_") and os.path.isdir(os.path.join(outer_path, d)):
-                        has_episode = True
-                        break
-            except Exception:
-                pass
-            
-            if inner_same or has_global or has_episode:
-                candidates.append(name)
+        mtime_ns = os.stat(BASE_OUTPUT_DIR).st_mtime_ns
     except FileNotFoundError:
-        candidates = []
+        return CollectionResponse(collections=[])
+    candidates = list(_list_collections_cached(mtime_ns, int(time.monotonic() // _COLLECTIONS_CACHE_TTL)))
     
+    not_modified = _not_modified(request, response, *_validators([mtime_ns], *candidates))
+    if not_modified is not None:
+        return not_modified
     return CollectionResponse(collections=candidates)
 
 
-@app.post("/run_pipeline", response_model=PipelineResult)
+@app.post("/run_pipeline", response_model=JobSubmitResponse, status_code=202)
 async def run_pipeline(request: RunPipelineRequest):
-    """运行流水线"""
+    """提交流水线任务（立即返回 job_id，执行进度通过 /jobs/{job_id} 查询）；同一集合已有未结束的任务时返回 409"""
     # 验证起始步骤
-    valid_steps = ["0.1", "0.2", "0.3", "0.4", "0.5", "0.6", "0.7", "0.8"]
-    if request.start_step not in valid_steps:
-        raise HTTPException(status_code=400, detail=f"无效的起始步骤: {request.start_step}，可用步骤: {', '.join(valid_steps)}")
-    
-    # 配置
-    config = PipelineConfig()
-    base_output_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "new_pipeline", "output"))
-    outer_path = os.path.join(base_output_dir, request.collection)
-    inner_same_path = os.path.join(outer_path, request.collection)
-    
-    # 兼容双层与单层目录结构
-    if os.path.isdir(inner_same_path):
-        output_root = os.path.abspath(inner_same_path)
+    if request.start_step not in STEP_INDEX:
+        raise HTTPException(status_code=400, detail=f"无效的起始步骤: {request.start_step}，可用步骤: {', '.join(STEP_ORDER)}")
+    
+    output_root = await _existing_output_root(request.collection)
+    
+    # 以下检查与登记之间没有 await，在事件循环内是原子的
+    active_id = _ACTIVE_JOBS.get(output_root)
+    if active_id is not None and active_id in JOBS and not _job_done(active_id, JOBS[active_id]):
+        raise HTTPException(status_code=409, detail=f"集合 {request.collection} 已有排队或执行中的任务: {active_id}")
+    _prune_jobs()
+    
+    payload = request.model_dump(mode="json")
+    if _USE_CELERY:
+        task = run_pipeline_task.delay(payload, output_root)
+        job_id = task.id
+        future = None
     else:
-        output_root = os.path.abspath(outer_path)
-    
-    if not os.path.exists(output_root):
-        raise HTTPException(status_code=404, detail=f"集合目录不存在: {output_root}")
-    
-    # 允许外部覆盖 bucket
-    if request.bucket:
-        config.config.setdefault("gcp", {})
-        config.config["gcp"]["bucket_name"] = request.bucket
+        job_id = uuid.uuid4().hex
+        future = _executor.submit(_run_pipeline_sync, payload, output_root)
+    job = {
+        "collection": request.collection,
+        "submitted_at": time.time(),
+        "future": future,
+    }
+    JOBS[job_id] = job
+    _ACTIVE_JOBS[output_root] = job_id
+    if future is not None:
+        future.add_done_callback(functools.partial(_mark_finished, job))
+    log.info("📥 已提交流水线任务 {}（集合: {}，起始步骤: {}）", job_id, request.collection, request.start_step)
+    return JobSubmitResponse(job_id=job_id, status="queued")
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+def get_job(job_id: str):
+    """查询流水线任务状态"""
+    job = JOBS.get(job_id)
+    if _USE_CELERY:
+        # Celery 任务可能由其他 API 进程提交，状态以结果存储为准
+        return _celery_job_status(job_id, job)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+    
+    future: Future = job["future"]
+    result = None
+    error = None
+    if not future.done():
+        status = "running" if future.running() else "queued"
+    elif future.cancelled():
+        status = "failed"
+        error = "任务已取消"
+    elif future.exception() is not None:
+        status = "failed"
+        error = str(future.exception())
+    else:
+        result = PipelineResult(**future.result())
+        status = "completed" if result.success else "failed"
+    
+    return JobStatusResponse(
+        job_id=job_id,
+        collection=job["collection"],
+        status=status,
+        submitted_at=job["submitted_at"],
+        result=result,
+        error=error
+    )
 
-    config.config.setdefault("project", {})
-    config.config["project"]["root_dir"] = output_root
-    config.config["project"]["output_dir"] = output_root
+
+def _celery_job_status(job_id: str, job: Optional[Dict[str, Any]]) -> JobStatusResponse:
+    """从 Celery 结果存储读取任务状态"""
+    async_result = celery_app.AsyncResult(job_id)
+    state = async_result.state
+    result = None
+    error = None
+    if state == "SUCCESS":
+        result = PipelineResult(**async_result.result)
+        status = "completed" if result.success else "failed"
+    elif state in ("FAILURE", "REVOKED"):
+        status = "failed"
+        error = str(async_result.result)
+    elif state in ("STARTED", "RETRY"):
+        status = "running"
+    else:
+        # PENDING：排队中或未知任务（Celery 无法区分）
+        status = "queued"
+    
+    return JobStatusResponse(
+        job_id=job_id,
+        collection=job["collection"] if job else None,
+        status=status,
+        submitted_at=job["submitted_at"] if job else None,
+        result=result,
+        error=error
+    )
+
+
+def _stats_payload(stats: PipelineStats) -> Dict[str, Any]:
+    """汇总统计信息（供任务结果返回）"""
+    return {
+        "total_duration": time.time() - stats.total_start_time,
+        "total_tokens": stats.total_tokens(),
+        "step_stats": {step_name: asdict(stat) for step_name, stat in stats.step_stats.items()}
+    }
+
+
+def _run_pipeline_sync(payload: Dict[str, Any], output_root: str) -> Dict[str, Any]:
+    """在工作进程中执行流水线，返回 PipelineResult 字典"""
+    request = RunPipelineRequest(**payload)
+    
+    # 配置：每个任务重新加载 pipeline.yaml，修改配置无需重启 worker；允许外部覆盖 bucket
+    config = PipelineConfig()
+    config.apply_overrides(root_dir=output_root, output_dir=output_root, bucket_name=request.bucket)
 
     # 检查输入目录，root_dir
-    log.info(f"项目根目录: {config.project_root}, 输出目录: {config.output_dir}")
+    log.info("项目根目录: {}, 输出目录: {}", config.project_root, config.output_dir)
 
     # 确定目标剧集
     target_episodes = []
@@ -436,8 +750,8 @@ async def run_pipeline(request: RunPipelineRequest):
         # 检查无效文件
         invalid_episodes = check_invalid_files(config, request.start_step)
         if not invalid_episodes:
-            log.info(f"✅ 步骤 {request.start_step} 没有无效文件")
-            return PipelineResult(success=True, message=f"步骤 {request.start_step} 没有无效文件需要修复")
+            log.info("✅ 步骤 {} 没有无效文件", request.start_step)
+            return PipelineResult(success=True, message=f"步骤 {request.start_step} 没有无效文件需要修复").model_dump()
         target_episodes = invalid_episodes
     elif request.target_episodes:
         target_episodes = request.target_episodes
@@ -445,13 +759,13 @@ async def run_pipeline(request: RunPipelineRequest):
     log.info("="*60)
     log.info("🎬 剧集剧本生成流水线")
     log.info("="*60)
-    log.info(f"输出目录: {output_root}")
-    log.info(f"集合名称: {request.collection}")
-    log.info(f"起始步骤: {request.start_step}")
-    log.info(f"执行模式: {request.execution_mode}")
-    log.info(f"跳过完整性检查: {request.skip_integrity_check}")
+    log.info("输出目录: {}", output_root)
+    log.info("集合名称: {}", request.collection)
+    log.info("起始步骤: {}", request.start_step)
+    log.info("执行模式: {}", request.execution_mode)
+    log.info("跳过完整性检查: {}", request.skip_integrity_check)
     if target_episodes:
-        log.info(f"目标剧集: {len(target_episodes)} 个")
+        log.info("目标剧集: {} 个", len(target_episodes))
     log.info("="*60)
 
     # 初始化统计
@@ -469,22 +783,16 @@ async def run_pipeline(request: RunPipelineRequest):
         ("0.8", Step0_8FinalScript, "合并与导出")
     ]
     
-    # 找到起始步骤
-    start_index = 0
-    for i, (step_num, _, _) in enumerate(steps):
-        if step_num == request.start_step:
-            start_index = i
-            break
-    else:
-        raise HTTPException(status_code=400, detail=f"无效的起始步骤: {request.start_step}")
+    # 找到起始步骤（run_pipeline 已校验过 start_step；steps 与 STEP_ORDER 顺序一致）
+    start_index = STEP_INDEX[request.start_step]
     
     # 处理强制重跑模式
     if request.execution_mode == ExecutionMode.FORCE_RERUN:
-        log.info(f"🗑️ 强制重跑模式：删除步骤 {request.start_step} 的现有文件...")
+        log.info("🗑️ 强制重跑模式：删除步骤 {} 的现有文件...", request.start_step)
         log.info("⚠️ 注意：强制重跑将删除现有文件，请确保已备份重要数据")
         delete_step_files(config, request.start_step, target_episodes)
     
-    log.info(f"从步骤 {request.start_step} 开始执行 ({request.execution_mode} 模式)...")
+    log.info("从步骤 {} 开始执行 ({} 模式)...", request.start_step, request.execution_mode)
     
     # 初始化报告生成器
     report_generator = PipelineReportGenerator(config)
@@ -498,79 +806,53 @@ async def run_pipeline(request: RunPipelineRequest):
             # 记录步骤开始
             report_generator.record_step_start(step_name)
             
-            # 如果跳过完整性检查，则修改检查函数
-            if request.skip_integrity_check:
-                global check_file_integrity
-                original_check = check_file_integrity
-                check_file_integrity = lambda config, step_name: True
-            
-            success, step_instance, step_result = run_step(step_num, step_class, config, stats)
-            
-            # 恢复原始检查函数
-            if request.skip_integrity_check:
-                check_file_integrity = original_check
+            success, step_instance, step_result = run_step(step_num, step_class, config, stats,
+                                                           skip_integrity=request.skip_integrity_check)
             
             # 记录步骤结束（获取客户端token使用信息）
             client = getattr(step_instance, 'client', None) if step_instance else None
             report_generator.record_step_end(step_name, step_result, client)
             
             if not success:
-                log.info(f"\n❌ 流水线在步骤 {step_num} 失败")
+                log.info("\n❌ 流水线在步骤 {} 失败", step_num)
                 stats.print_summary()
-                return PipelineResult(success=False, message=f"流水线在步骤 {step_num} 失败: {step_result}")
+                return PipelineResult(success=False, 
+                                    message=f"流水线在步骤 {step_num} 失败: {step_result}", 
+                                    stats=_stats_payload(stats)).model_dump()
         
         log.info("\n🎉 全流程完成")
         stats.print_summary()
+        # 统计在步骤全部结束时汇总一次，报告生成成功与否共用
+        result_stats = _stats_payload(stats)
         
         # 生成运行报告
         try:
             report_file = report_generator.generate_report(config.output_dir)
-            log.info(f"\n📊 运行报告已生成: {report_file}")
+            log.info("\n📊 运行报告已生成: {}", report_file)
             return PipelineResult(success=True, 
                                 message="流水线执行成功", 
                                 report_file=report_file, 
-                                stats={ 
-                                    "total_duration": time.time() - stats.total_start_time,
-                                    "total_tokens": sum(s.get("tokens_used", 0) for s in stats.step_stats.values()),
-                                    "step_stats": stats.step_stats
-                                })
+                                stats=result_stats).model_dump()
         except Exception as e:
-            log.info(f"\n⚠️ 报告生成失败: {e}")
+            log.info("\n⚠️ 报告生成失败: {}", e)
             return PipelineResult(success=True, 
                                 message="流水线执行成功但报告生成失败", 
-                                stats={ 
-                                    "total_duration": time.time() - stats.total_start_time,
-                                    "total_tokens": sum(s.get("tokens_used", 0) for s in stats.step_stats.values()),
-                                    "step_stats": stats.step_stats
-                                })
+                                stats=result_stats).model_dump()
     
     except Exception as e:
-        log.info(f"\n❌ 运行异常: {e}")
+        log.info("\n❌ 运行异常: {}", e)
         stats.print_summary()
-        return PipelineResult(success=False, message=f"运行异常: {e}")
+        return PipelineResult(success=False, message=f"运行异常: {e}", stats=_stats_payload(stats)).model_dump()
 
 
 @app.get("/check_status/{collection}", response_model=PipelineStatusResponse)
-def check_pipeline_status(collection: str):
-    """检查指定集合的流水线状态"""
-    base_output_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "new_pipeline", "output"))
-    collection_path = os.path.join(base_output_dir, collection)
-    inner_same_path = os.path.join(collection_path, collection)
-    
-    # 兼容双层与单层目录结构
-    if os.path.isdir(inner_same_path):
-        output_root = os.path.abspath(inner_same_path)
-    else:
-        output_root = os.path.abspath(collection_path)
-    
-    if not os.path.exists(output_root):
-        raise HTTPException(status_code=404, detail=f"集合目录不存在: {output_root}")
-    
-    # 配置
-    config = PipelineConfig()
-    config.config.setdefault("project", {})
-    config.config["project"]["root_dir"] = output_root
-    config.config["project"]["output_dir"] = output_root
+async def check_pipeline_status(collection: str, request: Request, response: Response):
+    """检查指定集合的流水线状态（支持 If-None-Match 条件请求，未变化时返回 304）"""
+    output_root = await _existing_output_root(collection)
+    episodes = await asyncio.to_thread(_episode_list, output_root)
+    not_modified = _not_modified(request, response, *await asyncio.to_thread(_status_validators, output_root, episodes))
+    if not_modified is not None:
+        return not_modified
     
     # 检查各步骤的文件状态
     steps = [
@@ -584,18 +866,21 @@ def check_pipeline_status(collection: str):
         ("0.8", "合并与导出")
     ]
     
+    total_episodes = len(episodes)
+    invalid_by_step = await _invalid_files_by_step(output_root, episodes)
+    # 0.3 兼容旧版直接存放在集合根目录下的全局图谱
+    global_graph_done = await asyncio.to_thread(any, map(os.path.exists, (
+        os.path.join(output_root, "global", "global_character_graph_llm.json"),
+        os.path.join(output_root, "global_character_graph_llm.json"),
+    )))
+    
     step_statuses = []
     for step_num, step_desc in steps:
-        invalid_files = check_invalid_files(config, step_num)
-        total_episodes = len(PipelineUtils.get_episode_list(config.project_root))
+        invalid_files = invalid_by_step[step_num]
         valid_count = total_episodes - len(invalid_files)
         
         if step_num == "0.3":  # 全局步骤
-            candidates = [
-                os.path.join(config.project_root, "global", "global_character_graph_llm.json"),
-                os.path.join(config.project_root, "global_character_graph_llm.json"),
-            ]
-            if any(os.path.exists(p) for p in candidates):
+            if global_graph_done:
                 status = "✅ 完成"
             else:
                 status = "❌ 未完成"
@@ -624,34 +909,22 @@ def check_pipeline_status(collection: str):
 
 
 @app.get("/step_files/{collection}/{step_name}")
-def check_step_files(collection: str, step_name: str):
+async def check_step_files(collection: str, step_name: str):
     """检查指定步骤的文件完整性"""
-    base_output_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "new_pipeline", "output"))
-    collection_path = os.path.join(base_output_dir, collection)
-    inner_same_path = os.path.join(collection_path, collection)
-    
-    # 兼容双层与单层目录结构
-    if os.path.isdir(inner_same_path):
-        output_root = os.path.abspath(inner_same_path)
-    else:
-        output_root = os.path.abspath(collection_path)
-    
-    if not os.path.exists(output_root):
-        raise HTTPException(status_code=404, detail=f"集合目录不存在: {output_root}")
-    
-    # 配置
-    config = PipelineConfig()
-    config.config.setdefault("project", {})
-    config.config["project"]["root_dir"] = output_root
-    config.config["project"]["output_dir"] = output_root
+    output_root = await _existing_output_root(collection)
     
     # 检查文件完整性
-    is_valid = check_file_integrity(config, step_name)
+    episodes = await asyncio.to_thread(_episode_list, output_root)
+    if step_name not in EXPECTED_FILES:
+        log.info("⚠️ 未知步骤: {}", step_name)
+        is_valid = True
+    else:
+        is_valid = _log_integrity(step_name, await _missing_files_async(output_root, step_name, episodes))
     
     if is_valid:
         return {"step": step_name, "collection": collection, "valid": True, "message": f"步骤 {step_name} 文件完整性检查通过"}
     else:
-        invalid_files = check_invalid_files(config, step_name)
+        invalid_files = (await _invalid_files_by_step(output_root, episodes, (step_name,)))[step_name]
         return {"step": step_name, "collection": collection, "valid": False, "message": f"步骤 {step_name} 文件完整性检查失败", "invalid_files": invalid_files}
 
 